@@ -0,0 +1,196 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from database import adapt_query, transaction
+
+# A batch is written once this many events are pending, or FLUSH_INTERVAL after the first one arrived
+BATCH_SIZE = int(os.getenv('ACTION_LOG_BATCH_SIZE', '100'))
+FLUSH_INTERVAL_SECONDS = float(os.getenv('ACTION_LOG_FLUSH_MS', '500')) / 1000
+# Events held in memory at most; a full buffer makes callers wait up to ENQUEUE_TIMEOUT, then drops the oldest event
+MAX_PENDING = int(os.getenv('ACTION_LOG_MAX_PENDING', '10000'))
+ENQUEUE_TIMEOUT_SECONDS = 1.0
+# Pause before retrying a batch when the database cannot be reached
+RETRY_SECONDS = 2.0
+
+COLUMNS = "waiter_id, table_id, action, details, timestamp"
+
+class ActionLogWriter:
+    """Writes action_log rows from a background thread, many per statement.
+
+    log() only appends to an in-memory buffer, so a request no longer waits for
+    its audit INSERT. The writer thread turns the buffer into multi-row INSERTs,
+    one transaction per batch. Events are written even if the request's own
+    transaction is later rolled back, so call log() after the change committed.
+    The buffer is bounded (MAX_PENDING) and drops its oldest events when it
+    overflows; close() - registered with atexit - writes whatever is left.
+    """
+
+    def __init__(self, connect, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL_SECONDS,
+                 max_pending=MAX_PENDING, enqueue_timeout=ENQUEUE_TIMEOUT_SECONDS):
+        self._connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._in_flight = 0
+        self._flush_requested = False
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        atexit.register(self.close)
+
+    def log(self, waiter_id, table_id, action, details, timestamp):
+        """Queue one event; returns False only if it could not be written at shutdown"""
+        row = (waiter_id, table_id, action, details, timestamp)
+        with self._cond:
+            if self._closed:
+                # Shutting down: no writer thread any more, write it here
+                late = True
+            else:
+                late = False
+                deadline = time.monotonic() + self.enqueue_timeout
+                while len(self._pending) >= self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # Still full: the oldest event makes room for this one
+                        oldest = self._pending.popleft()
+                        self.dropped += 1
+                        print(f"Action log buffer full ({self.max_pending} events); dropped '{oldest[2]}'")
+                        break
+                    self._cond.notify_all()
+                    self._cond.wait(remaining)
+                self._pending.append(row)
+                # The first event starts the interval; a full batch goes right away
+                if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                    self._cond.notify_all()
+        if not late:
+            self._start()
+        elif not self._write([row]):
+            self._drop([row], "the database is unreachable at shutdown")
+            return False
+        return True
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._closed or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name='action-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give the batch until the interval is up to fill
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._closed and not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._in_flight = len(batch)
+                if not self._pending:
+                    self._flush_requested = False
+                # Loggers waiting for room can go ahead
+                self._cond.notify_all()
+            written = self._write(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+            if not written:
+                with self._cond:
+                    if self._closed:
+                        self._drop(batch, "the database is unreachable at shutdown")
+                        return
+                    # Retry the batch first; keep the newest events if that overflows the buffer
+                    self._pending.extendleft(reversed(batch))
+                    while len(self._pending) > self.max_pending:
+                        self._pending.popleft()
+                        self.dropped += 1
+                    self._cond.wait(RETRY_SECONDS)
+
+    def _write(self, rows):
+        """Insert rows in one statement; False if the database could not be reached (rows are kept)"""
+        try:
+            conn, db_type = self._connect()
+        except Exception as e:
+            print(f"Action log writer could not connect: {e}")
+            return False
+        try:
+            cursor = conn.cursor()
+            values = ', '.join('(?, ?, ?, ?, ?)' for _ in rows)
+            try:
+                with transaction(conn, db_type):
+                    cursor.execute(adapt_query(f"INSERT INTO action_log ({COLUMNS}) VALUES {values}", db_type),
+                                   tuple(value for row in rows for value in row))
+            except Exception as e:
+                # One bad row (e.g. a table deleted meanwhile) must not cost the whole batch
+                print(f"Action log batch of {len(rows)} failed ({e}); writing rows one at a time")
+                for row in rows:
+                    try:
+                        with transaction(conn, db_type):
+                            cursor.execute(adapt_query(f"INSERT INTO action_log ({COLUMNS}) VALUES (?, ?, ?, ?, ?)", db_type), row)
+                    except Exception as e:
+                        self._drop([row], e)
+                        continue
+                    self.written += 1
+                return True
+            self.written += len(rows)
+            return True
+        finally:
+            conn.close()
+
+    def _drop(self, rows, reason):
+        self.failed += len(rows)
+        for row in rows:
+            print(f"Action log event lost ({reason}): {row[2]} table={row[1]} details={row[3]}")
+
+    def flush(self, timeout=None):
+        """Write everything queued so far without waiting for the interval; False on timeout"""
+        self._start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Stop the writer after it has written everything pending; later events are written inline"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            # Nothing started the thread, or it gave up: write the rest here
+            rest = list(self._pending)
+            self._pending.clear()
+        for start in range(0, len(rest), self.batch_size):
+            batch = rest[start:start + self.batch_size]
+            if not self._write(batch):
+                self._drop(batch, "the database is unreachable at shutdown")
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {'pending': pending, 'written': self.written, 'dropped': self.dropped, 'failed': self.failed}
@@ -0,0 +1,218 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from seating import seat_parties
+from table_combinations import MAX_COMBINED_TABLES, best_combination, parse_adjacency
+from table_state import OK
+
+POLICIES = ('fifo', 'best_fit', 'backfill')
+
+class FreeTablePool:
+    """Free tables bucketed by capacity so the smallest fitting table is found in O(log k)"""
+
+    def __init__(self, tables):
+        self._buckets = defaultdict(list)
+        self._ids = {t['id'] for t in tables}
+        # Highest display_order first so pop() hands out the front-most table
+        for table in sorted(tables, key=lambda t: (t.get('display_order') or 0, t['id']), reverse=True):
+            self._buckets[table['capacity']].append(table)
+        self._capacities = sorted(self._buckets)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def ids(self):
+        return set(self._ids)
+
+    def largest_capacity(self):
+        return self._capacities[-1] if self._capacities else 0
+
+    def take(self, people_count):
+        """Remove and return the smallest free table that seats people_count, or None"""
+        index = bisect_left(self._capacities, people_count)
+        if index >= len(self._capacities):
+            return None
+        capacity = self._capacities[index]
+        bucket = self._buckets[capacity]
+        table = bucket.pop()
+        self._discard(table, bucket)
+        return table
+
+    def take_all(self, tables):
+        """Remove specific tables (e.g. a combination) from the pool"""
+        for table in tables:
+            bucket = self._buckets[table['capacity']]
+            bucket.remove(table)
+            self._discard(table, bucket)
+
+    def _discard(self, table, bucket):
+        self._ids.discard(table['id'])
+        if not bucket:
+            self._capacities.remove(table['capacity'])
+            del self._buckets[table['capacity']]
+
+def plan_allocations(queue, free_tables, policy='best_fit', skip_ahead=3, backfill_max=2,
+                     floor=None, adjacency=None, max_combined_tables=MAX_COMBINED_TABLES):
+    """Match waiting parties (oldest first) to free tables according to policy.
+
+    Parties larger than every free table are offered a combination of tables,
+    judged for adjacency against floor (all tables) or an explicit adjacency graph.
+    Returns a list of (party, [table, ...]) pairs. Nothing is written here.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown allocator policy: {policy}")
+
+    pool = FreeTablePool(free_tables)
+    plan = []
+    skipped = 0
+    blocked = False
+
+    for party in queue:
+        if not pool:
+            break
+        if blocked and policy == 'backfill' and party['people_count'] > backfill_max:
+            continue
+
+        table = pool.take(party['people_count'])
+        if table is not None:
+            plan.append((party, [table]))
+            continue
+
+        if max_combined_tables > 1 and party['people_count'] > pool.largest_capacity():
+            combination = best_combination(floor or free_tables, party['people_count'],
+                                           free_ids=pool.ids(), adjacency=adjacency,
+                                           max_tables=max_combined_tables)
+            if combination:
+                pool.take_all(combination)
+                plan.append((party, combination))
+                continue
+
+        if policy == 'fifo':
+            break
+        blocked = True
+        if policy == 'best_fit':
+            skipped += 1
+            if skipped > skip_ahead:
+                break
+
+    return plan
+
+class AutoAllocator:
+    """Background worker that seats queued parties when tables free up or parties arrive.
+
+    Routes call notify() after committing a relevant change; bursts of events are
+    coalesced into a single allocation round, and on_change is called once per round
+    that seated anyone. Each round reads through connect(); its seatings go through
+    write(apply), which runs apply(conn, db_type) - by default on a connection of
+    its own, or wherever the app sends its writes (e.g. a single writer thread).
+    """
+
+    def __init__(self, connect, settings, on_change=None, write=None):
+        self._connect = connect
+        self._settings = settings
+        self._on_change = on_change
+        self._write = write or self._write_directly
+        self._wake = threading.Event()
+        self._round_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.last_round_ms = None
+        self.last_round_seated = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='auto-allocator', daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=False):
+        """Stop the background thread; wait=True also waits for a round in progress to finish"""
+        self._stopping = True
+        self._wake.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def _write_directly(self, apply):
+        conn, db_type = self._connect()
+        try:
+            return apply(conn, db_type)
+        finally:
+            conn.close()
+
+    def notify(self, event=None):
+        """Signal that the queue or the set of free tables changed"""
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Auto-allocator round failed: {e}")
+
+    def run_once(self, force=False):
+        """Run one allocation round and return the list of seatings made.
+
+        force=True seats even when the auto-allocator setting is off (manual "run now").
+        """
+        settings = self._settings.all()
+        if not force and not settings['auto_allocator_enabled']:
+            return []
+
+        with self._round_lock:
+            started = time.perf_counter()
+            seated = []
+            try:
+                conn, db_type = self._connect()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute("SELECT id, name, phone_number, people_count, timestamp, version FROM users ORDER BY timestamp ASC, id ASC")
+                    queue = [dict(row) for row in cursor.fetchall()]
+                    if not queue:
+                        return []
+                    cursor.execute("SELECT id, table_number, capacity, status, display_order, version FROM tables")
+                    floor = [dict(row) for row in cursor.fetchall()]
+                finally:
+                    conn.close()
+                free_tables = [t for t in floor if t['status'] == 'free']
+
+                plan = plan_allocations(
+                    queue, free_tables,
+                    policy=settings['allocator_policy'],
+                    skip_ahead=settings['allocator_skip_ahead'],
+                    backfill_max=settings['allocator_backfill_max'],
+                    floor=floor,
+                    adjacency=parse_adjacency(settings['table_adjacency'], floor),
+                    max_combined_tables=settings['allocator_max_combined_tables'],
+                )
+                if not plan:
+                    return []
+                # Versions from the reads above: a party or table changed since then is skipped, not overwritten.
+                # The whole round is one transaction with a savepoint per party.
+                results = self._write(lambda conn, db_type: seat_parties(conn, db_type, [
+                    (party['id'], [t['id'] for t in tables], party['version'], {t['id']: t['version'] for t in tables})
+                    for party, tables in plan]))
+                for (party, tables), result in zip(plan, results):
+                    if result['status'] == OK:
+                        seated.append({
+                            'customer_id': party['id'],
+                            'name': party['name'],
+                            'people_count': party['people_count'],
+                            'table_numbers': [t['table_number'] for t in tables],
+                        })
+            finally:
+                self.last_round_ms = (time.perf_counter() - started) * 1000
+                self.last_round_seated = len(seated)
+
+        if seated and self._on_change:
+            self._on_change(seated)
+        return seated
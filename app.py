@@ -1,14 +1,30 @@
 import os
 import datetime
-from dotenv import load_dotenv
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, session
+import queue
+from flask import Flask, request, render_template, redirect, url_for, Response, flash, jsonify, session
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import sqlite3
+import floor_layout
+from allocator import AutoAllocator, POLICIES
+from batch_operations import APPLIED, MAX_OPERATIONS, BatchRolledBack, apply_operations
+from checkin import CheckInWriter, insert_parties
+from database import connect_sqlite, load_env, query_stats
+from health import HealthMonitor, http_status
+from metrics import Metrics
+import profiling
+from migrations import migrate, seed_tables
+from seating import record_departure, seat_party
+from settings_store import SettingsStore
+from sqlite_writer import SQLiteWriter
+from table_state import CONFLICT, INVALID, NOT_FOUND, OK, parse_version, transition_table
+from table_combinations import parse_adjacency, suggest_combinations
+from wait_estimator import WaitTimeEstimator
+from warmup import Warmup, compile_templates
 
 # Load environment variables
-load_dotenv()
+load_env()
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "fallback_secret_key_for_development_only")
@@ -20,67 +36,89 @@ CORS(app, supports_credentials=True, origins=[
     "https://*.onrender.com"
 ])
 
+subscribers = []
+
+metrics = Metrics()
+metrics.instrument(app)
+profiling.install(app)
+metrics.gauge('restroflow_sse_subscribers', 'Connected /stream clients.', lambda: len(subscribers))
+
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "supersecret")
 
 def get_db_connection():
     """Simple SQLite connection for now"""
-    conn = sqlite3.connect("users.db", detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return connect_sqlite()
+
+def get_db_session():
+    """Connection plus backend name, as expected by the shared allocator module"""
+    return get_db_connection(), 'sqlite'
+
+# SQLITE_SINGLE_WRITER=1: queue and table mutations go through one writer thread, reads use read-only WAL connections
+writer = SQLiteWriter() if os.getenv('SQLITE_SINGLE_WRITER') == '1' else None
+if writer is not None:
+    metrics.gauge('restroflow_sqlite_writer_batches_total', 'Transactions committed by the single writer.', lambda: writer.batches, 'counter')
+    metrics.gauge('restroflow_sqlite_writer_mutations_total', 'Mutations applied by the single writer.', lambda: writer.mutations, 'counter')
+    metrics.gauge('restroflow_sqlite_writer_queued', 'Mutations waiting for the single writer.', lambda: writer.stats()['queued'])
+
+def read_connection():
+    """Connection for requests that only read"""
+    return writer.reader() if writer is not None else get_db_connection()
+
+def write(apply):
+    """Run apply(conn) and commit it; returns what apply returned"""
+    if writer is not None:
+        return writer.submit(apply)
+    with get_db_connection() as conn:
+        result = apply(conn)
+        conn.commit()
+    return result
+
+def write_session(apply):
+    """write() for the shared modules, whose callbacks take (conn, db_type)"""
+    return write(lambda conn: apply(conn, 'sqlite'))
+
+def notify_clients():
+    """Tell connected /stream clients that the floor or queue changed"""
+    for q in list(subscribers):
+        try:
+            q.put("update")
+        except Exception as e:
+            print(f"Failed to notify a /stream client: {e}")
+            subscribers.remove(q)
+
+settings = SettingsStore(get_db_session, write=write_session)
+allocator = AutoAllocator(get_db_session, settings, on_change=lambda seated: notify_clients(), write=write_session)
+settings.subscribe(lambda changed: allocator.notify('settings'))
+wait_estimator = WaitTimeEstimator()
+check_ins = CheckInWriter(get_db_session)
+
+def warm_floor_state():
+    """Run the dashboard's floor and queue reads once and fill the wait-time estimator"""
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM tables ORDER BY display_order ASC")
+        tables = len(cursor.fetchall())
+        cursor.execute("SELECT * FROM users ORDER BY timestamp ASC")
+        waiting = len(cursor.fetchall())
+        wait_estimator.refresh_if_stale(conn, 'sqlite')
+    return {"tables": tables, "waiting": waiting}
+
+health = HealthMonitor(lambda wait: get_db_session())
+
+warmup = Warmup()
+warmup.step('database', health.require_database)
+warmup.step('settings', settings.reload)
+warmup.step('floor_state', warm_floor_state)
+warmup.step('templates', lambda: compile_templates(app))
 
 def init_db():
     """Initialize database with error handling"""
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                    phone_number TEXT, 
-                    name TEXT, 
-                    people_count INTEGER, 
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tables (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                    table_number TEXT NOT NULL UNIQUE, 
-                    capacity INTEGER NOT NULL, 
-                    status TEXT DEFAULT 'free', 
-                    occupied_by_user_id INTEGER, 
-                    occupied_timestamp DATETIME, 
-                    customer_name TEXT, 
-                    people_count INTEGER, 
-                    customer_phone_number TEXT, 
-                    display_order INTEGER
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS waiters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password_hash TEXT NOT NULL
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY, 
-                    value TEXT NOT NULL
-                )
-            """)
-            cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('auto_allocator_enabled', 'True')")
-            
+            migrate(conn, 'sqlite')
             # Add default tables if none exist
-            cursor.execute("SELECT COUNT(*) FROM tables")
-            if cursor.fetchone()[0] == 0:
-                tables_to_add = []
-                for i in range(1, 21):  # Just 20 tables for simplicity
-                    tables_to_add.append((f"T{i}", 4, i-1))
-                cursor.executemany("INSERT INTO tables (table_number, capacity, display_order) VALUES (?, ?, ?)", tables_to_add)
-            
-            conn.commit()
+            seed_tables(conn, 'sqlite', [(f"T{i}", 4) for i in range(1, 21)])  # Just 20 tables for simplicity
         print("✅ Database initialization complete")
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
@@ -109,26 +147,34 @@ def login_required(role="any"):
         return decorated_function
     return decorator
 
+@app.route('/health/live')
+def liveness_check():
+    """Liveness: the process is serving requests. Never touches the database."""
+    return jsonify({"status": "alive"}), 200
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness: 200 once the warm-up has finished, 503 until then"""
+    # Started here too when served by something other than __main__
+    warmup.start()
+    status = warmup.status()
+    return jsonify(dict(status, status="ready" if status['ready'] else "warming_up")), 200 if status['ready'] else 503
+
+def health_snapshot():
+    """Cached health; never queues behind requests. ?deep=1 runs a live probe at most every few seconds."""
+    if request.args.get('deep') in ('1', 'true'):
+        ran, ok = health.deep_probe()
+        snapshot = health.snapshot()
+        snapshot['probe'] = {'ran': ran, 'ok': ok, 'latency_ms': snapshot['last_latency_ms'] if ok else None}
+        return snapshot
+    health.refresh_in_background()
+    return health.snapshot()
+
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM tables")
-            count = cursor.fetchone()[0]
-        return jsonify({
-            "status": "healthy",
-            "database": "sqlite",
-            "tables": count,
-            "timestamp": datetime.datetime.now().isoformat()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            "status": "degraded",
-            "error": str(e),
-            "timestamp": datetime.datetime.now().isoformat()
-        }), 200  # Return 200 even on DB error so health check passes
+    """Health from cached state; ?deep=1 adds a rate-limited live database probe"""
+    snapshot = health_snapshot()
+    return jsonify(snapshot), http_status(snapshot)
 
 @app.route("/")
 def home():
@@ -171,7 +217,7 @@ def login():
                 # Redirect for HTML templates
                 return redirect(url_for('dashboard'))
         
-        with get_db_connection() as conn:
+        with read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM waiters WHERE username = ?', (username,))
             waiter = cursor.fetchone()
@@ -214,12 +260,12 @@ def logout():
 @login_required(role="admin")
 def dashboard():
     try:
-        with get_db_connection() as conn:
+        with read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id, username FROM waiters ORDER BY username")
             waiters_list = [dict(row) for row in cursor.fetchall()]
             
-            cursor.execute("SELECT id, table_number FROM tables ORDER BY display_order")
+            cursor.execute("SELECT id, table_number FROM tables ORDER BY sort_key")
             tables_for_filter_list = [dict(row) for row in cursor.fetchall()]
     except Exception as e:
         print(f"Dashboard DB error: {e}")
@@ -235,9 +281,12 @@ def dashboard():
 @app.route('/api/dashboard_data')
 @login_required(role="admin")
 def api_dashboard_data():
-    with get_db_connection() as conn:
+    with read_connection() as conn:
         cursor = conn.cursor()
         
+        # Read the layout version first: a change racing this request then only causes a redundant reload
+        version = floor_layout.floor_version(cursor)
+        
         # Get all tables
         cursor.execute("SELECT * FROM tables ORDER BY display_order ASC")
         all_tables = [dict(row) for row in cursor.fetchall()]
@@ -249,11 +298,13 @@ def api_dashboard_data():
         # Get waiters
         cursor.execute("SELECT id, username FROM waiters ORDER BY username")
         waiters_list = [dict(row) for row in cursor.fetchall()]
-        
-        # Get auto allocator status
-        cursor.execute("SELECT value FROM settings WHERE key = 'auto_allocator_enabled'")
-        auto_allocator_row = cursor.fetchone()
-        auto_allocator_status = 'ON' if (auto_allocator_row and auto_allocator_row['value'] == 'True') else 'OFF'
+
+        wait_estimator.refresh_if_stale(conn, 'sqlite')
+
+    for customer, estimate in zip(waiting_customers, wait_estimator.estimate(waiting_customers, all_tables)):
+        customer['eta_minutes'] = estimate['eta_minutes']
+
+    auto_allocator_status = 'ON' if settings.get('auto_allocator_enabled') else 'OFF'
 
     # Simple analytics
     analytics = {
@@ -266,6 +317,7 @@ def api_dashboard_data():
     return jsonify(
         customers=waiting_customers, 
         all_tables=all_tables,
+        floor_version=version,
         occupied_tables=[t for t in all_tables if t['status'] == 'occupied'],
         free_tables=[t for t in all_tables if t['status'] == 'free'],
         analytics=analytics, 
@@ -275,6 +327,18 @@ def api_dashboard_data():
         history_data=[]
     )
 
+@app.route("/stream")
+@login_required(role="admin")
+def stream():
+    """Server-sent events for the admin dashboard; a message means "reload", e.g. after an auto-seating round"""
+    def event_stream(q):
+        while True:
+            yield f"data: {q.get()}\n\n"
+
+    q = queue.Queue()
+    subscribers.append(q)
+    return Response(event_stream(q), mimetype="text/event-stream")
+
 @app.route('/waiter')
 @login_required(role="waiter")
 def waiter_dashboard():
@@ -283,61 +347,68 @@ def waiter_dashboard():
 @app.route('/api/waiter_data')
 @login_required(role="waiter")
 def api_waiter_data():
-    with get_db_connection() as conn:
+    with read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM tables ORDER BY display_order ASC")
         all_tables = [dict(row) for row in cursor.fetchall()]
     return jsonify(all_tables=all_tables)
 
+def transition_error(result, action_description):
+    """JSON error for a table transition that did not apply"""
+    table = result['table']
+    if result['status'] == NOT_FOUND:
+        return jsonify({"status": "error", "message": "Table not found."}), 404
+    if result['status'] == CONFLICT:
+        message = f"Table {table['table_number']} was just changed by someone else. Please review and try again."
+    else:
+        message = f"Table {table['table_number']} is {table['status']} and cannot be {action_description}."
+    return jsonify({"status": "error", "message": message, "conflict": True, "table": table}), 409
+
 # Essential table management routes
 @app.route('/block_table', methods=['POST'])
 @login_required(role="any")
 def block_table():
     table_id = request.form.get('table_id')
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE tables SET status = 'blocked' WHERE id = ?", (table_id,))
-        conn.commit()
-    return jsonify({"status": "success", "message": "Table marked as unavailable."})
+    version = parse_version(request.form.get('version'))
+    result = write(lambda conn: transition_table(conn, 'sqlite', table_id, 'block', version))
+    if result['status'] in (CONFLICT, INVALID, NOT_FOUND):
+        return transition_error(result, "marked unavailable")
+    return jsonify({"status": "success", "message": "Table marked as unavailable.", "table": result['table']})
 
 @app.route('/free_table', methods=['POST'])
 @login_required(role="any")
 def free_table():
     table_id = request.form.get('table_id')
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT table_number FROM tables WHERE id = ?", (table_id,))
-        table_info = cursor.fetchone()
-        
-        if table_info:
-            cursor.execute("UPDATE tables SET status = 'free', customer_name = NULL, people_count = NULL, customer_phone_number = NULL, occupied_timestamp = NULL WHERE id = ?", (table_id,))
-            conn.commit()
-            return jsonify({"status": "success", "message": f"Table {table_info['table_number']} marked as free."})
-        else: 
-            return jsonify({"status": "error", "message": "Could not free table."}), 400
+    version = parse_version(request.form.get('version'))
+
+    def free(conn):
+        result = transition_table(conn, 'sqlite', table_id, 'free', version)
+        if result['status'] == OK:
+            record_departure(conn.cursor(), 'sqlite', table_id, datetime.datetime.now())
+        return result
+
+    result = write(free)
+    if result['status'] == NOT_FOUND:
+        return jsonify({"status": "error", "message": "Could not free table."}), 400
+    if result['status'] in (CONFLICT, INVALID):
+        return transition_error(result, "marked free")
+    table_number = result['table']['table_number']
+    wait_estimator.mark_stale()
+    allocator.notify('free_table')
+    return jsonify({"status": "success", "message": f"Table {table_number} marked as free.", "table": result['table']})
 
 @app.route('/add_table', methods=['POST'])
 @login_required(role="admin")
 def add_table():
     try:
         capacity = int(request.form.get('capacity', 4))
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM tables")
-            count = cursor.fetchone()[0]
-            next_table_number = f"T{count + 1}"
-            
-            cursor.execute("INSERT INTO tables (table_number, capacity, display_order) VALUES (?, ?, ?)", (next_table_number, capacity, count))
-            conn.commit()
-            
-            cursor.execute("SELECT * FROM tables ORDER BY display_order ASC")
-            all_tables = [dict(row) for row in cursor.fetchall()]
-            
-            return jsonify({
-                "status": "success", 
-                "message": f'Table "{next_table_number}" added successfully!', 
-                "all_tables": all_tables
-            })
+        table, version = write(lambda conn: floor_layout.add_table(conn, 'sqlite', capacity))
+        return jsonify({
+            "status": "success", 
+            "message": f'Table "{table["table_number"]}" added successfully!', 
+            "table": table,
+            "floor_version": version
+        })
     except Exception as e:
         return jsonify({"status": "error", "message": f'Error adding table: {e}'}), 500
 
@@ -345,22 +416,27 @@ def add_table():
 @login_required(role="admin")
 def delete_table(table_id):
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT table_number FROM tables WHERE id = ?", (table_id,))
-            table = cursor.fetchone()
-            if not table:
-                return jsonify({"status": "error", "message": "Table not found."}), 404
-            
-            cursor.execute("DELETE FROM tables WHERE id = ?", (table_id,))
-            conn.commit()
-
-            cursor.execute("SELECT * FROM tables ORDER BY display_order ASC")
-            all_tables = [dict(row) for row in cursor.fetchall()]
-            return jsonify({"status": "success", "message": f'Table "{table["table_number"]}" deleted successfully!', "all_tables": all_tables})
+        table, version = write(lambda conn: floor_layout.delete_table(conn, 'sqlite', table_id))
+        if not table:
+            return jsonify({"status": "error", "message": "Table not found."}), 404
+        return jsonify({"status": "success", "message": f'Table "{table["table_number"]}" deleted successfully!', "table_id": table["id"], "floor_version": version})
     except Exception as e:
         return jsonify({"status": "error", "message": f'Error deleting table: {e}'}), 500
 
+@app.route('/rename_table/<int:table_id>', methods=['POST'])
+@login_required(role="admin")
+def rename_table(table_id):
+    table_number = (request.form.get('table_number') or '').strip()
+    if not table_number:
+        return jsonify({"status": "error", "message": "Table name cannot be empty."}), 400
+    try:
+        table, version = write(lambda conn: floor_layout.rename_table(conn, 'sqlite', table_id, table_number))
+    except sqlite3.IntegrityError:
+        return jsonify({"status": "error", "message": f'Table "{table_number}" already exists.'}), 409
+    if not table:
+        return jsonify({"status": "error", "message": "Table not found or currently occupied."}), 404
+    return jsonify({"status": "success", "message": f'Table renamed to "{table_number}".', "table": table, "floor_version": version})
+
 @app.route('/add_customer', methods=['POST'])
 @login_required(role="admin")
 def add_customer():
@@ -377,36 +453,93 @@ def add_customer():
     except ValueError:
         return jsonify({"status": "error", "message": "Invalid party size. Please enter a valid number."}), 400
 
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO users (name, people_count, timestamp) VALUES (?, ?, ?)", (name.title(), people_count, datetime.datetime.now()))
-        conn.commit()
-        return jsonify({"status": "success", "message": f"Added {name.title()} to the queue."}), 200
+    if writer is not None:
+        # The writer already commits concurrent check-ins together
+        row = (name.title(), people_count, None, datetime.datetime.now())
+        customer_id = writer.submit(lambda conn: insert_parties(conn.cursor(), 'sqlite', [row])[0])
+    else:
+        customer_id = check_ins.add(name.title(), people_count)
+    allocator.notify('add_customer')
+    return jsonify({"status": "success", "message": f"Added {name.title()} to the queue.", "customer_id": customer_id}), 200
 
 @app.route('/remove_customer', methods=['POST'])
 @login_required(role="admin")
 def remove_customer():
     customer_id = request.form.get('customer_id')
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM users WHERE id = ?", (customer_id,))
-        conn.commit()
+    write(lambda conn: conn.execute("DELETE FROM users WHERE id = ?", (customer_id,)))
     return jsonify({"status": "success", "message": "Customer removed from queue."})
 
+@app.route('/api/batch', methods=['POST'])
+@login_required(role="any")
+def batch():
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"status": "error", "message": "operations must be a non-empty list."}), 400
+    if len(operations) > MAX_OPERATIONS:
+        return jsonify({"status": "error", "message": f"At most {MAX_OPERATIONS} operations per batch."}), 400
+    is_admin = bool(session.get('is_admin'))
+    atomic = bool(data.get('atomic'))
+    try:
+        # One transaction (one writer submission) for the whole batch
+        results = write(lambda conn: apply_operations(conn, 'sqlite', operations, is_admin, atomic))
+    except BatchRolledBack as e:
+        return batch_rolled_back(e.results)
+
+    applied = {result['op'] for result in results if result['status'] in APPLIED}
+    if 'free_table' in applied:
+        wait_estimator.mark_stale()
+    if applied & {'free_table', 'add_customer'}:
+        allocator.notify('batch')
+    return batch_response(results)
+
+def batch_rolled_back(results):
+    failed = results[-1]
+    message = f"Operation {failed['index'] + 1} ({failed['op']}) failed with {failed['status']}; nothing was applied."
+    return jsonify({"status": "error", "message": message, "applied": 0, "results": results}), 409
+
+def batch_response(results):
+    applied = sum(1 for result in results if result['status'] in APPLIED)
+    return jsonify({"status": "success", "message": f"{applied} of {len(results)} operations applied.", "applied": applied, "results": results})
+
 @app.route('/toggle_auto_allocator', methods=['POST'])
 @login_required(role="admin")
 def toggle_auto_allocator():
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT value FROM settings WHERE key = 'auto_allocator_enabled'")
-        current_status_row = cursor.fetchone()
-        current_status = current_status_row['value'] == 'True' if current_status_row else False
-        
-        new_status = not current_status
-        cursor.execute("UPDATE settings SET value = ? WHERE key = 'auto_allocator_enabled'", (str(new_status),))
-        conn.commit()
-        
-        return jsonify({"status": "success", "message": f"Auto-allocator turned {'ON' if new_status else 'OFF'}"})
+    new_status = settings.toggle('auto_allocator_enabled')
+    return jsonify({"status": "success", "message": f"Auto-allocator turned {'ON' if new_status else 'OFF'}"})
+
+@app.route('/allocator_policy', methods=['POST'])
+@login_required(role="admin")
+def update_allocator_policy():
+    policy = request.form.get('policy')
+    if policy not in POLICIES:
+        return jsonify({"status": "error", "message": f"Policy must be one of: {', '.join(POLICIES)}."}), 400
+
+    new_settings = {'allocator_policy': policy}
+    try:
+        for key in ('skip_ahead', 'backfill_max'):
+            value = request.form.get(key)
+            if value:
+                if int(value) < 0:
+                    raise ValueError
+                new_settings[f'allocator_{key}'] = int(value)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Skip-ahead and backfill limits must be non-negative numbers."}), 400
+
+    settings.update(**new_settings)
+    return jsonify({"status": "success", "message": f"Allocator policy set to {policy}."})
+
+@app.route('/run_auto_seat', methods=['POST'])
+@login_required(role="admin")
+def run_auto_seat():
+    seated = allocator.run_once(force=True)
+    if not seated:
+        return jsonify({"status": "success", "message": "No parties could be seated right now.", "seated": []})
+    return jsonify({
+        "status": "success",
+        "message": f"Seated {len(seated)} {'party' if len(seated) == 1 else 'parties'} ({allocator.last_round_ms:.1f} ms).",
+        "seated": seated
+    })
 
 @app.route('/admin/add_waiter', methods=['POST'])
 @login_required(role="admin")  
@@ -418,11 +551,8 @@ def add_waiter():
     
     hashed_password = generate_password_hash(password)
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO waiters (username, password_hash) VALUES (?, ?)", (username, hashed_password))
-            conn.commit()
-            return jsonify({"status": "success", "message": f"Waiter '{username}' added successfully."})
+        write(lambda conn: conn.execute("INSERT INTO waiters (username, password_hash) VALUES (?, ?)", (username, hashed_password)))
+        return jsonify({"status": "success", "message": f"Waiter '{username}' added successfully."})
     except Exception as e:
         return jsonify({"status": "error", "message": f"Username '{username}' already exists."}), 409
 
@@ -430,14 +560,8 @@ def add_waiter():
 @login_required(role="admin")
 def delete_waiter():
     waiter_id = request.form.get('waiter_id')
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT username FROM waiters WHERE id = ?", (waiter_id,))
-        waiter = cursor.fetchone()
-        if waiter:
-            cursor.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
-            conn.commit()
-            return jsonify({"status": "success", "message": "Waiter deleted."})
+    if write(lambda conn: conn.execute("DELETE FROM waiters WHERE id = ? RETURNING id", (waiter_id,)).fetchall()):
+        return jsonify({"status": "success", "message": "Waiter deleted."})
     return jsonify({"status": "error", "message": "Waiter not found."}), 404
 
 @app.route('/admin/edit_waiter', methods=['POST'])
@@ -449,62 +573,136 @@ def edit_waiter():
     if not new_username:
         return jsonify({"status": "error", "message": "Username cannot be empty."}), 400
     
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            if new_password:
-                hashed_password = generate_password_hash(new_password)
-                cursor.execute("UPDATE waiters SET username = ?, password_hash = ? WHERE id = ?", (new_username, hashed_password, waiter_id))
-                conn.commit()
-                return jsonify({"status": "success", "message": f"Waiter '{new_username}' updated (password changed)."})
-            else:
-                cursor.execute("UPDATE waiters SET username = ? WHERE id = ?", (new_username, waiter_id))
-                conn.commit()
-                return jsonify({"status": "success", "message": f"Waiter username updated to '{new_username}'."})
-        except Exception as e:
-            return jsonify({"status": "error", "message": f"Username '{new_username}' is already taken."}), 409
+    try:
+        if new_password:
+            hashed_password = generate_password_hash(new_password)
+            write(lambda conn: conn.execute("UPDATE waiters SET username = ?, password_hash = ? WHERE id = ?", (new_username, hashed_password, waiter_id)))
+            return jsonify({"status": "success", "message": f"Waiter '{new_username}' updated (password changed)."})
+        else:
+            write(lambda conn: conn.execute("UPDATE waiters SET username = ? WHERE id = ?", (new_username, waiter_id)))
+            return jsonify({"status": "success", "message": f"Waiter username updated to '{new_username}'."})
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Username '{new_username}' is already taken."}), 409
 
 @app.route('/seat_manually', methods=['POST'])
 @login_required(role="admin")
 def seat_manually():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     customer_id = data.get('customer_id')
     table_ids = data.get('table_ids', [])
 
     if not customer_id or not table_ids:
         return jsonify({"status": "error", "message": "Missing customer or table selection."}), 400
+    try:
+        customer_id = int(customer_id)
+        if not isinstance(table_ids, list):
+            raise TypeError(table_ids)
+        table_ids = [int(table_id) for table_id in table_ids]
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Invalid customer or table selection."}), 400
+
+    table_versions = data.get('table_versions') or {}
+    customer_version = parse_version(data.get('customer_version'))
+    table_versions = {table_id: parse_version(table_versions.get(str(table_id))) for table_id in table_ids}
+    # Tables, queue row and customer_history are written in one transaction; any miss changes nothing
+    result = write(lambda conn: seat_party(conn, 'sqlite', customer_id, table_ids,
+                                           customer_version=customer_version, table_versions=table_versions))
+    if result['status'] == NOT_FOUND:
+        return jsonify({"status": "error", "message": "Customer not found."}), 400
+    if result['status'] == CONFLICT:
+        return jsonify({"status": "error", "message": "The customer or one of the selected tables was just changed by someone else. Please review and try again.", "conflict": True}), 409
+    return jsonify({"status": "success", "message": "Customer seated successfully."})
+
+@app.route('/api/queue_eta')
+@login_required(role="admin")
+def api_queue_eta():
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, people_count FROM users ORDER BY timestamp ASC")
+        queue = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT capacity, status, occupied_timestamp FROM tables")
+        tables = [dict(row) for row in cursor.fetchall()]
+        wait_estimator.refresh_if_stale(conn, 'sqlite')
+    return jsonify(status="success", estimates=wait_estimator.estimate(queue, tables))
+
+@app.route('/api/query_stats')
+@login_required(role="admin")
+def api_query_stats():
+    """Per-statement database timings, slowest total first; ?order=max|calls|rows, ?reset=1 starts over"""
+    order = request.args.get('order', 'total')
+    if order not in ('total', 'max', 'calls', 'rows'):
+        return jsonify({"status": "error", "message": "order must be one of total, max, calls, rows."}), 400
+    statements = query_stats.top(limit=request.args.get('limit', 50, type=int), order=order)
+    if request.args.get('reset') == '1':
+        query_stats.reset()
+    return jsonify(status="success", slow_query_ms=query_stats.slow_ms, statements=statements)
+
+@app.route('/api/table_suggestions')
+@login_required(role="admin")
+def api_table_suggestions():
+    customer_id = request.args.get('customer_id')
+    people_count_str = request.args.get('people_count')
 
-    # Simple implementation - just remove customer and mark first table as occupied
-    with get_db_connection() as conn:
+    with read_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT name FROM users WHERE id = ?", (customer_id,))
-        customer = cursor.fetchone()
-        if customer:
-            cursor.execute("DELETE FROM users WHERE id = ?", (customer_id,))
-            cursor.execute("UPDATE tables SET status = 'occupied', customer_name = ? WHERE id = ?", (customer['name'], table_ids[0]))
-            conn.commit()
-            return jsonify({"status": "success", "message": "Customer seated successfully."})
-        else:
-            return jsonify({"status": "error", "message": "Customer not found."}), 400
+        if customer_id:
+            cursor.execute("SELECT people_count FROM users WHERE id = ?", (customer_id,))
+            customer = cursor.fetchone()
+            if not customer:
+                return jsonify({"status": "error", "message": "Customer not found."}), 404
+            people_count_str = str(customer['people_count'])
+
+        try:
+            people_count = int(people_count_str)
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "A customer or a valid party size is required."}), 400
+
+        cursor.execute("SELECT id, table_number, capacity, status, display_order FROM tables")
+        floor = [dict(row) for row in cursor.fetchall()]
+
+    adjacency = parse_adjacency(settings.get('table_adjacency'), floor)
+    suggestions = suggest_combinations(floor, people_count, adjacency=adjacency)
+    return jsonify(
+        status="success",
+        people_count=people_count,
+        suggestions=[{
+            'table_ids': [t['id'] for t in s['tables']],
+            'table_numbers': [t['table_number'] for t in s['tables']],
+            'capacity': s['capacity'],
+            'wasted_seats': s['wasted_seats'],
+            'adjacent': s['adjacent'],
+        } for s in suggestions]
+    )
 
 @app.route('/update_table_order', methods=['POST'])
 @login_required(role="admin")
 def update_table_order():
-    ordered_ids = request.json.get('order', [])
-    if not ordered_ids:
+    data = request.get_json(silent=True) or {}
+    moves = data.get('moves')
+    ordered_ids = data.get('order', [])
+    if not moves and not ordered_ids:
         return jsonify({"status": "error", "message": "No order data received."}), 400
-    
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            for index, table_id in enumerate(ordered_ids):
-                cursor.execute("UPDATE tables SET display_order = ? WHERE id = ?", (index, int(table_id)))
-            conn.commit()
-        return jsonify({"status": "success", "message": "Table order updated successfully."})
+        if moves:
+            moves = floor_layout.parse_moves(moves)
+        else:
+            ordered_ids = floor_layout.parse_order(ordered_ids)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        if moves:
+            # Drag-and-drop moves: normally one row each
+            display_orders, version = write(lambda conn: floor_layout.move_tables(conn, 'sqlite', moves))
+        else:
+            version = write(lambda conn: floor_layout.reorder_tables(conn, 'sqlite', ordered_ids))
+            display_orders = None
+        return jsonify({"status": "success", "message": "Table order updated successfully.", "display_orders": display_orders, "floor_version": version})
     except Exception as e:
         return jsonify({"status": "error", "message": "An error occurred while saving."}), 500
 
 if __name__ == "__main__":
     init_db()
+    warmup.start()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -4,15 +4,28 @@ import math
 from collections import defaultdict
 import pytz
 import queue
-from dotenv import load_dotenv
 from flask import Flask, request, render_template, redirect, url_for, Response, flash, jsonify, session
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from database import get_db_connection, init_db
+from database import driver_error, get_db_connection, init_db, load_env, pool_stats, query_stats, transaction, warm_pool
+from action_log import ActionLogWriter
+from batch_operations import APPLIED, MAX_OPERATIONS, BatchRolledBack, apply_operations
+from checkin import CheckInWriter
+from health import HealthMonitor, http_status
+import floor_layout
+from allocator import AutoAllocator
+from seating import record_departure
+from settings_store import SettingsStore
+from table_state import CONFLICT, INVALID, NOT_FOUND, OK, parse_version, transition_table
+from table_combinations import best_combination
+from metrics import Metrics
+import profiling
+from wait_estimator import WaitTimeEstimator
+from warmup import Warmup, compile_templates
 
 # Load environment variables
-load_dotenv()
+load_env()
 
 IST = pytz.timezone('Asia/Kolkata')
 
@@ -26,6 +39,12 @@ ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "supersecret")
 user_states = {}
 subscribers = []
 
+metrics = Metrics()
+metrics.instrument(app)
+profiling.install(app)
+metrics.pool(pool_stats)
+metrics.gauge('restroflow_sse_subscribers', 'Connected /stream clients.', lambda: len(subscribers))
+
 def login_required(role="any"):
     def decorator(f):
         @wraps(f)
@@ -59,6 +78,25 @@ def notify_clients():
             print(f"[DEBUG] Failed to notify client: {e}")
             subscribers.remove(q)
 
+settings = SettingsStore(get_db_connection)
+allocator = AutoAllocator(get_db_connection, settings, on_change=lambda seated: notify_clients())
+
+def on_settings_changed(changed):
+    allocator.notify('settings')
+    notify_clients()
+
+settings.subscribe(on_settings_changed)
+
+action_log = ActionLogWriter(get_db_connection)
+check_ins = CheckInWriter(get_db_connection)
+wait_estimator = WaitTimeEstimator()
+metrics.gauge('restroflow_checkin_groups_total', 'Queue check-in transactions committed.', lambda: check_ins.groups, 'counter')
+metrics.gauge('restroflow_checkins_total', 'Parties added to the queue through group commit.', lambda: check_ins.check_ins, 'counter')
+metrics.gauge('restroflow_action_log_pending', 'Audit events waiting to be written.', lambda: action_log.stats()['pending'])
+metrics.gauge('restroflow_action_log_written_total', 'Audit events written.', lambda: action_log.written, 'counter')
+metrics.gauge('restroflow_action_log_dropped_total', 'Audit events dropped (buffer full or not writable).',
+              lambda: action_log.dropped + action_log.failed, 'counter')
+
 def parse_timestamp(row_dict, field_name):
     timestamp_str = row_dict.get(field_name)
     if isinstance(timestamp_str, str):
@@ -89,6 +127,29 @@ def get_waiting_customers():
     finally:
         conn.close()
 
+# Pooled PostgreSQL connections opened before the first request (no-op on SQLite)
+WARM_CONNECTIONS = int(os.getenv("DB_POOL_WARM", "4"))
+
+def warm_floor_state():
+    """Run the dashboard's floor, queue and layout-version reads once and fill the wait-time estimator"""
+    tables, waiting = get_all_tables(), get_waiting_customers()
+    conn, db_type = get_db_connection()
+    try:
+        floor_layout.floor_version(conn.cursor())
+        wait_estimator.refresh_if_stale(conn, db_type)
+    finally:
+        conn.close()
+    return {"tables": len(tables), "waiting": len(waiting)}
+
+health = HealthMonitor(get_db_connection, pool_stats)
+
+warmup = Warmup()
+warmup.step('database', health.require_database)
+warmup.step('connections', lambda: warm_pool(WARM_CONNECTIONS))
+warmup.step('settings', settings.reload)
+warmup.step('floor_state', warm_floor_state)
+warmup.step('templates', lambda: compile_templates(app))
+
 def get_dashboard_analytics():
     analytics = {'avg_wait_time': 0, 'longest_wait_time': 0, 'seated_today': 0, 'peak_hours_data': {}}
     now = datetime.datetime.now()
@@ -130,39 +191,40 @@ def get_dashboard_analytics():
             
     return analytics
 
-def log_action(conn, action, table_id=None, details=None):
+def log_action(action, table_id=None, details=None):
+    """Queue an audit event for the background writer; call it once the change has committed"""
     waiter_id = session.get('waiter_id')
     if session.get('is_admin') or waiter_id:
-        ist_time = datetime.datetime.now(IST)
-        cursor = conn.cursor()
-        if hasattr(conn, 'autocommit'):  # PostgreSQL
-            cursor.execute(
-                "INSERT INTO action_log (waiter_id, table_id, action, details, timestamp) VALUES (%s, %s, %s, %s, %s)",
-                (waiter_id, table_id, action, details, ist_time)
-            )
-        else:  # SQLite
-            cursor.execute(
-                "INSERT INTO action_log (waiter_id, table_id, action, details, timestamp) VALUES (?, ?, ?, ?, ?)",
-                (waiter_id, table_id, action, details, ist_time)
-            )
+        action_log.log(waiter_id, table_id, action, details, datetime.datetime.now(IST))
+
+@app.route('/health/live')
+def liveness_check():
+    """Liveness: the process is serving requests. Never touches the database."""
+    return jsonify({"status": "alive"}), 200
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness: 200 once the warm-up has finished, 503 until then"""
+    # Started here too when served by something other than __main__
+    warmup.start()
+    status = warmup.status()
+    return jsonify(dict(status, status="ready" if status['ready'] else "warming_up")), 200 if status['ready'] else 503
+
+def health_snapshot():
+    """Cached health; never queues behind requests. ?deep=1 runs a live probe at most every few seconds."""
+    if request.args.get('deep') in ('1', 'true'):
+        ran, ok = health.deep_probe()
+        snapshot = health.snapshot()
+        snapshot['probe'] = {'ran': ran, 'ok': ok, 'latency_ms': snapshot['last_latency_ms'] if ok else None}
+        return snapshot
+    health.refresh_in_background()
+    return health.snapshot()
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint for monitoring"""
-    try:
-        conn, db_type = get_db_connection()
-        conn.close()
-        return jsonify({
-            "status": "healthy",
-            "database": db_type,
-            "timestamp": datetime.datetime.now().isoformat()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            "status": "unhealthy",
-            "error": str(e),
-            "timestamp": datetime.datetime.now().isoformat()
-        }), 500
+    """Health from cached state for monitoring; ?deep=1 adds a rate-limited live database probe"""
+    snapshot = health_snapshot()
+    return jsonify(snapshot), http_status(snapshot)
 
 @app.route("/")
 @login_required(role="any")
@@ -222,10 +284,7 @@ def dashboard():
         all_waiters_rows = cursor.fetchall()
         waiters_list = [dict(row) for row in all_waiters_rows]
         
-        if db_type == 'postgresql':
-            cursor.execute("SELECT id, table_number FROM tables ORDER BY CAST(SUBSTRING(table_number FROM 2) AS INTEGER)")
-        else:
-            cursor.execute("SELECT id, table_number FROM tables ORDER BY CAST(SUBSTR(table_number, 2) AS INTEGER)")
+        cursor.execute("SELECT id, table_number FROM tables ORDER BY sort_key")
         tables_for_filter_rows = cursor.fetchall()
         tables_for_filter_list = [dict(row) for row in tables_for_filter_rows]
     finally:
@@ -249,31 +308,39 @@ def dashboard():
 @app.route('/api/dashboard_data')
 @login_required(role="admin")
 def api_dashboard_data():
-    all_tables = get_all_tables()
-    waiting_customers = get_waiting_customers()
-    analytics = get_dashboard_analytics()
-    
     conn, db_type = get_db_connection()
     try:
         cursor = conn.cursor()
+        # Read the layout version before the tables: a change racing this request then only causes a redundant reload
+        version = floor_layout.floor_version(cursor)
         cursor.execute("SELECT id, username FROM waiters ORDER BY username")
         waiter_rows = cursor.fetchall()
         waiters_list = [dict(row) for row in waiter_rows]
-        
-        cursor.execute("SELECT value FROM settings WHERE key = 'auto_allocator_enabled'")
-        auto_allocator_row = cursor.fetchone()
-        auto_allocator_status = 'ON' if (auto_allocator_row and auto_allocator_row['value'] == 'True') else 'OFF'
+        wait_estimator.refresh_if_stale(conn, db_type)
     finally:
         conn.close()
 
+    all_tables = get_all_tables()
+    waiting_customers = get_waiting_customers()
+    analytics = get_dashboard_analytics()
+
+    auto_allocator_status = 'ON' if settings.get('auto_allocator_enabled') else 'OFF'
+
     free_tables_sorted = sorted([t for t in all_tables if t['status'] == 'free'], key=lambda x: x['capacity'])
     customers_with_suggestions = [dict(c) for c in waiting_customers]
     for customer in customers_with_suggestions:
         customer['suggested_tables'] = [t['table_number'] for t in free_tables_sorted if t['capacity'] >= customer['people_count']]
+        if not customer['suggested_tables']:
+            combination = best_combination(all_tables, customer['people_count'])
+            if combination:
+                customer['suggested_tables'] = [' + '.join(t['table_number'] for t in combination)]
+    for customer, estimate in zip(customers_with_suggestions, wait_estimator.estimate(customers_with_suggestions, all_tables)):
+        customer['eta_minutes'] = estimate['eta_minutes']
 
     return jsonify(
         customers=customers_with_suggestions, 
         all_tables=all_tables,
+        floor_version=version,
         occupied_tables=[t for t in all_tables if t['status'] == 'occupied'],
         free_tables=[t for t in all_tables if t['status'] == 'free'],
         analytics=analytics, 
@@ -308,21 +375,58 @@ def api_waiter_data():
     all_tables = get_all_tables()
     return jsonify(all_tables=all_tables)
 
+@app.route('/api/queue_eta')
+@login_required(role="admin")
+def api_queue_eta():
+    conn, db_type = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, people_count FROM users ORDER BY timestamp ASC")
+        queue = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("SELECT capacity, status, occupied_timestamp FROM tables")
+        tables = [dict(row) for row in cursor.fetchall()]
+        wait_estimator.refresh_if_stale(conn, db_type)
+    finally:
+        conn.close()
+    return jsonify(status="success", estimates=wait_estimator.estimate(queue, tables))
+
+@app.route('/api/query_stats')
+@login_required(role="admin")
+def api_query_stats():
+    """Per-statement database timings, slowest total first; ?order=max|calls|rows, ?reset=1 starts over"""
+    order = request.args.get('order', 'total')
+    if order not in ('total', 'max', 'calls', 'rows'):
+        return jsonify({"status": "error", "message": "order must be one of total, max, calls, rows."}), 400
+    statements = query_stats.top(limit=request.args.get('limit', 50, type=int), order=order)
+    if request.args.get('reset') == '1':
+        query_stats.reset()
+    return jsonify(status="success", slow_query_ms=query_stats.slow_ms, statements=statements)
+
+def transition_error(result, action_description):
+    """JSON error for a table transition that did not apply"""
+    table = result['table']
+    if result['status'] == NOT_FOUND:
+        return jsonify({"status": "error", "message": "Table not found."}), 404
+    if result['status'] == CONFLICT:
+        message = f"Table {table['table_number']} was just changed by someone else. Please review and try again."
+    else:
+        message = f"Table {table['table_number']} is {table['status']} and cannot be {action_description}."
+    return jsonify({"status": "error", "message": message, "conflict": True, "table": table}), 409
+
 @app.route('/block_table', methods=['POST'])
 @login_required(role="any")
 def block_table():
     table_id = request.form.get('table_id')
     conn, db_type = get_db_connection()
     try:
-        cursor = conn.cursor()
-        if db_type == 'postgresql':
-            cursor.execute("UPDATE tables SET status = 'blocked' WHERE id = %s", (table_id,))
-        else:
-            cursor.execute("UPDATE tables SET status = 'blocked' WHERE id = ?", (table_id,))
-        log_action(conn, 'blocked', table_id=table_id)
+        result = transition_table(conn, db_type, table_id, 'block', parse_version(request.form.get('version')))
+        if result['status'] in (CONFLICT, INVALID, NOT_FOUND):
+            return transition_error(result, "marked unavailable")
+        conn.commit()
     finally:
         conn.close()
-    return jsonify({"status": "success", "message": "Table marked as unavailable."})
+    log_action('blocked', table_id=table_id)
+    return jsonify({"status": "success", "message": "Table marked as unavailable.", "table": result['table']})
 
 @app.route('/free_table', methods=['POST'])
 @login_required(role="any")
@@ -330,24 +434,31 @@ def free_table():
     table_id = request.form.get('table_id')
     conn, db_type = get_db_connection()
     try:
-        cursor = conn.cursor()
-        if db_type == 'postgresql':
-            cursor.execute("SELECT table_number, status, customer_name FROM tables WHERE id = %s", (table_id,))
-        else:
-            cursor.execute("SELECT table_number, status, customer_name FROM tables WHERE id = ?", (table_id,))
-        table_info = cursor.fetchone()
-        
-        if table_info:
+        # One transaction: freeing the table and closing its history row land together or not at all
+        with transaction(conn, db_type):
+            cursor = conn.cursor()
             if db_type == 'postgresql':
-                cursor.execute("UPDATE tables SET status = 'free', customer_name = NULL, people_count = NULL, customer_phone_number = NULL, occupied_timestamp = NULL WHERE id = %s", (table_id,))
+                cursor.execute("SELECT customer_name, version FROM tables WHERE id = %s", (table_id,))
             else:
-                cursor.execute("UPDATE tables SET status = 'free', customer_name = NULL, people_count = NULL, customer_phone_number = NULL, occupied_timestamp = NULL WHERE id = ?", (table_id,))
-            log_action(conn, 'cleared', table_id=table_id, details=table_info['customer_name'])
-            return jsonify({"status": "success", "message": f"Table {table_info['table_number']} marked as free."})
-        else: 
-            return jsonify({"status": "error", "message": "Could not free table."}), 400
+                cursor.execute("SELECT customer_name, version FROM tables WHERE id = ?", (table_id,))
+            table_info = cursor.fetchone()
+            if not table_info:
+                return jsonify({"status": "error", "message": "Could not free table."}), 400
+
+            expected_version = parse_version(request.form.get('version'))
+            result = transition_table(conn, db_type, table_id, 'free', table_info['version'] if expected_version is None else expected_version)
+            if result['status'] == NOT_FOUND:
+                return jsonify({"status": "error", "message": "Could not free table."}), 400
+            if result['status'] in (CONFLICT, INVALID):
+                return transition_error(result, "marked free")
+            if result['status'] == OK:
+                record_departure(cursor, db_type, table_id, datetime.datetime.now())
     finally:
         conn.close()
+    wait_estimator.mark_stale()
+    log_action('cleared', table_id=table_id, details=table_info['customer_name'])
+    allocator.notify('free_table')
+    return jsonify({"status": "success", "message": f"Table {result['table']['table_number']} marked as free.", "table": result['table']})
 
 @app.route('/add_table', methods=['POST'])
 @login_required(role="admin")
@@ -356,35 +467,14 @@ def add_table():
         capacity = int(request.form.get('capacity'))
         conn, db_type = get_db_connection()
         try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT table_number FROM tables")
-            tables = cursor.fetchall()
-            existing_numbers = {int(t['table_number'][1:]) for t in tables if t['table_number'].startswith('T')}
-            
-            next_num = 1
-            while next_num in existing_numbers:
-                next_num += 1
-            next_table_number = f"T{next_num}"
-            
-            cursor.execute("SELECT MAX(display_order) as max_order FROM tables")
-            last_order_row = cursor.fetchone()
-            next_order = 0
-            if last_order_row and last_order_row['max_order'] is not None:
-                next_order = last_order_row['max_order'] + 1
-
-            if db_type == 'postgresql':
-                cursor.execute("INSERT INTO tables (table_number, capacity, display_order) VALUES (%s, %s, %s)", (next_table_number, capacity, next_order))
-            else:
-                cursor.execute("INSERT INTO tables (table_number, capacity, display_order) VALUES (?, ?, ?)", (next_table_number, capacity, next_order))
-            
-            log_action(conn, 'table_added', details=f"{next_table_number} (Cap: {capacity})")
-            
-            all_tables = get_all_tables()
+            table, version = floor_layout.add_table(conn, db_type, capacity)
+            log_action('table_added', details=f"{table['table_number']} (Cap: {capacity})")
             
             return jsonify({
                 "status": "success", 
-                "message": f'Table "{next_table_number}" added successfully!', 
-                "all_tables": all_tables
+                "message": f'Table "{table["table_number"]}" added successfully!', 
+                "table": table,
+                "floor_version": version
             })
         finally:
             conn.close()
@@ -397,28 +487,71 @@ def delete_table(table_id):
     try:
         conn, db_type = get_db_connection()
         try:
-            cursor = conn.cursor()
-            if db_type == 'postgresql':
-                cursor.execute("SELECT table_number FROM tables WHERE id = %s", (table_id,))
-            else:
-                cursor.execute("SELECT table_number FROM tables WHERE id = ?", (table_id,))
-            table = cursor.fetchone()
+            table, version = floor_layout.delete_table(conn, db_type, table_id)
             if not table:
                 return jsonify({"status": "error", "message": "Table not found."}), 404
-            
-            if db_type == 'postgresql':
-                cursor.execute("DELETE FROM tables WHERE id = %s", (table_id,))
-            else:
-                cursor.execute("DELETE FROM tables WHERE id = ?", (table_id,))
-            log_action(conn, 'table_deleted', details=table['table_number'])
+            log_action('table_deleted', details=table['table_number'])
 
-            all_tables = get_all_tables()
-            return jsonify({"status": "success", "message": f'Table "{table["table_number"]}" deleted successfully!', "all_tables": all_tables})
+            return jsonify({"status": "success", "message": f'Table "{table["table_number"]}" deleted successfully!', "table_id": table["id"], "floor_version": version})
         finally:
             conn.close()
     except Exception as e:
         return jsonify({"status": "error", "message": f'Error deleting table: {e}'}), 500
 
+@app.route('/rename_table/<int:table_id>', methods=['POST'])
+@login_required(role="admin")
+def rename_table(table_id):
+    table_number = (request.form.get('table_number') or '').strip()
+    if not table_number:
+        return jsonify({"status": "error", "message": "Table name cannot be empty."}), 400
+    conn, db_type = get_db_connection()
+    try:
+        try:
+            table, version = floor_layout.rename_table(conn, db_type, table_id, table_number)
+        except driver_error(db_type, 'IntegrityError'):
+            return jsonify({"status": "error", "message": f'Table "{table_number}" already exists.'}), 409
+        if not table:
+            return jsonify({"status": "error", "message": "Table not found or currently occupied."}), 404
+    finally:
+        conn.close()
+    log_action('table_renamed', table_id=table_id, details=table_number)
+    notify_clients()
+    return jsonify({"status": "success", "message": f'Table renamed to "{table_number}".', "table": table, "floor_version": version})
+
+@app.route('/update_table_order', methods=['POST'])
+@login_required(role="admin")
+def update_table_order():
+    data = request.get_json(silent=True) or {}
+    moves = data.get('moves')
+    ordered_ids = data.get('order', [])
+    if not moves and not ordered_ids:
+        return jsonify({"status": "error", "message": "No order data received."}), 400
+    try:
+        if moves:
+            moves = floor_layout.parse_moves(moves)
+        else:
+            ordered_ids = floor_layout.parse_order(ordered_ids)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        conn, db_type = get_db_connection()
+        try:
+            if moves:
+                # Drag-and-drop moves: normally one row each
+                display_orders, version = floor_layout.move_tables(conn, db_type, moves)
+            else:
+                version = floor_layout.reorder_tables(conn, db_type, ordered_ids)
+                display_orders = None
+        finally:
+            conn.close()
+        log_action('table_order_updated', details=f"{len(moves) if moves else len(ordered_ids)} table(s)")
+        # One event for the whole reorder, however many tables moved
+        notify_clients()
+        return jsonify({"status": "success", "message": "Table order updated successfully.", "display_orders": display_orders, "floor_version": version})
+    except Exception as e:
+        return jsonify({"status": "error", "message": "An error occurred while saving."}), 500
+
 @app.route('/remove_customer', methods=['POST'])
 @login_required(role="admin")
 def remove_customer():
@@ -458,44 +591,78 @@ def add_customer():
         else:
             return jsonify({"status": "error", "message": "Invalid phone number. Please enter 10 digits."}), 400
 
-    conn, db_type = get_db_connection()
     try:
-        cursor = conn.cursor()
-        if db_type == 'postgresql':
-            cursor.execute("INSERT INTO users (name, people_count, phone_number, timestamp) VALUES (%s, %s, %s, %s)", (name.title(), people_count, final_phone_number, datetime.datetime.now()))
-        else:
-            cursor.execute("INSERT INTO users (name, people_count, phone_number, timestamp) VALUES (?, ?, ?, ?)", (name.title(), people_count, final_phone_number, datetime.datetime.now()))
-        
-        log_details = f"{name.title()} (Party of {people_count})"
-        log_action(conn, 'customer_added_manually', details=log_details)
-        return jsonify({"status": "success", "message": f"Added {name.title()} to the queue."}), 200
+        customer_id = check_ins.add(name.title(), people_count, final_phone_number)
     except Exception as e:
         return jsonify({"status": "error", "message": f"Error adding customer: {e}"}), 400
+
+    log_details = f"{name.title()} (Party of {people_count})"
+    log_action('customer_added_manually', details=log_details)
+    allocator.notify('add_customer')
+    return jsonify({"status": "success", "message": f"Added {name.title()} to the queue.", "customer_id": customer_id}), 200
+
+@app.route('/api/batch', methods=['POST'])
+@login_required(role="any")
+def batch():
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"status": "error", "message": "operations must be a non-empty list."}), 400
+    if len(operations) > MAX_OPERATIONS:
+        return jsonify({"status": "error", "message": f"At most {MAX_OPERATIONS} operations per batch."}), 400
+
+    conn, db_type = get_db_connection()
+    try:
+        with transaction(conn, db_type):
+            results = apply_operations(conn, db_type, operations, bool(session.get('is_admin')), bool(data.get('atomic')))
+    except BatchRolledBack as e:
+        return batch_rolled_back(e.results)
     finally:
         conn.close()
 
+    applied = [result for result in results if result['status'] in APPLIED]
+    for result in applied:
+        if result['op'] == 'free_table':
+            log_action('cleared', table_id=result['table']['id'], details=result['customer_name'])
+        elif result['op'] == 'block_table':
+            log_action('blocked', table_id=result['table']['id'])
+        elif result['op'] == 'add_customer':
+            log_action('customer_added_manually', details=f"{result['name']} (Party of {result['people_count']})")
+    if any(result['op'] == 'free_table' for result in applied):
+        wait_estimator.mark_stale()
+    if applied:
+        # One change event for the whole batch
+        notify_clients()
+    if any(result['op'] in ('free_table', 'add_customer') for result in applied):
+        allocator.notify('batch')
+    return batch_response(results)
+
+def batch_rolled_back(results):
+    failed = results[-1]
+    message = f"Operation {failed['index'] + 1} ({failed['op']}) failed with {failed['status']}; nothing was applied."
+    return jsonify({"status": "error", "message": message, "applied": 0, "results": results}), 409
+
+def batch_response(results):
+    applied = sum(1 for result in results if result['status'] in APPLIED)
+    return jsonify({"status": "success", "message": f"{applied} of {len(results)} operations applied.", "applied": applied, "results": results})
+
 @app.route('/toggle_auto_allocator', methods=['POST'])
 @login_required(role="admin")
 def toggle_auto_allocator():
-    conn, db_type = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        if db_type == 'postgresql':
-            cursor.execute("SELECT value FROM settings WHERE key = 'auto_allocator_enabled'")
-        else:
-            cursor.execute("SELECT value FROM settings WHERE key = 'auto_allocator_enabled'")
-        current_status_row = cursor.fetchone()
-        current_status = current_status_row['value'] == 'True' if current_status_row else False
-        
-        new_status = not current_status
-        if db_type == 'postgresql':
-            cursor.execute("UPDATE settings SET value = %s WHERE key = 'auto_allocator_enabled'", (str(new_status),))
-        else:
-            cursor.execute("UPDATE settings SET value = ? WHERE key = 'auto_allocator_enabled'", (str(new_status),))
-        
-        return jsonify({"status": "success", "message": f"Auto-allocator turned {'ON' if new_status else 'OFF'}"})
-    finally:
-        conn.close()
+    new_status = settings.toggle('auto_allocator_enabled')
+    return jsonify({"status": "success", "message": f"Auto-allocator turned {'ON' if new_status else 'OFF'}"})
+
+@app.route('/run_auto_seat', methods=['POST'])
+@login_required(role="admin")
+def run_auto_seat():
+    seated = allocator.run_once(force=True)
+    if not seated:
+        return jsonify({"status": "success", "message": "No parties could be seated right now.", "seated": []})
+    return jsonify({
+        "status": "success",
+        "message": f"Seated {len(seated)} {'party' if len(seated) == 1 else 'parties'} ({allocator.last_round_ms:.1f} ms).",
+        "seated": seated
+    })
 
 @app.route('/admin/add_waiter', methods=['POST'])
 @login_required(role="admin")  
@@ -513,7 +680,8 @@ def add_waiter():
             cursor.execute("INSERT INTO waiters (username, password_hash) VALUES (%s, %s)", (username, hashed_password))
         else:
             cursor.execute("INSERT INTO waiters (username, password_hash) VALUES (?, ?)", (username, hashed_password))
-        log_action(conn, 'waiter_added', details=username)
+        conn.commit()
+        log_action('waiter_added', details=username)
         return jsonify({"status": "success", "message": f"Waiter '{username}' added successfully."})
     except Exception as e:
         return jsonify({"status": "error", "message": f"Error adding waiter: {e}"}), 409
@@ -522,5 +690,6 @@ def add_waiter():
 
 if __name__ == "__main__":
     init_db()
+    warmup.start()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import datetime
+from checkin import insert_parties
+from database import adapt_query, driver_error
+from seating import record_departure
+from table_state import INVALID, NOT_FOUND, OK, UNCHANGED, parse_version, transition_table
+
+# Operations one batch may contain, and which of them only admins may run
+OPERATIONS = ('free_table', 'block_table', 'add_customer', 'remove_customer')
+ADMIN_OPERATIONS = ('add_customer', 'remove_customer')
+MAX_OPERATIONS = 200
+# Statuses that count as done; anything else means the item changed nothing
+APPLIED = (OK, UNCHANGED)
+
+class BatchRolledBack(Exception):
+    """Raised inside the transaction of an atomic batch with a failed item; carries the per-item results"""
+
+    def __init__(self, results):
+        super().__init__("batch rolled back")
+        self.results = results
+
+def apply_operations(conn, db_type, operations, is_admin, atomic=False):
+    """Apply operations in order inside the caller's transaction and return one result per item.
+
+    Each item is {'op': one of OPERATIONS, ...fields of the matching endpoint}.
+    A result is {'index', 'op', 'status', ...}; an item that fails (not found,
+    conflict, invalid or malformed fields, forbidden, or a database error such as
+    a repeated phone number) changes nothing and the rest still apply. Each item runs in its own
+    savepoint for that. With atomic=True the first failure raises
+    BatchRolledBack instead, so the caller's transaction rolls back and
+    nothing applies.
+    """
+    if db_type == 'sqlite' and not conn.in_transaction:
+        # Savepoints must sit inside the transaction, or releasing one would commit it
+        conn.execute("BEGIN")
+    cursor = conn.cursor()
+    now = datetime.datetime.now()
+    results = []
+    for index, item in enumerate(operations):
+        op = item.get('op') if isinstance(item, dict) else None
+        if op not in OPERATIONS:
+            result = {'status': INVALID, 'message': f"op must be one of: {', '.join(OPERATIONS)}."}
+        elif op in ADMIN_OPERATIONS and not is_admin:
+            result = {'status': 'forbidden', 'message': "Only admins can change the queue."}
+        else:
+            result = _apply_item(cursor, db_type, OPERATION_HANDLERS[op], conn, item, now)
+        result = {'index': index, 'op': op, **result}
+        results.append(result)
+        if atomic and result['status'] not in APPLIED:
+            raise BatchRolledBack(results)
+    return results
+
+def _apply_item(cursor, db_type, handler, conn, item, now):
+    cursor.execute("SAVEPOINT batch_item")
+    try:
+        result = handler(conn, cursor, db_type, item, now)
+    except driver_error(db_type) as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT batch_item")
+        result = {'status': INVALID if isinstance(e, driver_error(db_type, 'IntegrityError')) else 'error',
+                  'message': str(e).strip()}
+    except (ValueError, TypeError) as e:
+        # A malformed field that reached a conversion such as int() is this item's problem only
+        cursor.execute("ROLLBACK TO SAVEPOINT batch_item")
+        result = {'status': INVALID, 'message': str(e).strip()}
+    cursor.execute("RELEASE SAVEPOINT batch_item")
+    return result
+
+def _free_table(conn, cursor, db_type, item, now):
+    table_id = item.get('table_id')
+    if table_id in (None, ''):
+        return {'status': INVALID, 'message': "table_id is required."}
+    # The party's name is kept for the audit log; its version stands in for transition_table's own read
+    cursor.execute(adapt_query("SELECT customer_name, version FROM tables WHERE id = ?", db_type), (table_id,))
+    before = cursor.fetchone()
+    if before is None:
+        return {'status': NOT_FOUND, 'table': None}
+    version = parse_version(item.get('version'))
+    result = transition_table(conn, db_type, table_id, 'free', before['version'] if version is None else version)
+    if result['status'] == OK:
+        record_departure(cursor, db_type, table_id, now)
+    return {'status': result['status'], 'table': result['table'], 'customer_name': before['customer_name']}
+
+def _block_table(conn, cursor, db_type, item, now):
+    table_id = item.get('table_id')
+    if table_id in (None, ''):
+        return {'status': INVALID, 'message': "table_id is required."}
+    result = transition_table(conn, db_type, table_id, 'block', parse_version(item.get('version')))
+    return {'status': result['status'], 'table': result['table']}
+
+def _add_customer(conn, cursor, db_type, item, now):
+    name = item.get('name')
+    name = name.strip() if isinstance(name, str) else ''
+    try:
+        people_count = int(item.get('people_count'))
+    except (TypeError, ValueError, OverflowError):
+        people_count = 0
+    if not name or people_count < 1:
+        return {'status': INVALID, 'message': "A name and a positive party size are required."}
+    phone = str(item.get('phone_number') or '').strip()
+    if phone and not (len(phone) == 10 and phone.isdigit()):
+        return {'status': INVALID, 'message': "Invalid phone number. Please enter 10 digits."}
+    customer_id = insert_parties(cursor, db_type, [(name.title(), people_count, "+91" + phone if phone else None, now)])[0]
+    return {'status': OK, 'customer_id': customer_id, 'name': name.title(), 'people_count': people_count}
+
+def _remove_customer(conn, cursor, db_type, item, now):
+    cursor.execute(adapt_query("DELETE FROM users WHERE id = ? RETURNING id", db_type), (item.get('customer_id'),))
+    return {'status': OK if cursor.fetchall() else NOT_FOUND, 'customer_id': item.get('customer_id')}
+
+OPERATION_HANDLERS = {
+    'free_table': _free_table,
+    'block_table': _block_table,
+    'add_customer': _add_customer,
+    'remove_customer': _remove_customer,
+}
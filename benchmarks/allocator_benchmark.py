@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Allocator scalability benchmarks on synthetic floors and queues.
+
+Measures, for floors of 50 to 10,000 tables and queues of 10 to 100,000 parties:
+  - table_lookup:      smallest-fitting-table lookups against a capacity-bucketed pool
+  - best_fit_seating:  one in-memory best_fit planning pass over the whole queue
+  - combination:       combination solving for parties larger than any table
+  - allocation_round:  a full AutoAllocator.run_once against SQLite, commits included
+
+A round commits once, with a savepoint per party. The target is single-digit
+milliseconds per round with 200 parties waiting: 50 tables / 200 parties runs
+in about 4 ms. With 200 tables a round seats about 100 parties and takes 10-15 ms,
+just over target; what is left there is per-party statements, not commits.
+
+    python benchmarks/allocator_benchmark.py --output bench_allocator.json
+    python benchmarks/allocator_benchmark.py --quick
+
+Results are written as JSON so runs from different releases can be diffed.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocator import AutoAllocator, FreeTablePool, plan_allocations
+from migrations import migrate
+from settings_store import SettingsStore
+from table_combinations import suggest_combinations
+
+FLOOR_SIZES = [50, 200, 1000, 10000]
+QUEUE_SIZES = [10, 200, 1000, 10000, 100000]
+QUICK_FLOOR_SIZES = [50, 200]
+QUICK_QUEUE_SIZES = [10, 200, 1000]
+# Full DB rounds seat up to one party per table, so very long queues add nothing but setup time
+MAX_ROUND_QUEUE = 10000
+
+CAPACITY_WEIGHTS = {2: 30, 4: 45, 6: 15, 8: 7, 10: 3}
+PARTY_SIZE_WEIGHTS = {1: 8, 2: 30, 3: 15, 4: 22, 5: 8, 6: 8, 7: 3, 8: 3, 10: 2, 12: 1}
+
+def synthetic_floor(size, rng, occupied_share=0.5):
+    capacities = rng.choices(list(CAPACITY_WEIGHTS), weights=list(CAPACITY_WEIGHTS.values()), k=size)
+    return [{
+        'id': i + 1,
+        'table_number': f"T{i + 1}",
+        'capacity': capacity,
+        'status': 'occupied' if rng.random() < occupied_share else 'free',
+        'display_order': i,
+    } for i, capacity in enumerate(capacities)]
+
+def synthetic_queue(size, rng):
+    start = datetime.datetime(2025, 1, 1, 18, 0)
+    sizes = rng.choices(list(PARTY_SIZE_WEIGHTS), weights=list(PARTY_SIZE_WEIGHTS.values()), k=size)
+    return [{
+        'id': i + 1,
+        'name': f"Party {i + 1}",
+        'phone_number': None,
+        'people_count': people_count,
+        'timestamp': start + datetime.timedelta(seconds=i),
+    } for i, people_count in enumerate(sizes)]
+
+def measure(func, min_time=0.2, max_repeats=200, setup=None):
+    """Call func repeatedly (setup() before each call, untimed) and summarise the timings in ms"""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_repeats and (len(timings) < 3 or time.perf_counter() - started < min_time):
+        args = setup() if setup else ()
+        t0 = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    return {
+        'repeats': len(timings),
+        'min_ms': round(timings[0], 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        'max_ms': round(timings[-1], 4),
+    }
+
+def bench_table_lookup(floor, rng):
+    free = [t for t in floor if t['status'] == 'free']
+    lookups = [rng.choice(list(PARTY_SIZE_WEIGHTS)) for _ in range(1000)]
+
+    def run():
+        pool = FreeTablePool(free)
+        for people_count in lookups:
+            if not pool:
+                pool = FreeTablePool(free)
+            pool.take(people_count)
+
+    result = measure(run)
+    result['ops_per_sec'] = round(len(lookups) / (result['median_ms'] / 1000))
+    return result
+
+def bench_best_fit(floor, queue):
+    free = [t for t in floor if t['status'] == 'free']
+    seated = []
+
+    def run():
+        seated[:] = plan_allocations(queue, free, 'best_fit', skip_ahead=len(queue), floor=floor)
+
+    result = measure(run)
+    result['parties_seated'] = len(seated)
+    result['parties_per_sec'] = round(len(queue) / (result['median_ms'] / 1000))
+    return result
+
+def bench_combination(floor, people_count):
+    found = []
+
+    def run():
+        found[:] = suggest_combinations(floor, people_count)
+
+    result = measure(run)
+    result['found'] = bool(found)
+    return result
+
+def bench_allocation_round(floor, queue, directory):
+    path = os.path.join(directory, f"round_{len(floor)}_{len(queue)}.db")
+
+    def connect():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn, 'sqlite'
+
+    def setup():
+        if os.path.exists(path):
+            os.remove(path)
+        conn, _ = connect()
+        migrate(conn, 'sqlite', verbose=False)
+        conn.executemany("INSERT INTO tables (id, table_number, capacity, status, display_order) VALUES (?, ?, ?, ?, ?)",
+                         [(t['id'], t['table_number'], t['capacity'], t['status'], t['display_order']) for t in floor])
+        conn.executemany("INSERT INTO users (id, name, phone_number, people_count, timestamp) VALUES (?, ?, ?, ?, ?)",
+                         [(p['id'], p['name'], p['phone_number'], p['people_count'], p['timestamp']) for p in queue])
+        conn.commit()
+        conn.close()
+        return ()
+
+    allocator = AutoAllocator(connect, SettingsStore(connect))
+    seated = []
+
+    def run():
+        seated[:] = allocator.run_once()
+
+    result = measure(run, min_time=0.5, max_repeats=20, setup=setup)
+    result['parties_seated'] = len(seated)
+    return result
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark seating logic on synthetic floors and queues.")
+    parser.add_argument('--quick', action='store_true', help="Small sizes only, for a fast sanity run.")
+    parser.add_argument('--floors', type=int, nargs='*', help="Floor sizes (tables) to benchmark.")
+    parser.add_argument('--queues', type=int, nargs='*', help="Queue sizes (parties) to benchmark.")
+    parser.add_argument('--skip-db', action='store_true', help="Skip full allocation rounds against SQLite.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_allocator.json', help="Where to write the JSON results.")
+    args = parser.parse_args(argv)
+
+    floors = args.floors or (QUICK_FLOOR_SIZES if args.quick else FLOOR_SIZES)
+    queues = args.queues or (QUICK_QUEUE_SIZES if args.quick else QUEUE_SIZES)
+    rng = random.Random(args.seed)
+    results = []
+
+    def record(benchmark, tables, parties, result):
+        results.append(dict(benchmark=benchmark, tables=tables, parties=parties, **result))
+        print(f"{benchmark:<18} tables={tables:<6} parties={parties if parties is not None else '-':<7} "
+              f"median={result['median_ms']:.3f}ms p95={result['p95_ms']:.3f}ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for floor_size in floors:
+            floor = synthetic_floor(floor_size, rng)
+            record('table_lookup', floor_size, None, bench_table_lookup(floor, rng))
+            largest = max(CAPACITY_WEIGHTS)
+            for people_count in (largest + 4, largest * 2):
+                record('combination', floor_size, None, dict(party_size=people_count, **bench_combination(floor, people_count)))
+            for queue_size in queues:
+                queue = synthetic_queue(queue_size, rng)
+                record('best_fit_seating', floor_size, queue_size, bench_best_fit(floor, queue))
+                if not args.skip_db and queue_size <= MAX_ROUND_QUEUE:
+                    record('allocation_round', floor_size, queue_size, bench_allocation_round(floor, queue, directory))
+
+    report = {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget check: import time and time to first response.
+
+Each run starts the app in a fresh interpreter, the way a sleeping Render
+instance wakes up, and measures:
+  - import_ms:               wall time of `import <app>` (plus the slowest imports from -X importtime)
+  - first_boot_response_ms:  process start -> first 200 from /health on an empty database (migrations run)
+  - restart_response_ms:     the same against the database the first boot left behind (schema current, no DDL)
+
+    python benchmarks/boot_benchmark.py
+    python benchmarks/boot_benchmark.py --app app_complete --runs 5 --output bench_boot.json
+
+Exits non-zero when a median exceeds its budget, so it can gate a deploy.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from allocator_benchmark import git_revision
+
+# Budgets for the medians, in ms. Keep them honest: tighten when boot gets faster.
+IMPORT_BUDGET_MS = 400
+FIRST_BOOT_BUDGET_MS = 2000
+RESTART_BUDGET_MS = 1000
+
+def clean_env():
+    """Environment for the child: repo on the path and SQLite (an empty DATABASE_URL is not overridden by .env)"""
+    env = {key: value for key, value in os.environ.items() if key != 'PYTHONPATH'}
+    env['PYTHONPATH'] = REPO
+    env['DATABASE_URL'] = ''
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+def measure_import(module, directory):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=directory, env=clean_env(), capture_output=True, text=True, check=True)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    # "import time: self [us] | cumulative | imported package"; keep what the app module imports directly
+    slowest = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit() and len(parts[2]) - len(parts[2].lstrip()) == 3:
+            slowest.append((parts[2].strip(), int(parts[1]) / 1000))
+    slowest.sort(key=lambda item: item[1], reverse=True)
+    return elapsed, slowest[:8]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def measure_first_response(module, directory, timeout=30):
+    port = free_port()
+    env = dict(clean_env(), PORT=str(port))
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO, f"{module}.py")], cwd=directory, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+            if process.poll() is not None:
+                raise RuntimeError(f"{module}.py exited with code {process.returncode} before answering")
+        raise RuntimeError(f"No response from {module}.py within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and time to first response against budgets.")
+    parser.add_argument('--app', default='app', help="App module to boot (app, app_complete).")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--first-boot-budget', type=float, default=FIRST_BOOT_BUDGET_MS)
+    parser.add_argument('--restart-budget', type=float, default=RESTART_BUDGET_MS)
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    imports, first_boots, restarts = [], [], []
+    slowest = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as directory:
+            elapsed, slowest = measure_import(args.app, directory)
+            imports.append(elapsed)
+            first_boots.append(measure_first_response(args.app, directory))
+            restarts.append(measure_first_response(args.app, directory))
+
+    checks = [
+        ('import_ms', imports, args.import_budget),
+        ('first_boot_response_ms', first_boots, args.first_boot_budget),
+        ('restart_response_ms', restarts, args.restart_budget),
+    ]
+    results = {}
+    over_budget = False
+    for name, samples, budget in checks:
+        median = statistics.median(samples)
+        passed = median <= budget
+        over_budget = over_budget or not passed
+        results[name] = {'median': round(median, 1), 'max': round(max(samples), 1), 'budget': budget, 'passed': passed}
+        print(f"{name:<24} median={median:8.1f}ms  max={max(samples):8.1f}ms  budget={budget:.0f}ms  {'ok' if passed else 'OVER BUDGET'}")
+    print(f"\nSlowest imports made by {args.app} (last run):")
+    for module, ms in slowest:
+        print(f"  {module:<30} {ms:8.1f}ms")
+
+    if args.output:
+        report = {
+            'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'app': args.app,
+            'runs': args.runs,
+            'results': results,
+            'slowest_imports': [{'module': module, 'ms': round(ms, 1)} for module, ms in slowest],
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+    return 1 if over_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
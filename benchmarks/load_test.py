@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+HTTP load test with a restaurant-shaped workload.
+
+Boots the app in a fresh process (SQLite in a temp directory, or PostgreSQL with
+--database-url) or targets a running instance with --url, then runs for
+--duration seconds:
+  - waiter tablets:   GET /api/waiter_data every --poll-interval seconds (jittered)
+  - admin dashboards: hold /stream open, GET /api/dashboard_data on every event and
+                      at least every --dashboard-interval seconds
+  - bursts:           every --burst-interval seconds, --burst-size concurrent
+                      add_customer / seat_manually / free_table / block_table calls
+
+and reports throughput, p50/p95/p99 latency and error rate per route. 409s are
+counted as conflicts (expected when a burst races the allocator), not errors.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --tablets 10,50,200 --duration 60 --output bench_load.json
+    python benchmarks/load_test.py --app app_complete --database-url postgresql://localhost/restroflow_load
+
+Routes an app does not have (app.py has no /stream, app_complete no /seat_manually)
+are skipped. Exits non-zero when a step exceeds --max-error-rate or --p95-budget.
+"""
+import argparse
+import datetime
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from allocator_benchmark import git_revision
+from boot_benchmark import clean_env, free_port
+
+ADMIN_USER = 'admin'
+ADMIN_PASSWORD = 'loadtest'
+WAITER_PASSWORD = 'loadtest'
+# Share of burst operations; whatever cannot run (e.g. nobody waiting to seat) adds a customer instead
+BURST_MIX = (('add_customer', 0.4), ('seat_manually', 0.2), ('free_table', 0.25), ('block_table', 0.15))
+
+class Recorder:
+    """(route) -> list of (seconds, status); status 0 is a network error"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, seconds, status):
+        with self._lock:
+            self.samples.setdefault(route, []).append((seconds, status))
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as they are instead of timing the page they lead to"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class Client:
+    """One browser/tablet: its own cookie jar, every request timed into the recorder"""
+
+    def __init__(self, base_url, recorder, timeout=30):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect())
+
+    def request(self, route, path, form=None, payload=None, record=True):
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif payload is not None:
+            data = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        status, body = 0, None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=data, headers=headers), timeout=self.timeout) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except OSError:
+            pass
+        if record:
+            self.recorder.add(route, time.perf_counter() - started, status)
+        return status, body
+
+    def json(self, route, path, **kwargs):
+        status, body = self.request(route, path, **kwargs)
+        try:
+            return status, json.loads(body) if body else None
+        except ValueError:
+            return status, None
+
+    def cookie_header(self):
+        return '; '.join(f"{cookie.name}={cookie.value}" for cookie in self.cookies)
+
+    def login(self, username, password):
+        # A successful login redirects to a dashboard; a failed one renders the form again
+        status, _ = self.request('login', '/login', form={'username': username, 'password': password}, record=False)
+        return status in (301, 302, 303)
+
+class Workload:
+    def __init__(self, base_url, args, tablets):
+        self.base_url = base_url
+        self.args = args
+        self.tablets = tablets
+        self.recorder = Recorder()
+        self.stop = threading.Event()
+        self.events = 0
+        self.has_stream = True
+        self.has_seat_manually = True
+        self._lock = threading.Lock()
+        self._serial = 0
+
+    def admin_client(self):
+        client = Client(self.base_url, self.recorder)
+        if not client.login(self.args.admin_user, self.args.admin_password):
+            raise RuntimeError("Admin login failed; pass --admin-user/--admin-password for an external --url")
+        return client
+
+    def setup(self):
+        admin = self.admin_client()
+        # Probe the optional routes once so their 404s do not count as errors
+        self.has_seat_manually = admin.request('probe', '/seat_manually', payload={}, record=False)[0] != 404
+        self.has_stream = self._stream_exists(admin)
+        waiter = f"load-{os.getpid()}-{int(time.time())}"
+        admin.request('setup', '/admin/add_waiter', form={'username': waiter, 'password': WAITER_PASSWORD}, record=False)
+        self.waiter = waiter
+        return admin
+
+    def _stream_exists(self, admin):
+        # A missing route answers at once; a real stream sends nothing until the first event
+        try:
+            with admin.opener.open(self.base_url + '/stream', timeout=2) as response:
+                return response.status == 200
+        except urllib.error.HTTPError:
+            return False
+        except OSError:
+            return True
+
+    def tablet(self, client):
+        # Tablets are switched on at different times, not in lockstep
+        if self.stop.wait(random.uniform(0, self.args.poll_interval)):
+            return
+        while not self.stop.is_set():
+            client.request('GET /api/waiter_data', '/api/waiter_data')
+            self.stop.wait(self.args.poll_interval * random.uniform(0.9, 1.1))
+
+    def dashboard(self, index):
+        client = self.admin_client()
+        changed = threading.Event()
+        if self.has_stream:
+            threading.Thread(target=self.listen, args=(client, changed), daemon=True).start()
+        while not self.stop.is_set():
+            client.request('GET /api/dashboard_data', '/api/dashboard_data')
+            changed.clear()
+            # Reload on the next event, or after the interval at the latest (the page's fallback)
+            deadline = time.monotonic() + self.args.dashboard_interval
+            while not self.stop.is_set() and not changed.is_set() and time.monotonic() < deadline:
+                changed.wait(0.2)
+
+    def listen(self, client, changed):
+        # The server sends headers with the first event, so the open itself can wait that long
+        try:
+            response = client.opener.open(self.base_url + '/stream', timeout=self.args.duration + 30)
+        except OSError:
+            return
+        with response:
+            while not self.stop.is_set():
+                try:
+                    line = response.readline()
+                except OSError:
+                    return
+                if not line:
+                    return
+                if line.startswith(b'data:'):
+                    with self._lock:
+                        self.events += 1
+                    changed.set()
+
+    def burst_operation(self, client, floor):
+        customers = floor.get('customers') or []
+        tables = floor.get('all_tables') or []
+        free = [t for t in tables if t['status'] == 'free']
+        taken = [t for t in tables if t['status'] in ('occupied', 'unavailable')]
+        roll, operation = random.random(), 'add_customer'
+        for name, share in BURST_MIX:
+            if roll < share:
+                operation = name
+                break
+            roll -= share
+
+        if operation == 'seat_manually' and self.has_seat_manually and customers and free:
+            customer = random.choice(customers)
+            table = random.choice(free)
+            client.request('POST /seat_manually', '/seat_manually', payload={
+                'customer_id': customer['id'], 'table_ids': [table['id']],
+                'customer_version': customer.get('version'), 'table_versions': {str(table['id']): table.get('version')}})
+        elif operation == 'free_table' and taken:
+            table = random.choice(taken)
+            client.request('POST /free_table', '/free_table', form={'table_id': table['id']})
+        elif operation == 'block_table' and free:
+            table = random.choice(free)
+            client.request('POST /block_table', '/block_table', form={'table_id': table['id'], 'version': table.get('version', '')})
+        else:
+            with self._lock:
+                self._serial += 1
+                serial = self._serial
+            client.request('POST /add_customer', '/add_customer', form={'name': f"guest {serial}", 'people_count': random.choice((1, 2, 2, 2, 3, 4, 4, 5, 6, 8))})
+
+    def bursts(self):
+        clients = [self.admin_client() for _ in range(self.args.burst_size)]
+        while not self.stop.wait(self.args.burst_interval):
+            # One read of the floor per burst, like a host glancing at the dashboard
+            _, floor = clients[0].json('burst read', '/api/dashboard_data', record=False)
+            workers = [threading.Thread(target=self.burst_operation, args=(client, floor or {})) for client in clients]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+    def waiter_client(self, clients):
+        client = Client(self.base_url, self.recorder)
+        if client.login(self.waiter, WAITER_PASSWORD):
+            clients.append(client)
+
+    def run(self):
+        self.setup()
+        # Log everyone in before the clock starts; password hashing is deliberately slow
+        tablets = []
+        logins = [threading.Thread(target=self.waiter_client, args=(tablets,)) for _ in range(self.tablets)]
+        for login in logins:
+            login.start()
+        for login in logins:
+            login.join()
+        if len(tablets) < self.tablets:
+            print(f"Warning: only {len(tablets)} of {self.tablets} tablets could log in as waiter '{self.waiter}'")
+        threads = [threading.Thread(target=self.tablet, args=(client,), daemon=True) for client in tablets]
+        threads += [threading.Thread(target=self.dashboard, args=(i,), daemon=True) for i in range(self.args.dashboards)]
+        threads.append(threading.Thread(target=self.bursts, daemon=True))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        self.stop.wait(self.args.duration)
+        self.stop.set()
+        for thread in threads:
+            thread.join(timeout=self.args.poll_interval + 30)
+        return time.perf_counter() - started
+
+def summarize(recorder, elapsed):
+    results = {}
+    for route, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in samples)
+        errors = sum(1 for _, status in samples if status == 0 or (status >= 400 and status != 409))
+        conflicts = sum(1 for _, status in samples if status == 409)
+        results[route] = {
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 0.50), 1),
+            'p95_ms': round(percentile(latencies, 0.95), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'max_ms': round(latencies[-1], 1),
+            'error_rate': round(errors / len(samples), 4),
+            'conflicts': conflicts,
+        }
+    return results
+
+def start_server(args, directory):
+    port = free_port()
+    env = dict(clean_env(), PORT=str(port), ADMIN_USER=args.admin_user, ADMIN_PASSWORD=args.admin_password)
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+    process = subprocess.Popen([sys.executable, os.path.join(REPO, f"{args.app}.py")], cwd=directory, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/health/ready', timeout=1) as response:
+                if response.status == 200:
+                    return process, base_url
+        except OSError:
+            time.sleep(0.05)
+        if process.poll() is not None:
+            raise RuntimeError(f"{args.app}.py exited with code {process.returncode} during start-up")
+    process.terminate()
+    raise RuntimeError(f"{args.app}.py was not ready within 60s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the app with waiter tablets, admin dashboards and mutation bursts.")
+    parser.add_argument('--app', default='app', help="App module to boot (app, app_complete).")
+    parser.add_argument('--url', help="Target a running instance instead of booting one.")
+    parser.add_argument('--database-url', help="PostgreSQL URL for the booted app (default: SQLite in a temp directory).")
+    parser.add_argument('--tablets', default='20', help="Waiter tablets; a comma-separated list runs one step per count.")
+    parser.add_argument('--dashboards', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds per step.")
+    parser.add_argument('--poll-interval', type=float, default=5.0)
+    parser.add_argument('--dashboard-interval', type=float, default=10.0)
+    parser.add_argument('--burst-interval', type=float, default=5.0)
+    parser.add_argument('--burst-size', type=int, default=8)
+    parser.add_argument('--admin-user', default=os.getenv('ADMIN_USER', ADMIN_USER))
+    parser.add_argument('--admin-password', default=os.getenv('ADMIN_PASSWORD', ADMIN_PASSWORD))
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--p95-budget', type=float, help="Fail when any route's p95 (ms) exceeds this.")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    steps = []
+    failed = False
+    for tablets in [int(value) for value in args.tablets.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            process, base_url = (None, args.url.rstrip('/')) if args.url else start_server(args, directory)
+            try:
+                workload = Workload(base_url, args, tablets)
+                elapsed = workload.run()
+            finally:
+                if process is not None:
+                    process.terminate()
+                    process.wait()
+
+        results = summarize(workload.recorder, elapsed)
+        print(f"\n{tablets} tablets, {args.dashboards} dashboards, bursts of {args.burst_size} every {args.burst_interval:g}s "
+              f"for {elapsed:.0f}s ({workload.events} stream events received)")
+        print(f"  {'route':<26} {'requests':>8} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7} {'409s':>5}")
+        for route, row in results.items():
+            over = (row['error_rate'] > args.max_error_rate
+                    or (args.p95_budget is not None and row['p95_ms'] > args.p95_budget))
+            failed = failed or over
+            print(f"  {route:<26} {row['requests']:>8} {row['throughput_rps']:>7.1f} {row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms "
+                  f"{row['p99_ms']:>7.1f}ms {row['error_rate'] * 100:>6.1f}% {row['conflicts']:>5}{'  OVER BUDGET' if over else ''}")
+        steps.append({'tablets': tablets, 'elapsed_s': round(elapsed, 1), 'stream_events': workload.events, 'routes': results})
+
+    if args.output:
+        report = {
+            'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'app': args.url or args.app,
+            'database': 'postgresql' if args.database_url else ('external' if args.url else 'sqlite'),
+            'config': {key: value for key, value in vars(args).items() if key not in ('admin_password', 'output')},
+            'steps': steps,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
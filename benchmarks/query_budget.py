@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Query budgets: SQL statements and rows touched per route, checked against a declared limit.
+
+Each case is one request to a Flask route of app.py or app_complete.py (--app),
+run in-process against a seeded SQLite database that is restored before every
+case, so cases do not depend on each other. Statements and rows (fetched rows
+plus rows changed by INSERT/UPDATE/DELETE) come from the request's
+Server-Timing header, which database.query_stats fills in.
+
+BUDGETS declares, per app and case, (max statements, max rows). Row counts
+cannot see rows a statement scanned but did not return, so every statement a
+case runs (on any thread) is also run through EXPLAIN QUERY PLAN; a full scan
+of a table outside FULL_SCAN_ALLOWED fails the case. A case over either
+limit, with such a scan, that errors, or without a budget fails the run with
+exit code 1 - so an N+1 loop, a new full-table reload or a missing index shows
+up here before it ships. When a change legitimately needs more, raise the
+budget in the same commit and say why. tests/test_query_budget.py runs it for
+both apps.
+
+    python benchmarks/query_budget.py
+    python benchmarks/query_budget.py --app app_complete --output budget.json
+
+The app's floor-state warm-up runs once after seeding, as it does at boot in
+production. Before each case the settings cache is reloaded and the wait-time
+model marked stale, so budgets include their refresh queries.
+"""
+import argparse
+import datetime
+import importlib
+import io
+import json
+import os
+import platform
+import re
+import sqlite3
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from allocator_benchmark import git_revision
+from database import _STRING_LITERAL, add_query_observer, normalize_sql
+
+SERVER_TIMING = re.compile(r'desc="(\d+) queries, (\d+) rows"')
+# Tables bounded by the floor, the queue, the staff or the settings: reading all of them is expected.
+# customer_history and action_log grow forever and must always be reached through an index.
+FULL_SCAN_ALLOWED = {'tables', 'users', 'waiters', 'settings', 'counters', 'schema_version'}
+PLANNED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+SCAN = re.compile(r'^SCAN (\w+)')
+# "FROM customer_history h", "JOIN tables AS t": query plans name a table by its alias
+TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+# Seeded on top of the app's own default floor
+WAITING_CUSTOMERS = 40
+OCCUPIED_TABLES = 5
+BLOCKED_TABLES = 2
+HISTORY_ROWS = 2000
+ACTION_LOG_ROWS = 2000
+WAITERS = 5
+
+# (name, role, method, path, form, json); table and customer ids refer to the seed
+CASES = [
+    ('dashboard_data', 'admin', 'GET', '/api/dashboard_data', None, None),
+    ('waiter_data', 'waiter', 'GET', '/api/waiter_data', None, None),
+    ('queue_eta', 'admin', 'GET', '/api/queue_eta', None, None),
+    ('table_suggestions', 'admin', 'GET', '/api/table_suggestions?people_count=6', None, None),
+    ('add_customer', 'admin', 'POST', '/add_customer', {'name': 'budget party', 'people_count': '3'}, None),
+    ('remove_customer', 'admin', 'POST', '/remove_customer', {'customer_id': '1'}, None),
+    ('seat_manually', 'admin', 'POST', '/seat_manually', None, {'customer_id': 2, 'table_ids': [12, 13]}),
+    ('free_table', 'waiter', 'POST', '/free_table', {'table_id': '1'}, None),
+    ('block_table', 'waiter', 'POST', '/block_table', {'table_id': '14'}, None),
+    ('batch', 'admin', 'POST', '/api/batch', None, {'operations': [
+        *({'op': 'free_table', 'table_id': table_id} for table_id in (2, 3, 4, 5)),
+        {'op': 'block_table', 'table_id': 18},
+        {'op': 'add_customer', 'name': 'budget party', 'people_count': 4},
+        {'op': 'remove_customer', 'customer_id': 3},
+    ]}),
+    ('add_table', 'admin', 'POST', '/add_table', {'capacity': '4'}, None),
+    ('delete_table', 'admin', 'POST', '/delete_table/15', {}, None),
+    ('rename_table', 'admin', 'POST', '/rename_table/16', {'table_number': 'Patio 1'}, None),
+    ('move_table', 'admin', 'POST', '/update_table_order', None, {'moves': [{'table_id': 17, 'after_id': 2, 'before_id': 3}]}),
+    ('reorder_tables', 'admin', 'POST', '/update_table_order', None, 'all_tables_reversed'),
+    ('allocator_policy', 'admin', 'POST', '/allocator_policy', {'policy': 'best_fit'}, None),
+    ('add_waiter', 'admin', 'POST', '/admin/add_waiter', {'username': 'budget', 'password': 'budget'}, None),
+    ('edit_waiter', 'admin', 'POST', '/admin/edit_waiter', {'waiter_id': '2', 'username': 'renamed'}, None),
+    ('delete_waiter', 'admin', 'POST', '/admin/delete_waiter', {'waiter_id': '3'}, None),
+    ('run_auto_seat', 'admin', 'POST', '/run_auto_seat', {}, None),
+    # Turns the allocator on, which starts its background thread: keep it last
+    ('toggle_auto_allocator', 'admin', 'POST', '/toggle_auto_allocator', {}, None),
+]
+
+# (max statements, max rows) per case, for the seed above. Reads that return the
+# whole floor or queue are expected; anything proportional to history is not.
+BUDGETS = {
+    'app': {
+        'dashboard_data': (6, 86),     # layout version, tables, queue, waiters + wait-model refresh
+        'waiter_data': (1, 20),
+        'queue_eta': (4, 80),
+        'table_suggestions': (1, 20),
+        'add_customer': (1, 1),
+        'remove_customer': (1, 1),
+        'seat_manually': (6, 7),       # two tables, queue row and history in one transaction
+        'free_table': (3, 3),          # the departure closes the party's history row
+        'block_table': (2, 2),
+        'batch': (31, 16),             # four frees, a block, a check-in and a removal, each in a savepoint of one transaction
+        'add_table': (3, 3),
+        'delete_table': (2, 2),
+        'rename_table': (2, 2),
+        'move_table': (6, 6),
+        'reorder_tables': (2, 21),     # one bulk UPDATE for the whole floor
+        'allocator_policy': (3, 5),
+        'add_waiter': (1, 1),
+        'edit_waiter': (1, 1),
+        'delete_waiter': (1, 1),
+        'run_auto_seat': (82, 119),    # one transaction for the round, a savepoint per party seated (11 here)
+        'toggle_auto_allocator': (3, 4),
+    },
+    'app_complete': {
+        'dashboard_data': (8, 183),    # includes a wait-model refresh, as in app
+        'queue_eta': (4, 132),
+        'waiter_data': (1, 46),
+        'add_customer': (1, 1),        # the audit row is written in the background
+        'remove_customer': (1, 1),
+        'free_table': (3, 3),          # the departure closes the party's history row
+        'block_table': (2, 2),
+        'batch': (31, 16),             # four frees, a block, a check-in and a removal, each in a savepoint of one transaction
+        'add_table': (3, 3),
+        'delete_table': (2, 2),
+        'rename_table': (2, 2),
+        'move_table': (6, 6),
+        'reorder_tables': (2, 47),
+        'add_waiter': (1, 1),
+        'run_auto_seat': (258, 272),   # a bigger default floor seats the whole queue, a savepoint each
+        'toggle_auto_allocator': (3, 4),
+    },
+}
+
+def seed(path, now):
+    """Waiting queue, occupied and blocked tables, waiters and history on top of the default floor"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, table_number, capacity FROM tables ORDER BY display_order")
+    tables = cursor.fetchall()
+    cursor.executemany("INSERT INTO users (name, people_count, timestamp) VALUES (?, ?, ?)",
+                       [(f"Guest {i}", 1 + i % 6, now - datetime.timedelta(minutes=WAITING_CUSTOMERS - i)) for i in range(WAITING_CUSTOMERS)])
+    for index, (table_id, table_number, capacity) in enumerate(tables[:OCCUPIED_TABLES]):
+        seated = now - datetime.timedelta(minutes=10 + index * 7)
+        cursor.execute("INSERT INTO customer_history (name, people_count, arrival_timestamp, seated_timestamp, table_number) VALUES (?, ?, ?, ?, ?)",
+                       (f"Seated {index}", capacity, seated - datetime.timedelta(minutes=5), seated, table_number))
+        cursor.execute("UPDATE tables SET status = 'occupied', customer_name = ?, people_count = ?, occupied_timestamp = ?, history_id = ? WHERE id = ?",
+                       (f"Seated {index}", capacity, seated, cursor.lastrowid, table_id))
+    for table_id, _, _ in tables[OCCUPIED_TABLES:OCCUPIED_TABLES + BLOCKED_TABLES]:
+        cursor.execute("UPDATE tables SET status = 'blocked' WHERE id = ?", (table_id,))
+    # Two weeks of closed visits for the wait-time model, all before today so "seated today" does not depend on the clock
+    history = []
+    today = datetime.datetime.combine(now.date(), datetime.time.min)
+    for i in range(HISTORY_ROWS):
+        arrival = today - datetime.timedelta(days=14) + datetime.timedelta(minutes=i * 10)
+        history.append((f"Past {i}", 1 + i % 8, arrival, arrival + datetime.timedelta(minutes=8 + i % 20),
+                        arrival + datetime.timedelta(minutes=50 + i % 40), tables[i % len(tables)][1]))
+    cursor.executemany("INSERT INTO customer_history (name, people_count, arrival_timestamp, seated_timestamp, departed_timestamp, table_number) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", history)
+    # The hash is never checked (sessions are set directly), so skip the expensive KDF
+    cursor.executemany("INSERT INTO waiters (username, password_hash) VALUES (?, ?)",
+                       [(f"waiter{i}", 'unused') for i in range(1, WAITERS + 1)])
+    cursor.executemany("INSERT INTO action_log (waiter_id, table_id, action, details, timestamp) VALUES (?, ?, ?, ?, ?)",
+                       [(1 + i % WAITERS, tables[i % len(tables)][0], 'cleared', None, now - datetime.timedelta(minutes=i)) for i in range(ACTION_LOG_ROWS)])
+    cursor.execute("INSERT INTO settings (key, value) VALUES ('auto_allocator_enabled', 'False') "
+                   "ON CONFLICT (key) DO UPDATE SET value = excluded.value")
+    conn.commit()
+    table_ids = [table_id for table_id, _, _ in tables]
+    conn.close()
+    return table_ids
+
+def restore(template, path):
+    """Copy the seeded database over the live one; the backup API is safe while other connections exist"""
+    source, target = sqlite3.connect(template), sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+def reset_caches(module):
+    module.settings.reload()
+    if hasattr(module, 'wait_estimator'):
+        module.wait_estimator.mark_stale()
+
+def run_case(module, client, case, table_ids):
+    name, role, method, path, form, payload = case
+    with client.session_transaction() as session:
+        session.clear()
+        if role == 'admin':
+            session['is_admin'] = True
+        else:
+            session['waiter_id'] = 1
+            session['waiter_username'] = 'waiter1'
+    if payload == 'all_tables_reversed':
+        payload = {'order': list(reversed(table_ids))}
+    response = client.open(path, method=method, data=form, json=payload)
+    match = SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+    return {
+        'status': response.status_code,
+        'statements': int(match.group(1)) if match else None,
+        'rows': int(match.group(2)) if match else None,
+    }
+
+class StatementCapture:
+    """Query observer that keeps the distinct SQL run while a case is in progress"""
+
+    def __init__(self):
+        self.statements = set()
+        self.active = False
+
+    def __call__(self, sql, seconds):
+        if self.active:
+            self.statements.add(sql)
+
+def full_scans(conn, statements, plans):
+    """Normalized statements that scan a whole table outside FULL_SCAN_ALLOWED, as 'table: statement'"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    found = set()
+    for sql in statements:
+        if not sql.lstrip().upper().startswith(PLANNED):
+            continue
+        if sql not in plans:
+            aliases = {}
+            for table, alias in TABLE_REFERENCE.findall(sql):
+                aliases[table] = table
+                if alias and alias.upper() not in ('WHERE', 'SET', 'ON', 'VALUES', 'ORDER', 'GROUP', 'LIMIT', 'JOIN', 'LEFT', 'INNER', 'USING', 'SELECT', 'DEFAULT'):
+                    aliases[alias] = table
+            # Every value is NULL: the plan depends on the shape of the statement, not on the values
+            placeholders = _STRING_LITERAL.sub("''", sql).count('?')
+            try:
+                details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * placeholders)]
+            except sqlite3.Error as e:
+                details = [f"unplannable: {e}"]
+            scanned = set()
+            for detail in details:
+                match = SCAN.match(detail)
+                if match:
+                    table = aliases.get(match.group(1), match.group(1))
+                    if table in tables and table not in FULL_SCAN_ALLOWED:
+                        scanned.add(table)
+            plans[sql] = scanned
+        found.update(f"{table}: {normalize_sql(sql)}" for table in plans[sql])
+    return sorted(found)
+
+def has_route(module, method, path):
+    adapter = module.app.url_map.bind('localhost')
+    try:
+        adapter.match(path.split('?')[0], method=method)
+        return True
+    except Exception:
+        return False
+
+def check(result, budget):
+    if result['status'] >= 400:
+        return f"HTTP {result['status']}"
+    if result['statements'] is None:
+        return "no Server-Timing (is DB_QUERY_STATS off?)"
+    if budget is None:
+        return "no budget declared"
+    max_statements, max_rows = budget
+    problems = [f"full scan of {scan}" for scan in result['full_scans']]
+    if result['statements'] > max_statements:
+        problems.append(f"{result['statements']} statements > {max_statements}")
+    if result['rows'] > max_rows:
+        problems.append(f"{result['rows']} rows > {max_rows}")
+    return ', '.join(problems) or None
+
+def run_cases(args, directory):
+    # The apps open users.db relative to the working directory; an empty DATABASE_URL keeps .env from selecting PostgreSQL
+    os.chdir(directory)
+    os.environ['DATABASE_URL'] = ''
+    quiet = io.StringIO()
+    with redirect_stdout(sys.stdout if args.verbose else quiet):
+        module = importlib.import_module(args.app)
+        module.init_db()
+    template = os.path.join(directory, 'seed.db')
+    restore('users.db', template)
+    table_ids = seed(template, datetime.datetime.now())
+    restore(template, 'users.db')
+    with redirect_stdout(sys.stdout if args.verbose else quiet):
+        module.warm_floor_state()
+
+    budgets = BUDGETS[args.app]
+    client = module.app.test_client()
+    capture = StatementCapture()
+    add_query_observer(capture)
+    plans = {}
+    results = []
+    print(f"{'case':<24}{'statements':>11}{'rows':>8}   budget")
+    for case in CASES:
+        name, method, path = case[0], case[2], case[3]
+        if args.case and name not in args.case:
+            continue
+        if not has_route(module, method, path):
+            continue
+        restore(template, 'users.db')
+        with redirect_stdout(sys.stdout if args.verbose else quiet):
+            reset_caches(module)
+            capture.statements.clear()
+            capture.active = True
+            result = run_case(module, client, case, table_ids)
+            if hasattr(module, 'action_log'):
+                # Audit events are written in the background; land them before the database is restored
+                module.action_log.flush()
+            capture.active = False
+        conn = sqlite3.connect('users.db')
+        try:
+            result['full_scans'] = full_scans(conn, capture.statements, plans)
+        finally:
+            conn.close()
+        budget = budgets.get(name)
+        problem = check(result, budget)
+        results.append({'case': name, 'method': method, 'path': path, **result,
+                        'budget': list(budget) if budget else None, 'problem': problem})
+        budget_text = f"{budget[0]} / {budget[1]}" if budget else '-'
+        print(f"{name:<24}{result['statements'] if result['statements'] is not None else '-':>11}"
+              f"{result['rows'] if result['rows'] is not None else '-':>8}   {budget_text:<12}{'  FAIL: ' + problem if problem else ''}")
+    # Background threads must be done before the directory goes
+    module.allocator.stop(wait=True)
+    if hasattr(module, 'action_log'):
+        module.action_log.close()
+    return results, table_ids
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check SQL statements and rows per route against declared budgets.")
+    parser.add_argument('--app', choices=('app', 'app_complete'), default='app_complete')
+    parser.add_argument('--case', action='append', help="Run only these cases (repeatable).")
+    parser.add_argument('--verbose', action='store_true', help="Show the app's own output.")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    revision = git_revision()
+    with tempfile.TemporaryDirectory(prefix='query-budget-', ignore_cleanup_errors=True) as directory:
+        cwd = os.getcwd()
+        try:
+            results, table_ids = run_cases(args, directory)
+        finally:
+            os.chdir(cwd)
+
+    failures = sum(result['problem'] is not None for result in results)
+    print(f"\n{len(results) - failures}/{len(results)} cases within budget ({args.app})")
+    if output:
+        report = {
+            'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': revision,
+            'python': platform.python_version(),
+            'app': args.app,
+            'seed': {'waiting_customers': WAITING_CUSTOMERS, 'occupied_tables': OCCUPIED_TABLES, 'blocked_tables': BLOCKED_TABLES,
+                     'history_rows': HISTORY_ROWS, 'action_log_rows': ACTION_LOG_ROWS, 'waiters': WAITERS, 'tables': len(table_ids)},
+            'cases': results,
+        }
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote results to {output}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
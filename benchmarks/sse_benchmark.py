@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+/stream fan-out benchmark: event delivery as the number of subscribers grows.
+
+For each subscriber count it boots app_complete (SQLite in a temp directory, or
+PostgreSQL with --database-url), opens that many event-stream connections from
+one asyncio loop, waits until the server reports them all subscribed (the
+restroflow_sse_subscribers gauge on /metrics), then fires --events mutations
+(POST /toggle_auto_allocator, an even number so the setting ends where it
+started) and measures:
+  - delivery latency: mutation sent -> event line read, per subscriber and event
+  - fan-out time:     mutation sent -> the last subscriber has the event
+  - delivered:        share of (subscriber, event) pairs that arrived in time
+  - server RSS and thread count before and after subscribing, per subscriber
+
+--stalled-fraction subscribers connect with a tiny receive buffer and never read;
+--slow-fraction read but sleep --slow-delay seconds per event. Latency is
+reported for the healthy readers only, so the effect of bad consumers on
+everyone else shows up directly.
+
+    python benchmarks/sse_benchmark.py
+    python benchmarks/sse_benchmark.py --clients 10,100,1000,10000 --events 20 --output bench_sse.json
+    python benchmarks/sse_benchmark.py --clients 500 --stalled-fraction 0.1 --events 200 --event-interval 0.01
+
+RSS and threads are read from /proc, so those columns need Linux.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import re
+import socket
+import sys
+import tempfile
+import time
+import types
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from allocator_benchmark import git_revision
+from load_test import ADMIN_PASSWORD, ADMIN_USER, Client, Recorder, percentile, start_server
+
+SUBSCRIBERS_GAUGE = re.compile(r'^restroflow_sse_subscribers (\d+)', re.MULTILINE)
+
+def raise_file_limit():
+    """Allow as many sockets as the hard limit permits (the server inherits it)"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+def process_usage(pid):
+    """(RSS in KB, thread count) from /proc, or (None, None) elsewhere"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]), int(fields['Threads'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+def subscriber_count(base_url):
+    try:
+        with urllib.request.urlopen(base_url + '/metrics', timeout=5) as response:
+            match = SUBSCRIBERS_GAUGE.search(response.read().decode())
+        return int(match.group(1)) if match else None
+    except OSError:
+        return None
+
+class Subscriber:
+    """One raw event-stream connection; records when each event line arrives"""
+
+    def __init__(self, kind):
+        self.kind = kind  # 'healthy', 'slow' or 'stalled'
+        self.arrivals = []
+        self.connected = False
+        self.writer = None
+
+    async def run(self, host, port, cookie, slow_delay):
+        try:
+            if self.kind == 'stalled':
+                sock = socket.socket()
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+                sock.setblocking(False)
+                await asyncio.get_running_loop().sock_connect(sock, (host, port))
+                reader, self.writer = await asyncio.open_connection(sock=sock, limit=1024)
+            else:
+                reader, self.writer = await asyncio.open_connection(host, port)
+            self.writer.write(f"GET /stream HTTP/1.1\r\nHost: {host}\r\nCookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n".encode())
+            await self.writer.drain()
+            self.connected = True
+            if self.kind == 'stalled':
+                # Never read: the server's writes back up into this socket
+                await asyncio.Event().wait()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                if line.startswith(b'data:'):
+                    self.arrivals.append(time.perf_counter())
+                    if self.kind == 'slow':
+                        await asyncio.sleep(slow_delay)
+        except (OSError, asyncio.IncompleteReadError):
+            return
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+async def run_step(base_url, cookie, admin, clients, args):
+    host, port = base_url.split('//')[1].split(':')
+    port = int(port)
+    stalled = int(clients * args.stalled_fraction)
+    slow = int(clients * args.slow_fraction)
+    subscribers = [Subscriber('stalled') for _ in range(stalled)] + [Subscriber('slow') for _ in range(slow)]
+    subscribers += [Subscriber('healthy') for _ in range(clients - stalled - slow)]
+
+    loop = asyncio.get_running_loop()
+    rss_before, threads_before = process_usage(args.server_pid)
+    started = time.perf_counter()
+    tasks = []
+    for index, subscriber in enumerate(subscribers):
+        tasks.append(asyncio.create_task(subscriber.run(host, port, cookie, args.slow_delay)))
+        if index % 200 == 199:
+            await asyncio.sleep(0)  # let the accept queue drain between batches
+
+    subscribed = 0
+    deadline = time.perf_counter() + args.connect_timeout
+    while time.perf_counter() < deadline:
+        subscribed = await loop.run_in_executor(None, subscriber_count, base_url) or 0
+        if subscribed >= clients:
+            break
+        await asyncio.sleep(0.2)
+    subscribe_s = time.perf_counter() - started
+    rss_after, threads_after = process_usage(args.server_pid)
+
+    sent = []
+    for _ in range(args.events):
+        sent.append(time.perf_counter())
+        await loop.run_in_executor(None, lambda: admin.request('POST /toggle_auto_allocator', '/toggle_auto_allocator', form={}))
+        await asyncio.sleep(args.event_interval)
+    # Give the last event time to reach everyone
+    drain_deadline = time.perf_counter() + args.drain_timeout
+    healthy = [s for s in subscribers if s.kind == 'healthy']
+    while time.perf_counter() < drain_deadline and any(len(s.arrivals) < args.events for s in healthy if s.connected):
+        await asyncio.sleep(0.05)
+    rss_events, threads_events = process_usage(args.server_pid)
+
+    for subscriber in subscribers:
+        subscriber.close()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies, fan_out = [], []
+    for event_index, sent_at in enumerate(sent):
+        arrived = [s.arrivals[event_index] - sent_at for s in healthy if len(s.arrivals) > event_index]
+        latencies.extend(arrived)
+        if arrived and len(arrived) == len(healthy):
+            fan_out.append(max(arrived))
+    latencies = sorted(ms * 1000 for ms in latencies)
+    fan_out = sorted(ms * 1000 for ms in fan_out)
+    expected = len(healthy) * args.events
+
+    def per_subscriber(before, after):
+        return round((after - before) / max(subscribed, 1), 2) if before is not None and after is not None else None
+
+    return {
+        'clients': clients,
+        'healthy': len(healthy), 'slow': slow, 'stalled': stalled,
+        'subscribed': subscribed,
+        'subscribe_s': round(subscribe_s, 2),
+        'events': args.events,
+        'delivered': round(len(latencies) / expected, 4) if expected else None,
+        # How far the slow readers had got when the step ended (stalled ones never read)
+        'slow_delivered': round(sum(len(s.arrivals) for s in subscribers if s.kind == 'slow') / (slow * args.events), 4) if slow else None,
+        'latency_ms': {'p50': round(percentile(latencies, 0.50), 2), 'p95': round(percentile(latencies, 0.95), 2),
+                       'p99': round(percentile(latencies, 0.99), 2), 'max': round(latencies[-1], 2) if latencies else None},
+        'fan_out_ms': {'p50': round(percentile(fan_out, 0.50), 2), 'max': round(fan_out[-1], 2) if fan_out else None},
+        'server': {'rss_kb': [rss_before, rss_after, rss_events], 'threads': [threads_before, threads_after, threads_events],
+                   'rss_kb_per_subscriber': per_subscriber(rss_before, rss_after),
+                   'threads_per_subscriber': per_subscriber(threads_before, threads_after),
+                   'rss_kb_growth_during_events': (rss_events - rss_after) if rss_events and rss_after else None},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure /stream delivery latency and server cost per subscriber.")
+    parser.add_argument('--clients', default='10,100,1000', help="Comma-separated subscriber counts, one step each.")
+    parser.add_argument('--events', type=int, default=10, help="Mutations per step (rounded up to an even number).")
+    parser.add_argument('--event-interval', type=float, default=0.5, help="Seconds between mutations.")
+    parser.add_argument('--stalled-fraction', type=float, default=0.0)
+    parser.add_argument('--slow-fraction', type=float, default=0.0)
+    parser.add_argument('--slow-delay', type=float, default=1.0)
+    parser.add_argument('--connect-timeout', type=float, default=120.0)
+    parser.add_argument('--drain-timeout', type=float, default=30.0)
+    parser.add_argument('--database-url', help="PostgreSQL URL for the booted app (default: SQLite in a temp directory).")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+    args.events += args.events % 2
+    file_limit = raise_file_limit()
+
+    server_args = types.SimpleNamespace(app='app_complete', admin_user=ADMIN_USER, admin_password=ADMIN_PASSWORD, database_url=args.database_url)
+    steps = []
+    for clients in [int(value) for value in args.clients.split(',')]:
+        with tempfile.TemporaryDirectory() as directory:
+            process, base_url = start_server(server_args, directory)
+            try:
+                args.server_pid = process.pid
+                admin = Client(base_url, Recorder())
+                if not admin.login(ADMIN_USER, ADMIN_PASSWORD):
+                    raise RuntimeError("Admin login failed")
+                step = asyncio.run(run_step(base_url, admin.cookie_header(), admin, clients, args))
+            finally:
+                process.terminate()
+                process.wait()
+        steps.append(step)
+        server = step['server']
+        print(f"{clients:>6} clients ({step['subscribed']} subscribed in {step['subscribe_s']:.1f}s, "
+              f"{step['slow']} slow, {step['stalled']} stalled): "
+              f"latency p50={step['latency_ms']['p50']:.1f}ms p95={step['latency_ms']['p95']:.1f}ms "
+              f"p99={step['latency_ms']['p99']:.1f}ms max={step['latency_ms']['max'] or 0:.1f}ms  "
+              f"fan-out max={step['fan_out_ms']['max'] or 0:.1f}ms  delivered={(step['delivered'] or 0) * 100:.1f}%  "
+              f"RSS/sub={server['rss_kb_per_subscriber']}KB threads/sub={server['threads_per_subscriber']}")
+
+    if args.output:
+        report = {
+            'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'file_limit': file_limit,
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'server_pid')},
+            'steps': steps,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
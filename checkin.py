@@ -0,0 +1,114 @@
+import datetime
+import os
+import threading
+import time
+from database import adapt_query, transaction
+
+# How long the first caller of a group waits for others to join it; 0 still groups callers that arrive during a commit
+GROUP_COMMIT_MS = float(os.getenv('CHECKIN_GROUP_COMMIT_MS', '2'))
+MAX_GROUP_SIZE = 100
+
+def insert_parties(cursor, db_type, rows):
+    """Insert (name, people_count, phone_number, timestamp) rows with one statement; returns their ids in row order"""
+    values = ', '.join('(?, ?, ?, ?)' for _ in rows)
+    cursor.execute(adapt_query(
+        f"INSERT INTO users (name, people_count, phone_number, timestamp) VALUES {values} RETURNING id", db_type),
+        tuple(value for row in rows for value in row))
+    # Rows get ids in VALUES order, but RETURNING may list them in any order
+    return sorted(row['id'] for row in cursor.fetchall())
+
+class _CheckIn:
+    __slots__ = ('row', 'done', 'lead', 'customer_id', 'error')
+
+    def __init__(self, row):
+        self.row = row
+        self.done = threading.Event()
+        self.lead = False
+        self.customer_id = None
+        self.error = None
+
+class CheckInWriter:
+    """Adds parties to the waiting queue with group commit.
+
+    Callers that arrive within GROUP_COMMIT_MS of each other (or while the
+    previous group is committing) are inserted by one multi-row INSERT in one
+    transaction, so a burst pays for one commit instead of one each. There is
+    no background thread: the first caller of a group writes it, the others
+    wait for their result. Every caller still gets its own id; ids and queue
+    timestamps follow arrival order. If the group's INSERT fails, its rows are
+    retried one at a time, so only the offending caller gets the error.
+    """
+
+    def __init__(self, connect, window_ms=GROUP_COMMIT_MS, max_group=MAX_GROUP_SIZE):
+        self._connect = connect
+        self.window = window_ms / 1000
+        self.max_group = max_group
+        self._lock = threading.Lock()
+        self._pending = []
+        self._leading = False
+        self.groups = 0
+        self.check_ins = 0
+
+    def add(self, name, people_count, phone_number=None):
+        """Insert one waiting party once its group commits and return its id; raises if the group failed"""
+        with self._lock:
+            # Taken under the lock so queue order (timestamp) matches id order
+            entry = _CheckIn((name, people_count, phone_number, datetime.datetime.now()))
+            self._pending.append(entry)
+            entry.lead = not self._leading
+            self._leading = True
+        if entry.lead:
+            if self.window > 0:
+                time.sleep(self.window)
+            self._write_groups()
+        else:
+            entry.done.wait()
+            if entry.lead:
+                # Handed the next group while waiting; it has had its window already
+                self._write_groups()
+        if entry.error is not None:
+            raise entry.error
+        return entry.customer_id
+
+    def _write_groups(self):
+        with self._lock:
+            group = self._pending[:self.max_group]
+            del self._pending[:self.max_group]
+        try:
+            ids = self._insert([entry.row for entry in group])
+            for entry, customer_id in zip(group, ids):
+                entry.customer_id = customer_id
+        except Exception as e:
+            if len(group) == 1:
+                group[0].error = e
+            else:
+                # One bad row (e.g. a phone number already queued) must not fail the others
+                print(f"Check-in group of {len(group)} failed ({e}); inserting rows one at a time")
+                for entry in group:
+                    try:
+                        entry.customer_id = self._insert([entry.row])[0]
+                    except Exception as e:
+                        entry.error = e
+        self.groups += 1
+        self.check_ins += len(group)
+        with self._lock:
+            if self._pending:
+                # Whoever arrived during this commit goes next, led by its first caller
+                successor = self._pending[0]
+                successor.lead = True
+                successor.done.set()
+            else:
+                self._leading = False
+        for entry in group:
+            entry.done.set()
+
+    def _insert(self, rows):
+        conn, db_type = self._connect()
+        try:
+            with transaction(conn, db_type):
+                return insert_parties(conn.cursor(), db_type, rows)
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {'groups': self.groups, 'check_ins': self.check_ins}
@@ -1,190 +1,491 @@
 import os
+import re
 import sqlite3
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import threading
+import time
 from urllib.parse import urlparse
 import datetime
-from dotenv import load_dotenv
+from contextlib import contextmanager
+
+def load_env():
+    """Load .env for local development; production boots skip importing python-dotenv at all"""
+    if any(os.path.exists(os.path.join(directory, '.env')) for directory in (os.getcwd(), os.path.dirname(os.path.abspath(__file__)))):
+        from dotenv import load_dotenv
+        load_dotenv()
 
 # Load environment variables from .env file
-load_dotenv()
+load_env()
+
+# Statements slower than this are logged (with bind parameters redacted); empty disables the log
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '250') or 'inf')
+# Requests that run at least this many statements get a per-request summary in the log
+REQUEST_SUMMARY_QUERIES = int(os.getenv('DB_REQUEST_SUMMARY_QUERIES', '25'))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_PLACEHOLDER_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_REPEATED_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \1)+")
+
+def normalize_sql(sql):
+    """One shape per statement: literals and placeholders become ?, IN lists and VALUES rows collapse"""
+    sql = ' '.join(sql.split())
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _REPEATED_ROWS.sub(r'\1, ...', sql)
+    return _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+
+def redact(parameters):
+    """Bind parameters reduced to their types, so logs never carry names or phone numbers"""
+    if parameters is None:
+        return '()'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + '}'
+    if isinstance(parameters, list) and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    return f"<{type(parameters).__name__}>"
+
+class StatementStats:
+    __slots__ = ('statement', 'calls', 'total', 'max', 'rows')
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {'statement': self.statement, 'calls': self.calls, 'total_ms': round(self.total * 1000, 3),
+                'avg_ms': round(self.total * 1000 / self.calls, 3) if self.calls else 0.0,
+                'max_ms': round(self.max * 1000, 3), 'rows': self.rows}
+
+class QueryStats:
+    """Call count, total/avg/max time and rows per normalized statement, plus a slow-query log.
+
+    Counters are bumped without a lock (the lock only guards adding a statement);
+    under contention a rare increment can be lost, which is fine for profiling.
+    """
+
+    MAX_CACHED_SHAPES = 4096
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, enabled=True):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self._statements = {}
+        self._shapes = {}  # raw SQL -> normalized, so each distinct string is parsed once
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, sql, parameters, seconds, rowcount):
+        """Count one statement; returns its stats when the rows still have to be counted on fetch"""
+        statement = self._shapes.get(sql)
+        if statement is None:
+            statement = normalize_sql(sql)
+            if len(self._shapes) < self.MAX_CACHED_SHAPES:
+                self._shapes[sql] = statement
+        stats = self._statements.get(statement)
+        if stats is None:
+            with self._lock:
+                stats = self._statements.setdefault(statement, StatementStats(statement))
+        stats.calls += 1
+        stats.total += seconds
+        if seconds > stats.max:
+            stats.max = seconds
+
+        current = getattr(self._local, 'request', None)
+        if current is not None:
+            current.append((statement, seconds))
+        if seconds * 1000 >= self.slow_ms:
+            print(f"Slow query ({seconds * 1000:.1f}ms): {statement} params={redact(parameters)}")
+
+        if rowcount is None or rowcount < 0:
+            return stats
+        self.add_rows(stats, rowcount)
+        return None
+
+    def add_rows(self, stats, count):
+        """Rows returned or changed by a statement, counted against it and the current request"""
+        stats.rows += count
+        if getattr(self._local, 'request', None) is not None:
+            self._local.rows += count
+
+    def top(self, limit=20, order='total'):
+        """Statements sorted by total, max, calls or rows, largest first"""
+        with self._lock:
+            statements = list(self._statements.values())
+        statements.sort(key=lambda stats: getattr(stats, order), reverse=True)
+        return [stats.as_dict() for stats in statements[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}
+
+    def begin_request(self):
+        self._local.request = []
+        self._local.rows = 0
+
+    def end_request(self):
+        """Summary of the statements run since begin_request(), or None outside a request"""
+        current = getattr(self._local, 'request', None)
+        if current is None:
+            return None
+        self._local.request = None
+        per_statement = {}
+        for statement, seconds in current:
+            calls, total = per_statement.get(statement, (0, 0.0))
+            per_statement[statement] = (calls + 1, total + seconds)
+        ranked = sorted(per_statement.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'queries': len(current),
+            'db_ms': round(sum(seconds for _, seconds in current) * 1000, 3),
+            'rows': self._local.rows,
+            'statements': [{'statement': statement, 'calls': calls, 'ms': round(total * 1000, 3)}
+                           for statement, (calls, total) in ranked[:5]],
+            # The same statement many times in one request is usually a loop that should be one query
+            'repeated': {statement: calls for statement, (calls, total) in per_statement.items() if calls > 1},
+        }
+
+query_stats = QueryStats(enabled=os.getenv('DB_QUERY_STATS', '1') != '0')
+
+# Every statement run through a connection from this module is also reported to these
+# as observer(sql, seconds); instrumentation hooks in with add_query_observer().
+_query_observers = []
+
+def add_query_observer(observer):
+    _query_observers.append(observer)
+
+def _observe(sql, parameters, started, rowcount):
+    elapsed = time.perf_counter() - started
+    for observer in _query_observers:
+        observer(sql, elapsed)
+    return query_stats.record(sql, parameters, elapsed, rowcount) if query_stats.enabled else None
+
+class _TimedCursor:
+    """Times execute/executemany and counts the rows fetched; mixed into each driver's cursor class"""
+
+    _statement = None
+
+    def execute(self, sql, parameters=None):
+        if not query_stats.enabled and not _query_observers:
+            return super().execute(sql) if parameters is None else super().execute(sql, parameters)
+        started = time.perf_counter()
+        before = self._changes()
+        try:
+            return super().execute(sql) if parameters is None else super().execute(sql, parameters)
+        finally:
+            self._statement = _observe(sql, parameters, started, self._rows_changed(before))
+
+    def executemany(self, sql, seq_of_parameters):
+        if not query_stats.enabled and not _query_observers:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        before = self._changes()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._statement = _observe(sql, seq_of_parameters if isinstance(seq_of_parameters, list) else None, started, self._rows_changed(before))
+
+    def _changes(self):
+        """Driver-wide count of changed rows, for drivers whose rowcount misses some statements; None to trust rowcount"""
+        return None
+
+    def _rows_changed(self, before):
+        if self.description is not None:
+            return None  # a result set (SELECT or RETURNING): rows are counted as they are fetched
+        return self.rowcount if before is None else self._changes() - before
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None and self._statement is not None:
+            query_stats.add_rows(self._statement, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany() if size is None else super().fetchmany(size)
+        if self._statement is not None:
+            query_stats.add_rows(self._statement, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if self._statement is not None:
+            query_stats.add_rows(self._statement, len(rows))
+        return rows
+
+class TimedSQLiteCursor(_TimedCursor, sqlite3.Cursor):
+    def _changes(self):
+        # rowcount is -1 for DML that starts with WITH (bulk UPDATE ... FROM)
+        return self.connection.total_changes
+
+class TimedSQLiteConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedSQLiteCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def connect_sqlite(path="users.db", **options):
+    """SQLite connection with Row results and timed statements; options go to sqlite3.connect"""
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES, factory=TimedSQLiteConnection, **options)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+_postgresql_cursor = None
+
+def _postgresql_cursor_class():
+    """RealDictCursor with timed statements (defined on first use, after psycopg2 is imported)"""
+    global _postgresql_cursor
+    if _postgresql_cursor is None:
+        from psycopg2.extras import RealDictCursor
+
+        class TimedRealDictCursor(_TimedCursor, RealDictCursor):
+            pass
+
+        _postgresql_cursor = TimedRealDictCursor
+    return _postgresql_cursor
+
+# PostgreSQL connections are pooled per process (each new one is a TLS handshake to
+# the server); SQLite connections are cheap to open and are not pooled.
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+POOL_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+# Idle connections older than this are reopened rather than trusted (servers drop idle clients)
+POOL_MAX_IDLE_SECONDS = float(os.getenv('DB_POOL_MAX_IDLE', '240'))
+
+class PoolTimeout(Exception):
+    pass
+
+class PooledConnection:
+    """A borrowed connection; everything is passed through except close(), which hands it back"""
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, '_conn', None)
+            self._pool.release(conn)
+
+class ConnectionPool:
+    """Thread-safe pool of open connections, at most max_size of them at once"""
+
+    def __init__(self, connect, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT_SECONDS, max_idle=POOL_MAX_IDLE_SECONDS):
+        self._connect = connect
+        self._idle = []  # (connection, returned at); the most recently used is reused first
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.opened = 0
+        self.in_use = 0
+        self.waits = 0
 
-def get_db_connection():
-    """Get database connection - PostgreSQL if DATABASE_URL is set, otherwise SQLite"""
+    def acquire(self, wait=True):
+        """Borrow a connection; wait=False raises PoolTimeout at once instead of queueing for one"""
+        if not self._slots.acquire(blocking=False):
+            if not wait:
+                raise PoolTimeout("No database connection free")
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                raise PoolTimeout(f"No database connection became free within {self.timeout}s")
+        with self._lock:
+            conn, returned_at = self._idle.pop() if self._idle else (None, None)
+            self.in_use += 1
+        try:
+            if conn is not None and (conn.closed or time.monotonic() - returned_at > self.max_idle):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+            raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        reusable = not conn.closed
+        if reusable and not conn.autocommit:
+            # Whoever borrowed it left a transaction open; never hand that to the next caller
+            try:
+                conn.rollback()
+                conn.autocommit = True
+            except Exception:
+                reusable = False
+        with self._lock:
+            self.in_use -= 1
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+        if not reusable:
+            self._close_quietly(conn)
+        self._slots.release()
+
+    def warm(self, count):
+        """Open connections ahead of traffic until count are idle; returns the idle count"""
+        count = min(count, self.max_size)
+        while True:
+            with self._lock:
+                if len(self._idle) >= count or len(self._idle) + self.in_use >= self.max_size:
+                    return len(self._idle)
+            conn = self._open()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            return {'max_size': self.max_size, 'in_use': self.in_use, 'idle': len(self._idle),
+                    'opened': self.opened, 'waits': self.waits}
+
+    def _open(self):
+        conn = self._connect()
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _connect_postgresql(database_url):
+    # Imported here so SQLite deployments never load the PostgreSQL driver
+    import psycopg2
+    
+    # Parse the database URL
+    parsed = urlparse(database_url)
+    
+    conn = psycopg2.connect(
+        host=parsed.hostname,
+        port=parsed.port or 5432,
+        database=parsed.path[1:],  # Remove leading slash
+        user=parsed.username,
+        password=parsed.password,
+        sslmode='require',  # Force SSL for security
+        cursor_factory=_postgresql_cursor_class()
+    )
+    conn.autocommit = True
+    return conn
+
+def _postgresql_pool(database_url):
+    with _pools_lock:
+        if database_url not in _pools:
+            _pools[database_url] = ConnectionPool(lambda: _connect_postgresql(database_url))
+        return _pools[database_url]
+
+def _database_url():
     database_url = os.getenv('DATABASE_URL')
+    return database_url.strip() if database_url and database_url.strip() else None
+
+def get_db_connection(wait=True):
+    """Get database connection - PostgreSQL if DATABASE_URL is set, otherwise SQLite.
+
+    PostgreSQL connections come from a per-process pool; close() returns them to it.
+    With wait=False a busy pool raises PoolTimeout instead of queueing.
+    """
+    database_url = _database_url()
     
-    if database_url and database_url.strip():
+    if database_url:
         # PostgreSQL connection
         try:
-            # Parse the database URL
-            parsed = urlparse(database_url)
-            
-            conn = psycopg2.connect(
-                host=parsed.hostname,
-                port=parsed.port or 5432,
-                database=parsed.path[1:],  # Remove leading slash
-                user=parsed.username,
-                password=parsed.password,
-                sslmode='require'  # Force SSL for security
-            )
-            conn.autocommit = True
-            return conn, 'postgresql'
+            return _postgresql_pool(database_url).acquire(wait), 'postgresql'
+        except PoolTimeout:
+            # The database is reachable but busy; falling back to SQLite here would split the data
+            raise
         except Exception as e:
             print(f"PostgreSQL connection failed: {e}")
             print("Falling back to SQLite...")
     
     # SQLite connection (fallback)
-    conn = sqlite3.connect("users.db", detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-    conn.row_factory = sqlite3.Row
-    return conn, 'sqlite'
+    return connect_sqlite(), 'sqlite'
+
+def warm_pool(count):
+    """Pre-open pooled PostgreSQL connections; returns how many are idle (0 on SQLite)"""
+    database_url = _database_url()
+    return _postgresql_pool(database_url).warm(count) if database_url else 0
+
+def pool_stats():
+    """Usage of this process's connection pool, or None when running on SQLite"""
+    database_url = _database_url()
+    return _postgresql_pool(database_url).stats() if database_url else None
+
+def adapt_query(query, db_type):
+    """Convert SQLite ? placeholders to PostgreSQL %s when needed"""
+    if db_type == 'postgresql':
+        return query.replace('?', '%s')
+    return query
+
+def driver_error(db_type, name='Error'):
+    """The driver's DB-API exception class by name ('Error', 'IntegrityError', ...)"""
+    if db_type == 'postgresql':
+        import psycopg2  # already loaded once a PostgreSQL connection exists
+        return getattr(psycopg2, name)
+    return getattr(sqlite3, name)
+
+@contextmanager
+def transaction(conn, db_type):
+    """Run a block of statements as one transaction on either backend"""
+    if db_type == 'postgresql':
+        previous_autocommit = conn.autocommit
+        conn.autocommit = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = previous_autocommit
+    else:
+        with conn:
+            yield conn
+
+NATURAL_NUMBER = re.compile(r'\d+')
+
+def table_sort_key(table_number):
+    """Natural-order key for a table name: 'Patio 7' < 'Patio 12' < 'T2' < 'T10'.
+
+    The zone prefix is lower-cased and every run of digits is zero-padded, so a
+    plain text index on the key orders tables the way people read them.
+    """
+    return NATURAL_NUMBER.sub(lambda m: m.group().zfill(10), table_number.strip().lower())
+
+# Starting floor for a new database: 9 two-tops, 29 four-tops, 8 six-tops
+DEFAULT_FLOOR = (
+    [(f"T{i}", 2) for i in range(1, 10)]
+    + [(f"T{i}", 4) for i in range(10, 39)]
+    + [(f"T{i}", 6) for i in range(39, 47)]
+)
 
 def init_db():
-    """Initialize database with proper schema for both PostgreSQL and SQLite"""
+    """Bring the schema up to date for PostgreSQL or SQLite and seed a default floor on first run"""
+    from migrations import migrate, seed_tables  # migrations builds on this module
     conn, db_type = get_db_connection()
     
     try:
-        cursor = conn.cursor()
-        
-        if db_type == 'postgresql':
-            # PostgreSQL schema
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    phone_number TEXT,
-                    name TEXT,
-                    people_count INTEGER,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tables (
-                    id SERIAL PRIMARY KEY,
-                    table_number TEXT NOT NULL UNIQUE,
-                    capacity INTEGER NOT NULL,
-                    status TEXT DEFAULT 'free',
-                    occupied_by_user_id INTEGER,
-                    occupied_timestamp TIMESTAMP,
-                    customer_name TEXT,
-                    people_count INTEGER,
-                    customer_phone_number TEXT,
-                    display_order INTEGER
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS customer_history (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    phone_number TEXT,
-                    people_count INTEGER,
-                    arrival_timestamp TIMESTAMP NOT NULL,
-                    seated_timestamp TIMESTAMP,
-                    departed_timestamp TIMESTAMP,
-                    table_number TEXT
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS waiters (
-                    id SERIAL PRIMARY KEY,
-                    username TEXT NOT NULL UNIQUE,
-                    password_hash TEXT NOT NULL
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS action_log (
-                    id SERIAL PRIMARY KEY,
-                    waiter_id INTEGER REFERENCES waiters(id),
-                    table_id INTEGER REFERENCES tables(id),
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
-                )
-            """)
-            
-            # Insert default setting
-            cursor.execute("""
-                INSERT INTO settings (key, value) 
-                VALUES ('auto_allocator_enabled', 'True')
-                ON CONFLICT (key) DO NOTHING
-            """)
-            
-            # Create unique index
-            cursor.execute("""
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_phone_number 
-                ON users(phone_number) 
-                WHERE phone_number IS NOT NULL
-            """)
-            
-        else:
-            # SQLite schema (existing code)
-            cursor.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, phone_number TEXT, name TEXT, people_count INTEGER, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
-            cursor.execute("CREATE TABLE IF NOT EXISTS tables (id INTEGER PRIMARY KEY AUTOINCREMENT, table_number TEXT NOT NULL UNIQUE, capacity INTEGER NOT NULL, status TEXT DEFAULT 'free', occupied_by_user_id INTEGER, occupied_timestamp DATETIME, customer_name TEXT, people_count INTEGER, customer_phone_number TEXT, display_order INTEGER)")
-            cursor.execute("CREATE TABLE IF NOT EXISTS customer_history (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, phone_number TEXT, people_count INTEGER, arrival_timestamp DATETIME NOT NULL, seated_timestamp DATETIME, departed_timestamp DATETIME, table_number TEXT)")
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS waiters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password_hash TEXT NOT NULL
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS action_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    waiter_id INTEGER,
-                    table_id INTEGER,
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (waiter_id) REFERENCES waiters (id),
-                    FOREIGN KEY (table_id) REFERENCES tables (id)
-                )
-            """)
-            cursor.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
-            cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('auto_allocator_enabled', 'True')")
-            
-            try:
-                cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_phone_number ON users(phone_number) WHERE phone_number IS NOT NULL;")
-            except sqlite3.OperationalError:
-                pass
-        
-        # Check if tables need to be populated
-        cursor.execute("SELECT COUNT(*) FROM tables")
-        result = cursor.fetchone()
-        table_count = result[0] if db_type == 'postgresql' else result[0]
-        
-        if table_count == 0:
-            tables_to_add = []
-            for i in range(1, 10): 
-                tables_to_add.append((f"T{i}", 2, i-1))
-            for i in range(10, 39): 
-                tables_to_add.append((f"T{i}", 4, i-1))
-            for i in range(39, 47): 
-                tables_to_add.append((f"T{i}", 6, i-1))
-            
-            if db_type == 'postgresql':
-                cursor.executemany(
-                    "INSERT INTO tables (table_number, capacity, display_order) VALUES (%s, %s, %s)", 
-                    tables_to_add
-                )
-            else:
-                cursor.executemany(
-                    "INSERT OR IGNORE INTO tables (table_number, capacity, display_order) VALUES (?, ?, ?)", 
-                    tables_to_add
-                )
-        
-        if db_type == 'postgresql':
-            conn.commit()
-            
+        migrate(conn, db_type)
+        seed_tables(conn, db_type, DEFAULT_FLOOR)
         print(f"Database initialization complete ({db_type})")
         
     except Exception as e:
@@ -201,12 +502,7 @@ def execute_query(query, params=None, fetch=False):
     try:
         cursor = conn.cursor()
         
-        if db_type == 'postgresql':
-            # Convert SQLite ? placeholders to PostgreSQL %s
-            pg_query = query.replace('?', '%s')
-            cursor.execute(pg_query, params or ())
-        else:
-            cursor.execute(query, params or ())
+        cursor.execute(adapt_query(query, db_type), params or ())
         
         if fetch:
             result = cursor.fetchall()
@@ -0,0 +1,183 @@
+import datetime
+from database import adapt_query, table_sort_key, transaction
+
+TABLE_PREFIX = 'T'
+# display_order values are sparse rank keys: a move takes the midpoint of its new
+# neighbours, and all keys are respread RANK_GAP apart only once a gap runs out.
+RANK_GAP = 1024
+
+def next_table_number(cursor, db_type):
+    """Next T-number from the sequence (PostgreSQL) or the counters row (SQLite); never reused after deletes"""
+    if db_type == 'postgresql':
+        cursor.execute("SELECT nextval('table_number_seq') AS value")
+    else:
+        cursor.execute("UPDATE counters SET value = value + 1 WHERE name = 'table_number' RETURNING value")
+    return f"{TABLE_PREFIX}{cursor.fetchone()['value']}"
+
+def bump_floor_version(cursor):
+    """Record a layout change; clients compare versions to know whether they missed one"""
+    cursor.execute("UPDATE counters SET value = value + 1 WHERE name = 'floor_version' RETURNING value")
+    return cursor.fetchone()['value']
+
+def floor_version(cursor):
+    cursor.execute("SELECT value FROM counters WHERE name = 'floor_version'")
+    row = cursor.fetchone()
+    return row['value'] if row else 0
+
+def add_table(conn, db_type, capacity):
+    """Insert one table at the end of the floor and return (new row, floor version).
+
+    Numbers come from a counter rather than COUNT(*), so they stay unique after
+    deletes. A number that was taken by hand is skipped. Commits on its own.
+    """
+    cursor = conn.cursor()
+    with transaction(conn, db_type):
+        while True:
+            table_number = next_table_number(cursor, db_type)
+            cursor.execute(adapt_query(
+                "INSERT INTO tables (table_number, sort_key, capacity, display_order) "
+                "SELECT ?, ?, ?, COALESCE(MAX(display_order), ?) + ? FROM tables WHERE true "
+                "ON CONFLICT (table_number) DO NOTHING RETURNING *", db_type),
+                (table_number, table_sort_key(table_number), capacity, -RANK_GAP, RANK_GAP))
+            inserted = cursor.fetchall()
+            if inserted:
+                break
+        version = bump_floor_version(cursor)
+    return dict(inserted[0]), version
+
+def delete_table(conn, db_type, table_id):
+    """Delete one table and return (deleted row or None, floor version). Commits on its own."""
+    cursor = conn.cursor()
+    with transaction(conn, db_type):
+        cursor.execute(adapt_query("DELETE FROM tables WHERE id = ? RETURNING id, table_number", db_type), (table_id,))
+        deleted = cursor.fetchall()
+        if not deleted:
+            return None, floor_version(cursor)
+        version = bump_floor_version(cursor)
+    return dict(deleted[0]), version
+
+def rename_table(conn, db_type, table_id, table_number):
+    """Rename one table, keeping its sort key in step; returns (row or None, floor version).
+
+    Occupied tables are left alone: the party's customer_history row records the
+    names it was seated at, and the wait-time estimator looks those names up for
+    table capacities once the party departs. A name that is already taken raises
+    the driver's IntegrityError. Commits on its own.
+    """
+    cursor = conn.cursor()
+    now = datetime.datetime.now()
+    with transaction(conn, db_type):
+        cursor.execute(adapt_query(
+            "UPDATE tables SET table_number = ?, sort_key = ?, version = version + 1, updated_at = ? "
+            "WHERE id = ? AND status != 'occupied' RETURNING *", db_type),
+            (table_number, table_sort_key(table_number), now, table_id))
+        renamed = cursor.fetchall()
+        if not renamed:
+            return None, floor_version(cursor)
+        version = bump_floor_version(cursor)
+    return dict(renamed[0]), version
+
+def rebalance_order(cursor):
+    """Respread every rank key RANK_GAP apart, keeping the current order, in one statement"""
+    cursor.execute(
+        f"UPDATE tables SET display_order = ranked.position * {RANK_GAP} "
+        f"FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY display_order, id) - 1 AS position FROM tables) AS ranked "
+        f"WHERE tables.id = ranked.id")
+
+def _rank(cursor, db_type, table_id):
+    cursor.execute(adapt_query("SELECT display_order FROM tables WHERE id = ?", db_type), (table_id,))
+    row = cursor.fetchone()
+    return row['display_order'] if row else None
+
+def _move(cursor, db_type, table_id, after_id=None, before_id=None, rebalanced=False):
+    """Give one table a rank key between its new neighbours; returns the key, or None if it does not exist.
+
+    The neighbour on the far side is looked up here rather than trusted from the
+    client, so a slightly stale view still lands the table where it was dropped.
+    """
+    if _rank(cursor, db_type, table_id) is None:
+        return None
+    low = _rank(cursor, db_type, after_id) if after_id is not None else None
+    high = _rank(cursor, db_type, before_id) if before_id is not None and low is None else None
+    if low is not None:
+        cursor.execute(adapt_query("SELECT MIN(display_order) AS value FROM tables WHERE display_order > ? AND id != ?", db_type), (low, table_id))
+        high = cursor.fetchone()['value']
+    elif high is not None:
+        cursor.execute(adapt_query("SELECT MAX(display_order) AS value FROM tables WHERE display_order < ? AND id != ?", db_type), (high, table_id))
+        low = cursor.fetchone()['value']
+    else:
+        return _rank(cursor, db_type, table_id)
+
+    if low is not None and high is not None and high - low < 2:
+        if rebalanced:
+            raise RuntimeError("Could not open a gap in the table order")
+        rebalance_order(cursor)
+        return _move(cursor, db_type, table_id, after_id, before_id, rebalanced=True)
+
+    if low is None:
+        key = high - RANK_GAP
+    elif high is None:
+        key = low + RANK_GAP
+    else:
+        key = (low + high) // 2
+    cursor.execute(adapt_query("UPDATE tables SET display_order = ? WHERE id = ?", db_type), (key, table_id))
+    return key
+
+def move_tables(conn, db_type, moves):
+    """Apply drag-and-drop moves in order, in one transaction; each normally rewrites a single row.
+
+    moves is a list of {'table_id', 'after_id', 'before_id'} with the neighbours the
+    table was dropped between. Returns ({table_id: new display_order}, floor version).
+    Commits on its own.
+    """
+    cursor = conn.cursor()
+    keys = {}
+    with transaction(conn, db_type):
+        for move in moves:
+            key = _move(cursor, db_type, int(move['table_id']), _optional_id(move.get('after_id')), _optional_id(move.get('before_id')))
+            if key is not None:
+                keys[int(move['table_id'])] = key
+        if keys:
+            # A rebalance may have moved keys written earlier in this batch
+            cursor.execute(adapt_query(
+                f"SELECT id, display_order FROM tables WHERE id IN ({', '.join('?' for _ in keys)})", db_type), tuple(keys))
+            keys = {row['id']: row['display_order'] for row in cursor.fetchall()}
+            version = bump_floor_version(cursor)
+        else:
+            version = floor_version(cursor)
+    return keys, version
+
+def reorder_tables(conn, db_type, ordered_ids):
+    """Apply a complete new order with a single bulk UPDATE and return the floor version. Commits on its own."""
+    ordered_ids = list(dict.fromkeys(int(table_id) for table_id in ordered_ids))
+    cursor = conn.cursor()
+    with transaction(conn, db_type):
+        values = ', '.join('(?, ?)' for _ in ordered_ids)
+        cursor.execute(adapt_query(
+            f"WITH ordered (id, position) AS (VALUES {values}) "
+            f"UPDATE tables SET display_order = ordered.position FROM ordered WHERE tables.id = ordered.id", db_type),
+            tuple(value for index, table_id in enumerate(ordered_ids) for value in (table_id, index * RANK_GAP)))
+        version = bump_floor_version(cursor)
+    return version
+
+def parse_moves(moves):
+    """Check moves from a client and return them with integer ids; raises ValueError if one is malformed"""
+    if not isinstance(moves, list):
+        raise ValueError("moves must be a list")
+    try:
+        return [{'table_id': int(move['table_id']), 'after_id': _optional_id(move.get('after_id')),
+                 'before_id': _optional_id(move.get('before_id'))} for move in moves]
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid move: {e}")
+
+def parse_order(ordered_ids):
+    """Check a complete order from a client and return it as integer ids; raises ValueError if malformed"""
+    if not isinstance(ordered_ids, list):
+        raise ValueError("order must be a list")
+    try:
+        return [int(table_id) for table_id in ordered_ids]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid table id in order: {e}")
+
+def _optional_id(value):
+    return int(value) if value not in (None, '') else None
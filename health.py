@@ -0,0 +1,157 @@
+import datetime
+import threading
+import time
+from database import PoolTimeout
+
+# A cached probe older than this is refreshed in the background on the next /health
+PROBE_INTERVAL_SECONDS = 60.0
+# /health?deep=1 runs a live probe at most this often; callers in between get the cached one
+DEEP_PROBE_MIN_INTERVAL_SECONDS = 5.0
+# Consecutive failed probes that open the circuit, and how long it stays open before one retry
+FAILURE_THRESHOLD = 3
+RESET_SECONDS = 30.0
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+def http_status(snapshot):
+    """/health status code for a snapshot: 503 while the circuit is not closed, 200 otherwise"""
+    return 503 if snapshot['status'] == 'unhealthy' else 200
+
+class CircuitBreaker:
+    """Closed while probes succeed; open after FAILURE_THRESHOLD failures in a row.
+
+    While open, probes are skipped until RESET_SECONDS have passed, then a single
+    half-open probe decides whether it closes again.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self._opened_at = None
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return CLOSED
+        return HALF_OPEN if time.monotonic() - self._opened_at >= self.reset_seconds else OPEN
+
+    def allow(self):
+        return self.state != OPEN
+
+    def record_success(self):
+        self.failures = 0
+        self._opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self._opened_at is not None:
+            self._opened_at = time.monotonic()
+
+class HealthMonitor:
+    """Database health answered from cached state, so health checks add no load of their own.
+
+    connect(wait) returns (conn, db_type) and must raise rather than queue when
+    wait is False; a probe never waits behind real requests for a connection.
+    """
+
+    def __init__(self, connect, pool_stats=None, probe_interval=PROBE_INTERVAL_SECONDS,
+                 deep_min_interval=DEEP_PROBE_MIN_INTERVAL_SECONDS, breaker=None):
+        self._connect = connect
+        self._pool_stats = pool_stats
+        self._probe_interval = probe_interval
+        self._deep_min_interval = deep_min_interval
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._probing = False
+        self._probed_at = None
+        self.db_type = None
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+        self.last_latency_ms = None
+
+    def record_success(self, latency_ms=None):
+        """Note a working database round trip (also callable from code that just did one)"""
+        with self._lock:
+            self.last_success = datetime.datetime.now()
+            if latency_ms is not None:
+                self.last_latency_ms = latency_ms
+            self.last_error = None
+            self.breaker.record_success()
+
+    def record_failure(self, error):
+        with self._lock:
+            self.last_failure = datetime.datetime.now()
+            self.last_error = str(error)
+            self.breaker.record_failure()
+
+    def probe(self):
+        """One live SELECT 1; returns True if it succeeded. Skipped while the circuit is open."""
+        with self._lock:
+            if self._probing or not self.breaker.allow():
+                return None
+            self._probing = True
+            self._probed_at = time.monotonic()
+        try:
+            started = time.perf_counter()
+            try:
+                conn, db_type = self._connect(False)
+            except PoolTimeout:
+                # Busy, not broken: every connection is serving a request
+                return None
+            except Exception as e:
+                self.record_failure(e)
+                return False
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                self.db_type = db_type
+            except Exception as e:
+                self.record_failure(e)
+                return False
+            finally:
+                conn.close()
+            self.record_success(round((time.perf_counter() - started) * 1000, 2))
+            return True
+        finally:
+            with self._lock:
+                self._probing = False
+
+    def refresh_in_background(self):
+        """Start a probe thread if the cached result is stale; never blocks the caller"""
+        if self._probed_at is not None and time.monotonic() - self._probed_at < self._probe_interval:
+            return
+        threading.Thread(target=self.probe, name='health-probe', daemon=True).start()
+
+    def deep_probe(self):
+        """Live probe for /health?deep=1, rate limited; returns (ran, ok), ran=False when no probe ran"""
+        if self._probed_at is not None and time.monotonic() - self._probed_at < self._deep_min_interval:
+            return False, None
+        ok = self.probe()
+        # None: skipped (circuit open, another probe in flight, or every connection busy)
+        return ok is not None, ok
+
+    def require_database(self):
+        """Warm-up step: fails (and is retried) until a probe of its own has succeeded"""
+        # None means no answer yet (a probe already running, or every connection busy): not ready either
+        if not self.probe() or self.breaker.state != CLOSED:
+            raise RuntimeError(self.last_error or "database probe has not completed")
+        return self.last_latency_ms
+
+    def snapshot(self):
+        with self._lock:
+            state = self.breaker.state
+            healthy = state == CLOSED and self.last_success is not None
+            return {
+                'status': 'healthy' if healthy else ('unhealthy' if state != CLOSED else 'unknown'),
+                'database': self.db_type,
+                'last_success': self.last_success.isoformat() if self.last_success else None,
+                'last_failure': self.last_failure.isoformat() if self.last_failure else None,
+                'last_error': self.last_error,
+                'last_latency_ms': self.last_latency_ms,
+                'circuit_breaker': {'state': state, 'consecutive_failures': self.breaker.failures},
+                'pool': self._pool_stats() if self._pool_stats else None,
+                'timestamp': datetime.datetime.now().isoformat(),
+            }
@@ -0,0 +1,240 @@
+"""
+Request and database metrics in Prometheus text format.
+
+Every thread records into its own counters (no lock on the hot path); a scrape
+merges them. Stats of threads that have exited are folded into one retired set,
+so a thread-per-request server does not grow the registry without bound.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request
+from database import REQUEST_SUMMARY_QUERIES, add_query_observer, query_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Fold exited threads once the registry holds more than this many
+MAX_LIVE_THREADS = 64
+
+class _Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self, slots):
+        self.counts = [0] * slots  # one per bucket, the last one is +Inf
+        self.sum = 0.0
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+
+class _ThreadStats:
+    __slots__ = ('thread', 'requests', 'latency', 'db_seconds', 'db_queries', 'in_flight', 'background')
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.requests = {}    # (endpoint, method, status) -> count
+        self.latency = {}     # (endpoint, method) -> _Histogram
+        self.db_seconds = {}  # endpoint -> _Histogram of DB time per request
+        self.db_queries = {}  # endpoint -> _Histogram of statements per request
+        self.in_flight = {}   # endpoint -> requests running now
+        self.background = [0, 0.0]  # statements, seconds outside a request (allocator, warm-up, probes)
+
+class Metrics:
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._retired = _ThreadStats()
+        self._gauges = []
+        add_query_observer(self._observe_query)
+
+    def _stats(self):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = self._local.stats = _ThreadStats(threading.current_thread())
+            with self._lock:
+                if len(self._threads) >= MAX_LIVE_THREADS:
+                    self._retire_exited()
+                self._threads.append(stats)
+        return stats
+
+    def _retire_exited(self):
+        live = []
+        for stats in self._threads:
+            if stats.thread.is_alive():
+                live.append(stats)
+            else:
+                _merge(self._retired, stats)
+        self._threads = live
+
+    def gauge(self, name, help_text, read, kind='gauge'):
+        """Report read() at scrape time; read returns None, a number or {((label, value), ...): number}"""
+        self._gauges.append((name, help_text, read, kind))
+
+    def pool(self, pool_stats):
+        """Export a connection pool's usage from pool_stats() (None when there is no pool)"""
+        def connections():
+            stats = pool_stats()
+            return {(('state', state),): stats[state] for state in ('in_use', 'idle')} if stats else None
+
+        def stat(key):
+            return lambda: (pool_stats() or {}).get(key)
+
+        self.gauge('restroflow_db_pool_connections', 'Pooled database connections by state.', connections)
+        self.gauge('restroflow_db_pool_max_connections', 'Pool size limit.', stat('max_size'))
+        self.gauge('restroflow_db_pool_opened_total', 'Connections the pool has opened.', stat('opened'), 'counter')
+        self.gauge('restroflow_db_pool_waits_total', 'Borrowers that had to wait for a free connection.', stat('waits'), 'counter')
+
+    def begin_request(self, endpoint):
+        stats = self._stats()
+        stats.in_flight[endpoint] = stats.in_flight.get(endpoint, 0) + 1
+        self._local.request = [endpoint, time.perf_counter(), 0, 0.0]
+
+    def end_request(self, method, status):
+        current = getattr(self._local, 'request', None)
+        if current is None:
+            return
+        self._local.request = None
+        endpoint, started, queries, db_seconds = current
+        stats = self._stats()
+        stats.in_flight[endpoint] -= 1
+        key = (endpoint, method, status)
+        stats.requests[key] = stats.requests.get(key, 0) + 1
+        _observe(stats.latency, (endpoint, method), LATENCY_BUCKETS, time.perf_counter() - started)
+        _observe(stats.db_seconds, endpoint, LATENCY_BUCKETS, db_seconds)
+        _observe(stats.db_queries, endpoint, QUERY_COUNT_BUCKETS, queries)
+
+    def _observe_query(self, sql, seconds):
+        current = getattr(self._local, 'request', None)
+        if current is not None:
+            current[2] += 1
+            current[3] += seconds
+        else:
+            background = self._stats().background
+            background[0] += 1
+            background[1] += seconds
+
+    def request_db_usage(self):
+        """(statements, seconds) so far in the current request, or None outside one"""
+        current = getattr(self._local, 'request', None)
+        return (current[2], current[3]) if current is not None else None
+
+    def snapshot(self):
+        total = _ThreadStats()
+        with self._lock:
+            _merge(total, self._retired)
+            threads = list(self._threads)
+        for stats in threads:
+            _merge(total, stats)
+        return total
+
+    def render(self):
+        total = self.snapshot()
+        lines = []
+
+        lines += _header('restroflow_http_requests_total', 'counter', 'Finished requests by endpoint, method and status code.')
+        for (endpoint, method, status), count in sorted(total.requests.items()):
+            lines.append(f"restroflow_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+        lines += _header('restroflow_http_requests_in_flight', 'gauge', 'Requests currently being handled.')
+        for endpoint, count in sorted(total.in_flight.items()):
+            lines.append(f"restroflow_http_requests_in_flight{_labels(endpoint=endpoint)} {count}")
+
+        lines += _histogram('restroflow_http_request_duration_seconds', 'Request latency.',
+                            {(('endpoint', e), ('method', m)): h for (e, m), h in total.latency.items()}, LATENCY_BUCKETS)
+        lines += _histogram('restroflow_http_request_db_seconds', 'Time spent in database statements per request.',
+                            {(('endpoint', e),): h for e, h in total.db_seconds.items()}, LATENCY_BUCKETS)
+        lines += _histogram('restroflow_http_request_db_queries', 'Database statements per request.',
+                            {(('endpoint', e),): h for e, h in total.db_queries.items()}, QUERY_COUNT_BUCKETS)
+
+        lines += _header('restroflow_db_background_queries_total', 'counter', 'Statements run outside a request.')
+        lines.append(f"restroflow_db_background_queries_total {total.background[0]}")
+        lines += _header('restroflow_db_background_seconds_total', 'counter', 'Time spent in statements outside a request.')
+        lines.append(f"restroflow_db_background_seconds_total {total.background[1]:.6f}")
+
+        for name, help_text, read, kind in self._gauges:
+            value = read()
+            if value is None:
+                continue
+            lines += _header(name, kind, help_text)
+            if isinstance(value, dict):
+                for labels, number in sorted(value.items()):
+                    lines.append(f"{name}{_labels(**dict(labels))} {number}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def instrument(self, app, path='/metrics'):
+        """Record every request of a Flask app and serve the metrics on path"""
+        @app.before_request
+        def _begin_request():
+            self.begin_request(request.endpoint or 'unmatched')
+            if query_stats.enabled:
+                query_stats.begin_request()
+
+        @app.after_request
+        def _record_status(response):
+            g._metrics_status = response.status_code
+            summary = query_stats.end_request()
+            if summary is not None:
+                response.headers['Server-Timing'] = f'db;dur={summary["db_ms"]:.1f};desc="{summary["queries"]} queries, {summary["rows"]} rows"'
+                if summary['queries'] >= REQUEST_SUMMARY_QUERIES or summary['db_ms'] >= query_stats.slow_ms:
+                    print(f"DB summary for {request.method} {request.path}: {summary}")
+            return response
+
+        @app.teardown_request
+        def _end_request(exc):
+            self.end_request(request.method, getattr(g, '_metrics_status', 500))
+            query_stats.end_request()
+
+        @app.route(path)
+        def metrics():
+            # Optional bearer token for deployments where /metrics is reachable from outside
+            token = os.getenv('METRICS_TOKEN')
+            if token and request.headers.get('Authorization') != f"Bearer {token}":
+                return Response("Unauthorized\n", status=401, mimetype='text/plain')
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+def _observe(histograms, key, buckets, value):
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = _Histogram(len(buckets) + 1)
+    histogram.counts[bisect_left(buckets, value)] += 1
+    histogram.sum += value
+
+def _merge(into, stats):
+    # dict(...) copies in one step, so a thread that records meanwhile cannot break the iteration
+    for key, count in dict(stats.requests).items():
+        into.requests[key] = into.requests.get(key, 0) + count
+    for key, count in dict(stats.in_flight).items():
+        into.in_flight[key] = into.in_flight.get(key, 0) + count
+    for source, target in ((stats.latency, into.latency), (stats.db_seconds, into.db_seconds), (stats.db_queries, into.db_queries)):
+        for key, histogram in dict(source).items():
+            if key not in target:
+                target[key] = _Histogram(len(histogram.counts))
+            target[key].merge(histogram)
+    into.background[0] += stats.background[0]
+    into.background[1] += stats.background[1]
+
+def _header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}' if labels else ''
+
+def _histogram(name, help_text, histograms, buckets):
+    lines = _header(name, 'histogram', help_text)
+    for labels, histogram in sorted(histograms.items()):
+        labels = dict(labels)
+        cumulative = 0
+        for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {cumulative}")
+    return lines
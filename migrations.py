@@ -0,0 +1,246 @@
+"""
+Versioned schema migrations for PostgreSQL and SQLite.
+
+Each migration runs once, in order, and is recorded in schema_version. Ordinary
+migrations run in a transaction. Online ones (index builds) use CREATE INDEX
+CONCURRENTLY on PostgreSQL, which cannot run inside a transaction, so every step
+in them is written to be safely re-runnable instead.
+"""
+import time
+from contextlib import contextmanager
+from database import adapt_query, table_sort_key, transaction
+from floor_layout import RANK_GAP
+
+SCHEMA_VERSION_TABLE = "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at {ts} NOT NULL)"
+
+# {pk} and {ts} are filled in per dialect
+BASELINE_TABLES = [
+    "CREATE TABLE IF NOT EXISTS users (id {pk}, phone_number TEXT, name TEXT, people_count INTEGER, "
+    "timestamp {ts} DEFAULT CURRENT_TIMESTAMP, version INTEGER NOT NULL DEFAULT 0, updated_at {ts})",
+    "CREATE TABLE IF NOT EXISTS tables (id {pk}, table_number TEXT NOT NULL UNIQUE, sort_key TEXT, capacity INTEGER NOT NULL, "
+    "status TEXT DEFAULT 'free', occupied_by_user_id INTEGER, occupied_timestamp {ts}, customer_name TEXT, people_count INTEGER, "
+    "customer_phone_number TEXT, display_order INTEGER, version INTEGER NOT NULL DEFAULT 0, updated_at {ts})",
+    "CREATE TABLE IF NOT EXISTS customer_history (id {pk}, name TEXT NOT NULL, phone_number TEXT, people_count INTEGER, "
+    "arrival_timestamp {ts} NOT NULL, seated_timestamp {ts}, departed_timestamp {ts}, table_number TEXT)",
+    "CREATE TABLE IF NOT EXISTS waiters (id {pk}, username TEXT NOT NULL UNIQUE, password_hash TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS action_log (id {pk}, waiter_id INTEGER REFERENCES waiters(id), table_id INTEGER REFERENCES tables(id), "
+    "action TEXT NOT NULL, details TEXT, timestamp {ts} DEFAULT CURRENT_TIMESTAMP)",
+    "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+]
+
+DIALECT = {
+    'postgresql': {'pk': 'SERIAL PRIMARY KEY', 'ts': 'TIMESTAMP'},
+    'sqlite': {'pk': 'INTEGER PRIMARY KEY AUTOINCREMENT', 'ts': 'DATETIME'},
+}
+
+def add_column(cursor, db_type, table, column, definition):
+    if db_type == 'postgresql':
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+        return
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row['name'] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def create_index(cursor, db_type, name, table, columns, unique=False, where=None, online=False):
+    """CREATE INDEX IF NOT EXISTS; online=True builds it without blocking writes on PostgreSQL"""
+    concurrently = ''
+    if online and db_type == 'postgresql':
+        concurrently = 'CONCURRENTLY '
+        # A failed concurrent build leaves an INVALID index behind that IF NOT EXISTS would keep
+        cursor.execute("SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = %s", (name,))
+        row = cursor.fetchone()
+        if row and not row['indisvalid']:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cursor.execute(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})"
+        + (f" WHERE {where}" if where else ""))
+
+def backfill_sort_keys(cursor, db_type):
+    """Fill in sort_key for tables that do not have one yet (new column, or rows written by older code)"""
+    cursor.execute("SELECT id, table_number FROM tables WHERE sort_key IS NULL")
+    rows = [(table_sort_key(row['table_number']), row['id']) for row in cursor.fetchall()]
+    if rows:
+        cursor.executemany(adapt_query("UPDATE tables SET sort_key = ? WHERE id = ?", db_type), rows)
+
+def init_counters(cursor, db_type):
+    """Seed the table-number counter past any existing T-numbers, and the floor layout version"""
+    cursor.execute("INSERT INTO counters (name, value) VALUES ('floor_version', 0) ON CONFLICT (name) DO NOTHING")
+    cursor.execute("SELECT table_number FROM tables")
+    numbers = [row['table_number'] for row in cursor.fetchall()]
+    highest = max((int(n[1:]) for n in numbers if n[:1] == 'T' and n[1:].isdigit()), default=0)
+
+    if db_type == 'postgresql':
+        # A real sequence: nextval never blocks or rolls back, so concurrent adds never collide
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS table_number_seq")
+        cursor.execute("SELECT last_value, is_called FROM table_number_seq")
+        row = cursor.fetchone()
+        current = row['last_value'] if row['is_called'] else row['last_value'] - 1
+        if highest > current:
+            cursor.execute("SELECT setval('table_number_seq', %s, true)", (highest,))
+    else:
+        cursor.execute(
+            "INSERT INTO counters (name, value) VALUES ('table_number', ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)", (highest,))
+
+def baseline_schema(cursor, db_type):
+    """Every table the apps use, including columns added after the first release"""
+    for statement in BASELINE_TABLES:
+        cursor.execute(statement.format(**DIALECT[db_type]))
+    ts = DIALECT[db_type]['ts']
+    for table in ('users', 'tables'):
+        add_column(cursor, db_type, table, 'version', 'INTEGER NOT NULL DEFAULT 0')
+        add_column(cursor, db_type, table, 'updated_at', ts)
+    add_column(cursor, db_type, 'tables', 'sort_key', 'TEXT')
+    create_index(cursor, db_type, 'idx_phone_number', 'users', 'phone_number', unique=True, where='phone_number IS NOT NULL')
+    create_index(cursor, db_type, 'idx_tables_sort_key', 'tables', 'sort_key')
+    cursor.execute("INSERT INTO settings (key, value) VALUES ('auto_allocator_enabled', 'True') ON CONFLICT (key) DO NOTHING")
+    backfill_sort_keys(cursor, db_type)
+    init_counters(cursor, db_type)
+
+def hot_path_indexes(cursor, db_type):
+    """Indexes behind the queue order, floor listing, analytics and activity-log filters"""
+    create_index(cursor, db_type, 'idx_users_timestamp', 'users', 'timestamp, id', online=True)
+    create_index(cursor, db_type, 'idx_tables_display_order', 'tables', 'display_order', online=True)
+    create_index(cursor, db_type, 'idx_customer_history_seated', 'customer_history', 'seated_timestamp', online=True)
+    create_index(cursor, db_type, 'idx_action_log_timestamp', 'action_log', 'timestamp', online=True)
+    create_index(cursor, db_type, 'idx_action_log_waiter', 'action_log', 'waiter_id, timestamp', online=True)
+    create_index(cursor, db_type, 'idx_action_log_table', 'action_log', 'table_id, timestamp', online=True)
+
+def link_open_history(cursor, db_type):
+    """Point occupied tables at the newest open history row that lists them (rows written before the link existed)"""
+    cursor.execute("SELECT id, table_number FROM tables WHERE status = 'occupied' AND history_id IS NULL")
+    unlinked = {row['table_number']: row['id'] for row in cursor.fetchall()}
+    links = []
+    if unlinked:
+        cursor.execute("SELECT id, table_number FROM customer_history WHERE departed_timestamp IS NULL ORDER BY id DESC")
+        while unlinked:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for row in rows:
+                for table_number in (row['table_number'] or '').split(', '):
+                    if table_number in unlinked:
+                        links.append((row['id'], unlinked.pop(table_number)))
+    if links:
+        cursor.executemany(adapt_query("UPDATE tables SET history_id = ? WHERE id = ?", db_type), links)
+
+def table_history_link(cursor, db_type):
+    """tables.history_id: the customer_history row of the party last seated at each table"""
+    add_column(cursor, db_type, 'tables', 'history_id', 'INTEGER')
+    create_index(cursor, db_type, 'idx_tables_history_id', 'tables', 'history_id')
+    link_open_history(cursor, db_type)
+
+def departure_index(cursor, db_type):
+    """Lets the wait-time estimator read only the departures since its last refresh"""
+    create_index(cursor, db_type, 'idx_customer_history_departed', 'customer_history', 'departed_timestamp', online=True)
+
+# (version, name, apply, online). Append only; never edit a migration that has shipped.
+MIGRATIONS = [
+    (1, 'baseline_schema', baseline_schema, False),
+    (2, 'hot_path_indexes', hot_path_indexes, True),
+    (3, 'table_history_link', table_history_link, False),
+    (4, 'departure_index', departure_index, True),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Key for pg_advisory_lock; every worker of the app uses the same one
+MIGRATION_LOCK_KEY = 7420250001
+
+@contextmanager
+def _migration_transaction(conn, db_type):
+    if db_type == 'postgresql':
+        with transaction(conn, db_type):
+            yield
+        return
+    # sqlite3 does not open a transaction before DDL on its own. IMMEDIATE takes the
+    # write lock up front, so a second worker waits here instead of racing.
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+@contextmanager
+def _migration_lock(conn, db_type):
+    """Serialise migrations across workers that boot at the same time (PostgreSQL advisory lock)"""
+    if db_type != 'postgresql':
+        yield
+        return
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        yield
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+def current_version(cursor):
+    cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+    row = cursor.fetchone()
+    return (row['version'] if row else None) or 0
+
+def schema_is_current(conn, db_type):
+    """Boot fast path: a single SELECT and no DDL when every migration is already applied"""
+    try:
+        return current_version(conn.cursor()) >= LATEST_VERSION
+    except Exception:
+        # No schema_version table yet
+        if db_type == 'postgresql' and not conn.autocommit:
+            conn.rollback()
+        return False
+
+def _record(cursor, db_type, version, name):
+    cursor.execute(adapt_query(
+        "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, CURRENT_TIMESTAMP) ON CONFLICT (version) DO NOTHING",
+        db_type), (version, name))
+
+def migrate(conn, db_type, verbose=True):
+    """Apply pending migrations in order and return the versions that were applied"""
+    if schema_is_current(conn, db_type):
+        return []
+
+    cursor = conn.cursor()
+    applied = []
+    with _migration_lock(conn, db_type):
+        cursor.execute(SCHEMA_VERSION_TABLE.format(**DIALECT[db_type]))
+        if db_type == 'sqlite':
+            conn.commit()
+
+        for version, name, apply, online in MIGRATIONS:
+            started = time.perf_counter()
+            if online and db_type == 'postgresql':
+                if version <= current_version(cursor):
+                    continue
+                apply(cursor, db_type)
+                _record(cursor, db_type, version, name)
+            else:
+                with _migration_transaction(conn, db_type):
+                    # Checked inside the lock: another worker may have just applied it
+                    if version <= current_version(cursor):
+                        continue
+                    apply(cursor, db_type)
+                    _record(cursor, db_type, version, name)
+            applied.append(version)
+            if verbose:
+                print(f"Applied migration {version} ({name}) in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return applied
+
+def seed_tables(conn, db_type, floor):
+    """Insert a starting floor of (table_number, capacity) if there are no tables yet; returns True if it did"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM tables LIMIT 1")
+    if cursor.fetchone():
+        return False
+    with transaction(conn, db_type):
+        cursor.execute("SELECT COUNT(*) AS count FROM tables")
+        if cursor.fetchone()['count']:
+            return False
+        cursor.executemany(
+            adapt_query("INSERT INTO tables (table_number, sort_key, capacity, display_order) VALUES (?, ?, ?, ?)", db_type),
+            [(number, table_sort_key(number), capacity, index * RANK_GAP) for index, (number, capacity) in enumerate(floor)])
+        init_counters(cursor, db_type)
+    return True
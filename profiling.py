@@ -0,0 +1,230 @@
+"""
+On-demand and continuous profiling.
+
+On demand: an admin adds `X-Profile: cprofile|sample` (or `?_profile=cprofile|sample`)
+to any request. That one request runs under cProfile (deterministic) or a stack
+sampler, and the profile is written to PROFILE_DIR: `.pstats` for cProfile (open
+with `python -m pstats` or snakeviz), `.collapsed` stacks for sampling (flamegraph.pl,
+speedscope). The file name comes back in `X-Profile-File`; with
+`X-Profile-Output: text` (or `?_profile_output=text`) the report replaces the
+response body instead.
+
+Continuous: PROFILE_SAMPLE_HZ > 0 samples every thread at that rate in the
+background; admins read the aggregate from /api/profile/continuous.
+
+Requests without the trigger go straight through: one header lookup, no hooks.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from flask import Response, request, session
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'restroflow-profiles'))
+# Newest profiles kept on disk; older ones are removed as new ones are written
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+# Sampling rate for a profiled request (the GIL switch interval, 5ms, limits what is useful),
+# and for continuous sampling when enabled (0 = off)
+REQUEST_SAMPLE_HZ = float(os.getenv('PROFILE_REQUEST_HZ', '200'))
+CONTINUOUS_SAMPLE_HZ = float(os.getenv('PROFILE_SAMPLE_HZ', '0'))
+MODES = ('cprofile', 'sample')
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def collapse(frame):
+    """Stack as 'outer;...;inner', the folded format flame graph tools read"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def render_collapsed(counts):
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+class StackSampler:
+    """Samples the stacks of some or all threads every 1/hz seconds in a daemon thread"""
+
+    def __init__(self, hz, thread_id=None):
+        self.interval = 1.0 / hz
+        self.thread_id = thread_id
+        self.counts = Counter()
+        self.samples = 0
+        # Guards counts: readers copy it while the sampler thread adds to it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames[self.thread_id]} if self.thread_id in frames else {}
+            stacks = [collapse(frame) for thread_id, frame in frames.items() if thread_id != own]
+            with self._lock:
+                self.counts.update(stacks)
+                self.samples += 1
+
+    def snapshot(self):
+        """Copy of the counts so far"""
+        with self._lock:
+            return Counter(self.counts)
+
+    def reset(self):
+        """The counts so far; sampling starts over"""
+        with self._lock:
+            counts, self.counts, self.samples = self.counts, Counter(), 0
+        return counts
+
+class ProfilerMiddleware:
+    """WSGI middleware that profiles a single request when an admin asks for it"""
+
+    def __init__(self, wsgi_app, flask_app, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.wsgi_app = wsgi_app
+        self.flask_app = flask_app
+        self.directory = directory
+        self.keep = keep
+        # cProfile allows one active profiler per process
+        self._cprofile_lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        mode = environ.get('HTTP_X_PROFILE')
+        if mode is None and '_profile=' in environ.get('QUERY_STRING', ''):
+            mode = self._query_arg(environ, '_profile')
+        if not mode:
+            return self.wsgi_app(environ, start_response)
+        mode = 'cprofile' if mode == '1' else mode
+        if mode not in MODES or not self._is_admin(environ):
+            return self.wsgi_app(environ, start_response)
+        if mode == 'cprofile' and not self._cprofile_lock.acquire(blocking=False):
+            return self.wsgi_app(environ, self._with_headers(start_response, [('X-Profile', 'busy')]))
+        try:
+            return self._profiled(mode, environ, start_response)
+        finally:
+            if mode == 'cprofile':
+                self._cprofile_lock.release()
+
+    def _profiled(self, mode, environ, start_response):
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'], captured['headers'] = status, headers
+            return lambda data: None
+
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler(REQUEST_SAMPLE_HZ, threading.get_ident()).start()
+        try:
+            iterable = self.wsgi_app(environ, capture)
+            streaming = any(k.lower() == 'content-type' and v.startswith('text/event-stream') for k, v in captured['headers'])
+            body = None if streaming else self._consume(iterable)
+        finally:
+            if mode == 'cprofile':
+                profiler.disable()
+            else:
+                sampler.stop()
+        if streaming:
+            # An event stream never ends; hand it back untouched
+            start_response(captured['status'], captured['headers'] + [('X-Profile', 'skipped')])
+            return iterable
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        path = self._output_path(environ, mode)
+        if mode == 'cprofile':
+            profiler.dump_stats(path)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(60)
+            report = report.getvalue()
+        else:
+            report = render_collapsed(sampler.counts)
+            with open(path, 'w') as f:
+                f.write(report)
+        self._prune()
+        print(f"Profiled {environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')} ({mode}, {elapsed_ms:.1f}ms) -> {path}")
+
+        headers = [('X-Profile-File', os.path.basename(path)), ('X-Profile-Ms', f"{elapsed_ms:.1f}")]
+        output = environ.get('HTTP_X_PROFILE_OUTPUT') or self._query_arg(environ, '_profile_output')
+        if output == 'text':
+            start_response('200 OK', [('Content-Type', 'text/plain; charset=utf-8')] + headers)
+            return [report.encode('utf-8')]
+        start_response(captured['status'], [(k, v) for k, v in captured['headers'] if k.lower() != 'content-length']
+                       + [('Content-Length', str(len(body)))] + headers)
+        return [body]
+
+    @staticmethod
+    def _consume(iterable):
+        """Read the whole body inside the profiler, so generated responses are measured too"""
+        try:
+            return b''.join(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    def _is_admin(self, environ):
+        with self.flask_app.request_context(environ):
+            return bool(session.get('is_admin'))
+
+    @staticmethod
+    def _query_arg(environ, name):
+        match = re.search(rf"(?:^|&){name}=([^&]*)", environ.get('QUERY_STRING', ''))
+        return match.group(1) if match else None
+
+    @staticmethod
+    def _with_headers(start_response, extra):
+        def wrapped(status, headers, exc_info=None):
+            return start_response(status, headers + extra, exc_info)
+        return wrapped
+
+    def _output_path(self, environ, mode):
+        os.makedirs(self.directory, exist_ok=True)
+        route = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '')).strip('_') or 'root'
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        extension = 'pstats' if mode == 'cprofile' else 'collapsed'
+        return os.path.join(self.directory, f"{stamp}-{int(time.time() * 1000) % 1000:03d}-{route}.{extension}")
+
+    def _prune(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(('.pstats', '.collapsed')))
+        for name in names[:-self.keep] if self.keep else []:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+def install(app, sample_hz=CONTINUOUS_SAMPLE_HZ):
+    """Enable on-demand profiling for a Flask app, plus continuous sampling when sample_hz > 0"""
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app)
+    sampler = StackSampler(sample_hz).start() if sample_hz > 0 else None
+
+    @app.route('/api/profile/continuous')
+    def continuous_profile():
+        """Folded stacks sampled since start (or since the last ?reset=1)"""
+        if not session.get('is_admin'):
+            return Response("Authentication required.\n", status=401, mimetype='text/plain')
+        if sampler is None:
+            return Response("Continuous sampling is off; set PROFILE_SAMPLE_HZ.\n", status=404, mimetype='text/plain')
+        counts = sampler.reset() if request.args.get('reset') == '1' else sampler.snapshot()
+        return Response(render_collapsed(counts), mimetype='text/plain')
+
+    return sampler
@@ -0,0 +1,165 @@
+import datetime
+from database import adapt_query, driver_error, transaction
+from table_state import CONFLICT, NOT_FOUND, OK
+
+# One statement, one round trip. The party row and the requested free tables are
+# locked first; every write is gated on all of them having been found, so the
+# statement either seats the party completely or changes nothing.
+SEAT_PARTY_POSTGRES = """
+WITH party AS (
+    SELECT id, name, phone_number, people_count, timestamp FROM users
+    WHERE id = %(customer_id)s AND (%(customer_version)s::int IS NULL OR version = %(customer_version)s::int)
+    FOR UPDATE
+), locked AS (
+    SELECT t.id FROM tables t
+    JOIN unnest(%(table_ids)s::int[], %(table_versions)s::int[]) AS expected(id, version) ON t.id = expected.id
+    WHERE t.status = 'free' AND (expected.version IS NULL OR t.version = expected.version)
+    FOR UPDATE OF t
+), ok AS (
+    SELECT 1 WHERE EXISTS (SELECT 1 FROM party) AND (SELECT COUNT(*) FROM locked) = %(table_count)s
+), removed AS (
+    DELETE FROM users WHERE id IN (SELECT id FROM party) AND EXISTS (SELECT 1 FROM ok)
+    RETURNING id
+), history AS (
+    INSERT INTO customer_history (name, phone_number, people_count, arrival_timestamp, seated_timestamp, table_number)
+    SELECT party.name, party.phone_number, party.people_count, COALESCE(party.timestamp, %(seated_at)s), %(seated_at)s,
+        (SELECT string_agg(t.table_number, ', ' ORDER BY t.display_order, t.id) FROM tables t WHERE t.id IN (SELECT id FROM locked))
+    FROM party WHERE EXISTS (SELECT 1 FROM ok)
+    RETURNING id
+), claimed AS (
+    UPDATE tables SET status = 'occupied', occupied_by_user_id = party.id, occupied_timestamp = %(seated_at)s,
+        customer_name = party.name, people_count = party.people_count, customer_phone_number = party.phone_number,
+        history_id = (SELECT id FROM history), version = tables.version + 1, updated_at = %(seated_at)s
+    FROM party
+    WHERE tables.id IN (SELECT id FROM locked) AND EXISTS (SELECT 1 FROM ok)
+    RETURNING tables.id, tables.table_number, tables.display_order, tables.version, tables.history_id
+)
+SELECT claimed.id, claimed.table_number, claimed.display_order, claimed.version, claimed.history_id
+FROM claimed
+"""
+
+def seat_party(conn, db_type, customer_id, table_ids, customer_version=None, table_versions=None, seated_at=None):
+    """Move a party from the queue onto one or more tables and record it in customer_history, atomically.
+
+    The tables keep the history row's id (tables.history_id), so record_departure
+    can close it once the party has left all of them.
+
+    customer_version / table_versions ({table_id: version}) are optional optimistic
+    concurrency checks. Returns {'status': OK | CONFLICT | NOT_FOUND, 'tables': [...],
+    'history_id': ...}; on anything but OK nothing was changed. Commits on its own.
+    """
+    seated_at = seated_at or datetime.datetime.now()
+    cursor = conn.cursor()
+    try:
+        if db_type == 'postgresql':
+            # A single statement: its own transaction on the autocommit connection
+            return _seat(cursor, db_type, customer_id, table_ids, customer_version, table_versions, seated_at)
+        with transaction(conn, db_type):
+            return _seat(cursor, db_type, customer_id, table_ids, customer_version, table_versions, seated_at)
+    except _Rollback:
+        return _failure(cursor, db_type, customer_id)
+
+def seat_parties(conn, db_type, seatings, seated_at=None):
+    """Seat several parties in one transaction and return one seat_party result per seating.
+
+    seatings is a list of (customer_id, table_ids, customer_version, table_versions).
+    Each party is seated in a savepoint of its own, so one that cannot be seated
+    (or hits a database error) changes nothing and the others still are; the
+    whole round pays for a single commit. Commits on its own.
+    """
+    seated_at = seated_at or datetime.datetime.now()
+    cursor = conn.cursor()
+    results = []
+    with transaction(conn, db_type):
+        if db_type == 'sqlite' and not conn.in_transaction:
+            # Savepoints must sit inside the transaction, or releasing one would commit it
+            conn.execute("BEGIN")
+        for customer_id, table_ids, customer_version, table_versions in seatings:
+            cursor.execute("SAVEPOINT seating")
+            try:
+                result = _seat(cursor, db_type, customer_id, table_ids, customer_version, table_versions, seated_at)
+            except (_Rollback, driver_error(db_type)) as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT seating")
+                if not isinstance(e, _Rollback):
+                    print(f"Seating party {customer_id} failed: {e}")
+                result = _failure(cursor, db_type, customer_id)
+            cursor.execute("RELEASE SAVEPOINT seating")
+            results.append(result)
+    return results
+
+def _seat(cursor, db_type, customer_id, table_ids, customer_version, table_versions, seated_at):
+    """The seating statements, inside the caller's transaction; raises _Rollback if the party cannot be seated"""
+    table_ids = list(dict.fromkeys(int(table_id) for table_id in table_ids))
+    table_versions = {int(k): v for k, v in (table_versions or {}).items()}
+
+    if db_type == 'postgresql':
+        cursor.execute(SEAT_PARTY_POSTGRES, {
+            'customer_id': customer_id,
+            'customer_version': customer_version,
+            'table_ids': table_ids,
+            'table_versions': [table_versions.get(table_id) for table_id in table_ids],
+            'table_count': len(table_ids),
+            'seated_at': seated_at,
+        })
+        claimed = [dict(row) for row in cursor.fetchall()]
+        if not claimed:
+            raise _Rollback()
+        tables = [{k: row[k] for k in ('id', 'table_number', 'version')} for row in claimed]
+        return {'status': OK, 'tables': sorted(tables, key=lambda t: table_ids.index(t['id'])), 'history_id': claimed[0]['history_id']}
+
+    cursor.execute(adapt_query(
+        "SELECT id, name, phone_number, people_count, timestamp, version FROM users WHERE id = ?", db_type), (customer_id,))
+    party = cursor.fetchone()
+    if party is None or (customer_version is not None and party['version'] != customer_version):
+        raise _Rollback()
+
+    tables = []
+    for table_id in table_ids:
+        expected = table_versions.get(table_id)
+        cursor.execute(adapt_query(
+            "UPDATE tables SET status = 'occupied', occupied_by_user_id = ?, occupied_timestamp = ?, "
+            "customer_name = ?, people_count = ?, customer_phone_number = ?, version = version + 1, updated_at = ? "
+            "WHERE id = ? AND status = 'free'" + (" AND version = ?" if expected is not None else "")
+            + " RETURNING id, table_number, display_order, version", db_type),
+            (party['id'], seated_at, party['name'], party['people_count'], party['phone_number'], seated_at, table_id)
+            + ((expected,) if expected is not None else ()))
+        claimed = cursor.fetchall()
+        if len(claimed) != 1:
+            raise _Rollback()
+        tables.append(dict(claimed[0]))
+
+    cursor.execute(adapt_query("DELETE FROM users WHERE id = ? AND version = ?", db_type), (party['id'], party['version']))
+    if cursor.rowcount != 1:
+        raise _Rollback()
+
+    in_floor_order = sorted(tables, key=lambda t: (t['display_order'] is None, t['display_order'] or 0, t['id']))
+    cursor.execute(adapt_query(
+        "INSERT INTO customer_history (name, phone_number, people_count, arrival_timestamp, seated_timestamp, table_number) "
+        "VALUES (?, ?, ?, ?, ?, ?)", db_type),
+        (party['name'], party['phone_number'], party['people_count'], party['timestamp'] or seated_at, seated_at,
+         ', '.join(t['table_number'] for t in in_floor_order)))
+    history_id = cursor.lastrowid
+    cursor.execute(adapt_query(f"UPDATE tables SET history_id = ? WHERE id IN ({', '.join('?' for _ in tables)})", db_type),
+                   (history_id, *(t['id'] for t in tables)))
+    return {'status': OK, 'tables': [{k: t[k] for k in ('id', 'table_number', 'version')} for t in tables], 'history_id': history_id}
+
+def record_departure(cursor, db_type, table_id, departed_at):
+    """Call after freeing a table: closes its party's history row once none of the party's tables is occupied.
+
+    A combined seating therefore departs when its last table is freed. One
+    statement, by primary key.
+    """
+    cursor.execute(adapt_query(
+        "UPDATE customer_history SET departed_timestamp = ? "
+        "WHERE id = (SELECT history_id FROM tables WHERE id = ?) AND departed_timestamp IS NULL "
+        "AND NOT EXISTS (SELECT 1 FROM tables WHERE history_id = customer_history.id AND status = 'occupied')", db_type),
+        (departed_at, table_id))
+
+class _Rollback(Exception):
+    pass
+
+def _failure(cursor, db_type, customer_id):
+    """Nothing was written; tell a vanished party apart from a lost race for a table"""
+    cursor.execute(adapt_query("SELECT id FROM users WHERE id = ?", db_type), (customer_id,))
+    status = CONFLICT if cursor.fetchone() else NOT_FOUND
+    return {'status': status, 'tables': [], 'history_id': None}
@@ -0,0 +1,163 @@
+import threading
+import time
+from database import adapt_query, transaction
+
+# key -> (type, default). Values are stored as text in the settings table.
+SETTINGS = {
+    'auto_allocator_enabled': (bool, True),
+    'allocator_policy': (str, 'best_fit'),
+    'allocator_skip_ahead': (int, 3),
+    'allocator_backfill_max': (int, 2),
+    'allocator_max_combined_tables': (int, 4),
+    'table_adjacency': (str, None),
+}
+VERSION_KEY = 'settings_version'
+# How often a worker checks whether another worker changed the settings
+CHECK_INTERVAL_SECONDS = 2.0
+
+UPSERT = "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value"
+BUMP_VERSION = (
+    "INSERT INTO settings (key, value) VALUES ('settings_version', '1') "
+    "ON CONFLICT (key) DO UPDATE SET value = CAST(CAST(settings.value AS INTEGER) + 1 AS TEXT)"
+)
+
+def parse_value(key, raw):
+    kind, default = SETTINGS[key]
+    if raw is None:
+        return default
+    if kind is bool:
+        return raw == 'True'
+    try:
+        return kind(raw)
+    except (TypeError, ValueError):
+        return default
+
+def format_value(key, value):
+    kind, _ = SETTINGS[key]
+    if value is None:
+        return None
+    if kind is bool:
+        return str(bool(value))
+    return str(kind(value))
+
+class SettingsStore:
+    """Typed, in-memory copy of the settings table.
+
+    Loaded once, then served from memory. Writes go to the database in one
+    transaction together with a settings_version bump; other workers notice the
+    new version at their next check (every CHECK_INTERVAL_SECONDS at most) and
+    reload. Subscribers are called with the changed keys either way. Writes go
+    through write(apply) when given, which runs apply(conn, db_type) wherever the
+    app sends its writes (e.g. a single writer thread).
+    """
+
+    def __init__(self, connect, check_interval=CHECK_INTERVAL_SECONDS, write=None):
+        self._connect = connect
+        self._write_through = write or self._write_directly
+        self._check_interval = check_interval
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """callback(changed) is called with a dict of the settings that changed"""
+        self._subscribers.append(callback)
+
+    def get(self, key):
+        return self.all()[key]
+
+    def all(self):
+        if self._values is None or time.monotonic() - self._checked_at >= self._check_interval:
+            self._check_version()
+        return self._values
+
+    def reload(self):
+        conn, db_type = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT key, value FROM settings")
+            rows = {row['key']: row['value'] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+        self._apply(rows)
+
+    def _check_version(self):
+        with self._lock:
+            if self._values is not None and time.monotonic() - self._checked_at < self._check_interval:
+                return
+            if self._values is None:
+                self.reload()
+                return
+            conn, db_type = self._connect()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT value FROM settings WHERE key = '{VERSION_KEY}'")
+                row = cursor.fetchone()
+            finally:
+                conn.close()
+            if (row['value'] if row else None) != self._version:
+                self.reload()
+            else:
+                self._checked_at = time.monotonic()
+
+    def _apply(self, rows):
+        with self._lock:
+            values = {key: parse_value(key, rows.get(key)) for key in SETTINGS}
+            changed = {key: value for key, value in values.items()
+                       if self._values is not None and self._values[key] != value}
+            self._values = values
+            self._version = rows.get(VERSION_KEY)
+            self._checked_at = time.monotonic()
+        if changed:
+            self._notify(changed)
+
+    def _notify(self, changed):
+        for callback in list(self._subscribers):
+            try:
+                callback(changed)
+            except Exception as e:
+                print(f"Settings subscriber failed: {e}")
+
+    def update(self, **values):
+        """Write one or more settings atomically and return the new typed values"""
+        for key in values:
+            if key not in SETTINGS:
+                raise KeyError(f"Unknown setting: {key}")
+        return self._write(lambda cursor, db_type: [(key, format_value(key, value)) for key, value in values.items()])
+
+    def toggle(self, key):
+        """Flip a boolean setting in the database (no read-then-write race) and return its new value"""
+        if SETTINGS[key][0] is not bool:
+            raise TypeError(f"Setting {key} is not a boolean")
+
+        def flip(cursor, db_type):
+            # The flip happens inside the UPDATE; the row lock it takes makes the read-back safe
+            cursor.execute(adapt_query(
+                "UPDATE settings SET value = CASE WHEN value = 'True' THEN 'False' ELSE 'True' END WHERE key = ?", db_type), (key,))
+            if cursor.rowcount == 0:
+                return [(key, format_value(key, not SETTINGS[key][1]))]
+            return []
+
+        return self._write(flip)[key]
+
+    def _write(self, statements):
+        def apply(conn, db_type):
+            cursor = conn.cursor()
+            with transaction(conn, db_type):
+                for key, value in statements(cursor, db_type):
+                    cursor.execute(adapt_query(UPSERT, db_type), (key, value))
+                cursor.execute(BUMP_VERSION)
+                cursor.execute("SELECT key, value FROM settings")
+                return {row['key']: row['value'] for row in cursor.fetchall()}
+
+        self._apply(self._write_through(apply))
+        return self._values
+
+    def _write_directly(self, apply):
+        conn, db_type = self._connect()
+        try:
+            return apply(conn, db_type)
+        finally:
+            conn.close()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Replay historical days against candidate allocator policies and floor layouts.
+
+Each scenario (policy x layout x day) runs as a discrete-event simulation:
+arrivals and departures are processed in time order and an allocation round
+(allocator.plan_allocations, the same code the live auto-allocator uses) runs
+after every event. Scenarios are fanned out over a process pool.
+
+    python simulation.py --days 2025-10-03 2025-10-04 \\
+        --policy fifo --policy best_fit:skip_ahead=5 --policy backfill:backfill_max=2 \\
+        --layout current --layout 2x10+4x30+6x10 --output results.json
+"""
+import argparse
+import datetime
+import heapq
+import itertools
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from allocator import POLICIES, plan_allocations
+from database import get_db_connection
+from table_combinations import MAX_COMBINED_TABLES
+from wait_estimator import DEFAULT_DWELL_MINUTES, to_datetime
+
+ARRIVAL, DEPARTURE = 0, 1
+LOGGED_PARTY = re.compile(r"^(?P<name>.*) \(Party of (?P<people_count>\d+)\)$")
+
+def parse_policy(spec):
+    """'best_fit:skip_ahead=5,backfill_max=2' -> {'policy': 'best_fit', 'skip_ahead': 5, ...}"""
+    name, _, options = spec.partition(':')
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy '{name}', expected one of: {', '.join(POLICIES)}")
+    policy = {'name': spec, 'policy': name, 'skip_ahead': 3, 'backfill_max': 2,
+              'max_combined_tables': MAX_COMBINED_TABLES}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key not in policy or key in ('name', 'policy'):
+            raise ValueError(f"Unknown policy option '{key}'")
+        try:
+            policy[key] = int(value)
+        except ValueError:
+            raise ValueError(f"Policy option '{key}' needs a whole number, got '{value}'")
+    return policy
+
+def parse_layout(spec, current_tables=None):
+    """'current' (the live floor) or a capacity spec such as '2x9+4x29+6x8'"""
+    if spec == 'current':
+        tables = [{'table_number': t['table_number'], 'capacity': t['capacity']} for t in current_tables or []]
+    else:
+        tables = []
+        for group in spec.split('+'):
+            capacity, _, count = group.partition('x')
+            try:
+                capacity, count = int(capacity), int(count or 1)
+            except ValueError:
+                raise ValueError(f"Invalid layout '{spec}': '{group}' is not CAPACITYxCOUNT, e.g. 4x10")
+            if capacity < 1 or count < 1:
+                raise ValueError(f"Invalid layout '{spec}': '{group}' needs a positive capacity and count")
+            for _ in range(count):
+                tables.append({'table_number': f"T{len(tables) + 1}", 'capacity': capacity})
+    for index, table in enumerate(tables):
+        table.update(id=index + 1, display_order=index)
+    return {'name': spec, 'tables': tables}
+
+def load_day(cursor, db_type, day):
+    """Arrivals for one day as minute offsets from midnight, with the dwell each party actually had.
+
+    customer_history gives arrival and (when known) dwell times. Parties that only
+    appear in action_log as manual queue additions, e.g. seated before history was
+    captured, are replayed with the day's median dwell.
+    """
+    placeholder = '%s' if db_type == 'postgresql' else '?'
+    start = datetime.datetime.combine(day, datetime.time.min)
+    end = start + datetime.timedelta(days=1)
+
+    cursor.execute(
+        f"SELECT name, people_count, arrival_timestamp, seated_timestamp, departed_timestamp FROM customer_history "
+        f"WHERE arrival_timestamp >= {placeholder} AND arrival_timestamp < {placeholder}", (start, end))
+    arrivals = []
+    seen = defaultdict(int)
+    for row in cursor.fetchall():
+        arrived = to_datetime(row['arrival_timestamp'])
+        seated, departed = to_datetime(row['seated_timestamp']), to_datetime(row['departed_timestamp'])
+        if arrived is None or not row['people_count']:
+            continue
+        dwell = (departed - seated).total_seconds() / 60 if seated and departed else None
+        arrivals.append({'name': row['name'], 'people_count': row['people_count'],
+                         'arrival': (arrived - start).total_seconds() / 60, 'dwell': dwell})
+        seen[(row['name'], row['people_count'])] += 1
+
+    cursor.execute(
+        f"SELECT details, timestamp FROM action_log WHERE action = 'customer_added_manually' "
+        f"AND timestamp >= {placeholder} AND timestamp < {placeholder}", (start, end))
+    for row in cursor.fetchall():
+        match = LOGGED_PARTY.match(row['details'] or '')
+        logged_at = to_datetime(row['timestamp'])
+        if not match or logged_at is None:
+            continue
+        key = (match['name'], int(match['people_count']))
+        if seen[key]:
+            seen[key] -= 1
+            continue
+        logged_at = logged_at.replace(tzinfo=None)
+        arrivals.append({'name': key[0], 'people_count': key[1],
+                         'arrival': (logged_at - start).total_seconds() / 60, 'dwell': None})
+
+    known = sorted(a['dwell'] for a in arrivals if a['dwell'] is not None)
+    median_dwell = known[len(known) // 2] if known else DEFAULT_DWELL_MINUTES
+    for a in arrivals:
+        if a['dwell'] is None:
+            a['dwell'] = median_dwell
+    arrivals.sort(key=lambda a: a['arrival'])
+    return {'day': day.isoformat(), 'arrivals': arrivals}
+
+def simulate(day, policy, layout):
+    """Run one scenario and return its wait-time and utilization metrics"""
+    tables = [dict(t, status='free') for t in layout['tables']]
+    by_id = {t['id']: t for t in tables}
+    events = []
+    sequence = itertools.count()
+    for party_id, arrival in enumerate(day['arrivals'], start=1):
+        heapq.heappush(events, (arrival['arrival'], ARRIVAL, next(sequence), dict(arrival, id=party_id)))
+
+    queue = []
+    waits = []
+    table_minutes = 0.0
+    seat_minutes = 0.0
+    people_minutes = 0.0
+    first_event = events[0][0] if events else 0.0
+    last_event = first_event
+
+    while events:
+        now, kind, _, payload = heapq.heappop(events)
+        last_event = max(last_event, now)
+        if kind == ARRIVAL:
+            queue.append(payload)
+        else:
+            for table_id in payload:
+                by_id[table_id]['status'] = 'free'
+        if events and events[0][0] == now:
+            continue  # allocate once per instant, after every simultaneous event
+
+        free_tables = [t for t in tables if t['status'] == 'free']
+        if not queue or not free_tables:
+            continue
+        plan = plan_allocations(queue, free_tables, policy['policy'], policy['skip_ahead'],
+                                policy['backfill_max'], floor=tables,
+                                max_combined_tables=policy['max_combined_tables'])
+        seated_ids = set()
+        for party, seated_at in plan:
+            seated_ids.add(party['id'])
+            waits.append(now - party['arrival'])
+            for table in seated_at:
+                table['status'] = 'occupied'
+            capacity = sum(t['capacity'] for t in seated_at)
+            table_minutes += len(seated_at) * party['dwell']
+            seat_minutes += capacity * party['dwell']
+            people_minutes += party['people_count'] * party['dwell']
+            heapq.heappush(events, (now + party['dwell'], DEPARTURE, next(sequence), [t['id'] for t in seated_at]))
+        queue = [p for p in queue if p['id'] not in seated_ids]
+
+    waits.sort()
+    horizon = max(last_event - first_event, 1e-9)
+    return {
+        'day': day['day'],
+        'policy': policy['name'],
+        'layout': layout['name'],
+        'tables': len(tables),
+        'parties': len(day['arrivals']),
+        'seated': len(waits),
+        'never_seated': len(queue),
+        'avg_wait_minutes': round(sum(waits) / len(waits), 1) if waits else None,
+        'p50_wait_minutes': round(waits[len(waits) // 2], 1) if waits else None,
+        'p90_wait_minutes': round(waits[int(len(waits) * 0.9)], 1) if waits else None,
+        'max_wait_minutes': round(waits[-1], 1) if waits else None,
+        'table_utilization': round(table_minutes / (len(tables) * horizon), 3) if tables else None,
+        'seat_fill': round(people_minutes / seat_minutes, 3) if seat_minutes else None,
+    }
+
+def _run_scenario(args):
+    return simulate(*args)
+
+def run_scenarios(days, policies, layouts, workers=None):
+    """Fan every (policy x layout x day) scenario out across a process pool"""
+    scenarios = list(itertools.product(days, policies, layouts))
+    if workers == 1:
+        return [_run_scenario(s) for s in scenarios]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return list(pool.map(_run_scenario, scenarios))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay historical days against allocator policies and table layouts.")
+    parser.add_argument('--days', nargs='*', default=[], help="Days to replay (YYYY-MM-DD). Defaults to the most recent days in history.")
+    parser.add_argument('--recent', type=int, default=7, help="How many recent days to replay when --days is not given.")
+    parser.add_argument('--policy', action='append', help="Policy spec, e.g. fifo or best_fit:skip_ahead=5. Repeatable.")
+    parser.add_argument('--layout', action='append', help="'current' or a capacity spec such as 2x9+4x29+6x8. Repeatable.")
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (default: all cores).")
+    parser.add_argument('--output', help="Write results as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    try:
+        policies = [parse_policy(spec) for spec in args.policy or list(POLICIES)]
+        # Layout specs are checked before connecting, so a typo fails fast
+        for spec in args.layout or []:
+            if spec != 'current':
+                parse_layout(spec)
+    except ValueError as e:
+        parser.error(str(e))
+    conn, db_type = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT table_number, capacity FROM tables ORDER BY display_order ASC")
+        current_tables = [dict(row) for row in cursor.fetchall()]
+        layouts = [parse_layout(spec, current_tables) for spec in args.layout or ['current']]
+
+        if args.days:
+            days = [datetime.date.fromisoformat(d) for d in args.days]
+        else:
+            cursor.execute("SELECT arrival_timestamp FROM customer_history")
+            all_days = {to_datetime(row['arrival_timestamp']).date() for row in cursor.fetchall() if row['arrival_timestamp']}
+            days = sorted(all_days)[-args.recent:]
+        replay_days = [load_day(cursor, db_type, day) for day in days]
+    finally:
+        conn.close()
+
+    replay_days = [d for d in replay_days if d['arrivals']]
+    if not replay_days:
+        print("No arrivals found for the selected days.")
+        return 1
+
+    results = run_scenarios(replay_days, policies, layouts, workers=args.workers)
+    print(f"{'day':<12}{'policy':<28}{'layout':<20}{'seated':>8}{'avg wait':>10}{'p90 wait':>10}{'util':>8}")
+    for r in results:
+        print(f"{r['day']:<12}{r['policy']:<28}{r['layout'][:19]:<20}{r['seated']:>5}/{r['parties']:<3}"
+              f"{r['avg_wait_minutes'] if r['avg_wait_minutes'] is not None else '-':>9}"
+              f"{r['p90_wait_minutes'] if r['p90_wait_minutes'] is not None else '-':>10}"
+              f"{r['table_utilization'] if r['table_utilization'] is not None else '-':>8}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {len(results)} scenario results to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
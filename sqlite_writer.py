@@ -0,0 +1,199 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from database import connect_sqlite
+
+# Mutations committed together at most; more waiting ones go in the next transaction
+MAX_BATCH = 64
+# Read-only connections kept open for reuse (more are opened under load and closed afterwards)
+READERS = int(os.getenv('SQLITE_READERS', '4'))
+
+class _Mutation:
+    __slots__ = ('apply', 'done', 'result', 'error')
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _BatchConnection:
+    """The writer's connection as one mutation sees it: inside a savepoint of the batch.
+
+    commit() is left to the batch and rollback() undoes only this mutation.
+    `with conn:` (as database.transaction does) is a nested savepoint, so a
+    mutation can make several self-contained changes - e.g. seat several
+    parties - and an exception leaving the block undoes just that block.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    @property
+    def in_transaction(self):
+        return True
+
+    def cursor(self):
+        return self._conn.cursor()
+
+    def execute(self, sql, parameters=()):
+        return self._conn.execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._conn.executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self._conn.execute("ROLLBACK TO mutation")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self._conn.execute("SAVEPOINT block")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._conn.execute("ROLLBACK TO block")
+        self._conn.execute("RELEASE block")
+        return False
+
+class SQLiteWriter:
+    """One thread owns every write to a SQLite file; readers share read-only WAL connections.
+
+    submit(apply) queues apply(conn) for the writer thread and waits for it. The
+    writer takes whatever is queued (up to MAX_BATCH), runs each mutation in a
+    savepoint of one IMMEDIATE transaction and commits once, so concurrent
+    writers never meet SQLite's lock and a burst costs one commit. A mutation
+    that raises is rolled back on its own and its caller gets the exception.
+    Results are handed back only after the commit.
+
+    reader() lends a read-only connection. In WAL mode readers never block the
+    writer or each other.
+    """
+
+    def __init__(self, path="users.db", max_batch=MAX_BATCH, readers=READERS):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._readers = queue.LifoQueue(maxsize=readers)
+        self._thread = None
+        self._started = threading.Event()
+        self._start_error = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.mutations = 0
+        self.last_batch_ms = None
+
+    def start(self):
+        """Open the writer connection (switching the file to WAL) and start the thread; idempotent"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._started.clear()
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            raise self._start_error
+
+    def stop(self):
+        """Finish what is queued, then close the writer connection"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def submit(self, apply):
+        """Run apply(conn) on the writer thread, committed with whatever else is queued; returns its result"""
+        if threading.current_thread() is self._thread:
+            # A mutation that writes again: it is already inside the batch
+            return apply(_BatchConnection(self._conn))
+        self.start()
+        mutation = _Mutation(apply)
+        self._queue.put(mutation)
+        mutation.done.wait()
+        if mutation.error is not None:
+            raise mutation.error
+        return mutation.result
+
+    @contextmanager
+    def reader(self):
+        """A pooled read-only connection; sees everything committed before each statement"""
+        self.start()
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = connect_sqlite(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _run(self):
+        try:
+            # Autocommit mode: the writer issues BEGIN/SAVEPOINT/COMMIT itself
+            self._conn = connect_sqlite(self.path, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._start_error = None
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            return
+        self._started.set()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                break
+            while len(batch) < self.max_batch:
+                try:
+                    mutation = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if mutation is None:
+                    stopping = True
+                    break
+                batch.append(mutation)
+            self._apply(batch)
+        self._conn.close()
+
+    def _apply(self, batch):
+        started = time.perf_counter()
+        conn = self._conn
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for mutation in batch:
+                conn.execute("SAVEPOINT mutation")
+                try:
+                    mutation.result = mutation.apply(_BatchConnection(conn))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO mutation")
+                    mutation.error = e
+                conn.execute("RELEASE mutation")
+            conn.execute("COMMIT")
+        except Exception as e:
+            # The batch did not commit, so none of it happened
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for mutation in batch:
+                mutation.result = None
+                mutation.error = mutation.error or e
+            print(f"SQLite writer batch of {len(batch)} failed: {e}")
+        self.batches += 1
+        self.mutations += len(batch)
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+        for mutation in batch:
+            mutation.done.set()
+
+    def stats(self):
+        return {'batches': self.batches, 'mutations': self.mutations, 'queued': self._queue.qsize(),
+                'last_batch_ms': self.last_batch_ms}
@@ -0,0 +1,187 @@
+import json
+from bisect import bisect_left
+from collections import Counter
+
+MAX_COMBINED_TABLES = 4
+# A non-adjacent set has to save this many seats over an adjacent one to win
+ADJACENCY_PENALTY = 2
+
+def floor_order(tables):
+    """Tables in the order they are laid out on the floor (display_order, then id)"""
+    return sorted(tables, key=lambda t: (t.get('display_order') is None, t.get('display_order') or 0, t['id']))
+
+def parse_adjacency(raw, tables):
+    """Build an id -> neighbour ids graph from a JSON map of table_number -> [table_number, ...].
+
+    Links are made symmetric; unknown table numbers are ignored. Returns None
+    when no graph is configured so callers fall back to display_order neighbours.
+    """
+    if not raw:
+        return None
+    ids = {t['table_number']: t['id'] for t in tables}
+    graph = {t['id']: set() for t in tables}
+    for table_number, neighbours in json.loads(raw).items():
+        if table_number not in ids:
+            continue
+        for neighbour in neighbours:
+            if neighbour in ids:
+                graph[ids[table_number]].add(ids[neighbour])
+                graph[ids[neighbour]].add(ids[table_number])
+    return graph
+
+def _candidate(tables, people_count, adjacent, positions):
+    capacity = sum(t['capacity'] for t in tables)
+    table_positions = [positions[t['id']] for t in tables]
+    return {
+        'tables': sorted(tables, key=lambda t: positions[t['id']]),
+        'capacity': capacity,
+        'wasted_seats': capacity - people_count,
+        'adjacent': adjacent,
+        'span': max(table_positions) - min(table_positions),
+    }
+
+def _score(candidate):
+    penalty = 0 if candidate['adjacent'] else ADJACENCY_PENALTY
+    return (candidate['wasted_seats'] + penalty, len(candidate['tables']), candidate['span'])
+
+def _adjacent_runs(ordered, free_ids, people_count, max_tables, positions):
+    """Sliding windows over runs of neighbouring free tables in floor order"""
+    candidates = []
+    run = []
+    for table in ordered + [None]:
+        if table is not None and table['id'] in free_ids:
+            run.append(table)
+            continue
+        for start in range(len(run)):
+            seats = 0
+            for end in range(start, min(start + max_tables, len(run))):
+                seats += run[end]['capacity']
+                if seats >= people_count:
+                    candidates.append(_candidate(run[start:end + 1], people_count, True, positions))
+                    break
+        run = []
+    return candidates
+
+def _connected_sets(free_tables, adjacency, people_count, max_tables, positions):
+    """Enumerate connected sets of free tables in an explicit adjacency graph.
+
+    Each set is produced once (ESU-style extension, neighbours with a larger id
+    than the seed only) and growth stops as soon as the party fits, since any
+    larger superset only wastes more seats.
+    """
+    by_id = {t['id']: t for t in free_tables}
+    neighbours = {tid: {n for n in adjacency.get(tid, ()) if n in by_id} for tid in by_id}
+    candidates = []
+
+    def extend(chosen, seats, frontier, seed):
+        if seats >= people_count:
+            candidates.append(_candidate([by_id[i] for i in chosen], people_count, True, positions))
+            return
+        if len(chosen) >= max_tables:
+            return
+        frontier = list(frontier)
+        while frontier:
+            nxt = frontier.pop()
+            new_frontier = set(frontier)
+            for n in neighbours[nxt]:
+                if n > seed and n not in chosen and all(n not in neighbours[c] for c in chosen):
+                    new_frontier.add(n)
+            extend(chosen + [nxt], seats + by_id[nxt]['capacity'], new_frontier, seed)
+
+    for seed in by_id:
+        extend([seed], by_id[seed]['capacity'], {n for n in neighbours[seed] if n > seed}, seed)
+    return candidates
+
+def _capacity_mixes(free_tables, people_count, max_tables, limit):
+    """Bounded knapsack over table capacities: fewest tables for each reachable seat count >= party"""
+    counts = Counter(t['capacity'] for t in free_tables)
+    partial = {0: ()}
+    complete = {}
+    for capacity in sorted(counts, reverse=True):
+        for _ in range(min(counts[capacity], max_tables)):
+            for seats, mix in list(partial.items()):
+                if len(mix) >= max_tables:
+                    continue
+                total = seats + capacity
+                new_mix = mix + (capacity,)
+                target = complete if total >= people_count else partial
+                if total not in target or len(new_mix) < len(target[total]):
+                    target[total] = new_mix
+    return [complete[seats] for seats in sorted(complete)[:limit]]
+
+def _nearest(sorted_positions, origin, count, exclude):
+    """The count positions closest to origin, walking outwards from it"""
+    right = bisect_left(sorted_positions, origin)
+    left = right - 1
+    picked = []
+    while len(picked) < count and (left >= 0 or right < len(sorted_positions)):
+        if right >= len(sorted_positions) or (left >= 0 and origin - sorted_positions[left] <= sorted_positions[right] - origin):
+            position, left = sorted_positions[left], left - 1
+        else:
+            position, right = sorted_positions[right], right + 1
+        if position != exclude:
+            picked.append(position)
+    return picked
+
+def _pick_tables(mix, free_tables, positions):
+    """Choose concrete tables for a capacity mix, keeping them as close together as possible"""
+    by_position = {positions[t['id']]: t for t in free_tables}
+    by_capacity = {}
+    for table in free_tables:
+        by_capacity.setdefault(table['capacity'], []).append(positions[table['id']])
+    needed = Counter(mix)
+    anchor_capacity = min(needed, key=lambda c: len(by_capacity[c]))
+    best = None
+    for origin in by_capacity[anchor_capacity]:
+        chosen = [origin]
+        for capacity, count in needed.items():
+            if capacity == anchor_capacity:
+                count -= 1
+            chosen.extend(_nearest(by_capacity[capacity], origin, count, origin))
+        span = max(chosen) - min(chosen)
+        if best is None or span < best[0]:
+            best = (span, chosen)
+    return [by_position[position] for position in best[1]]
+
+def suggest_combinations(tables, people_count, free_ids=None, adjacency=None, max_tables=MAX_COMBINED_TABLES, limit=3):
+    """Rank sets of free tables that can seat people_count together.
+
+    tables is the whole floor (any status) so that neighbours are judged by
+    floor position; free_ids restricts which of them may be used (defaults to
+    status == 'free'). adjacency optionally maps table id -> neighbouring ids and
+    replaces display_order neighbours. Returns up to limit candidates, best first.
+    """
+    if people_count < 1:
+        return []
+    ordered = floor_order(tables)
+    positions = {t['id']: index for index, t in enumerate(ordered)}
+    if free_ids is None:
+        free_ids = {t['id'] for t in tables if t.get('status', 'free') == 'free'}
+    free_tables = [t for t in ordered if t['id'] in free_ids]
+    if not free_tables:
+        return []
+
+    if adjacency is None:
+        candidates = _adjacent_runs(ordered, free_ids, people_count, max_tables, positions)
+    else:
+        candidates = _connected_sets(free_tables, adjacency, people_count, max_tables, positions)
+    for mix in _capacity_mixes(free_tables, people_count, max_tables, limit):
+        chosen = _pick_tables(mix, free_tables, positions)
+        candidates.append(_candidate(chosen, people_count, False, positions))
+
+    ranked = []
+    seen = set()
+    for candidate in sorted(candidates, key=_score):
+        key = frozenset(t['id'] for t in candidate['tables'])
+        if key in seen:
+            continue
+        seen.add(key)
+        ranked.append(candidate)
+        if len(ranked) == limit:
+            break
+    return ranked
+
+def best_combination(tables, people_count, free_ids=None, adjacency=None, max_tables=MAX_COMBINED_TABLES):
+    """The single best set of free tables for the party, or None if it cannot be seated"""
+    ranked = suggest_combinations(tables, people_count, free_ids, adjacency, max_tables, limit=1)
+    return ranked[0]['tables'] if ranked else None
@@ -0,0 +1,71 @@
+import datetime
+from database import adapt_query
+
+OK = 'ok'
+UNCHANGED = 'unchanged'
+CONFLICT = 'conflict'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+# action -> (target status, statuses it may be applied from, SET clause)
+TRANSITIONS = {
+    'block': ('blocked', ('free',), "status = 'blocked'"),
+    'free': ('free', ('occupied', 'blocked'),
+             "status = 'free', customer_name = NULL, people_count = NULL, customer_phone_number = NULL, "
+             "occupied_timestamp = NULL, occupied_by_user_id = NULL"),
+}
+
+TABLE_FIELDS = "id, table_number, status, version, customer_name"
+
+def _fetch(cursor, db_type, table_id):
+    cursor.execute(adapt_query(f"SELECT {TABLE_FIELDS} FROM tables WHERE id = ?", db_type), (table_id,))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+def transition_table(conn, db_type, table_id, action, expected_version=None):
+    """Apply a state transition to one table with a single conditional UPDATE.
+
+    The UPDATE only matches if the row still has the version the caller saw (and
+    is in a status the transition may start from), so concurrent writers cannot
+    overwrite each other. When the caller did not send a version, the current one
+    is read first; a change between that read and the write is still a conflict.
+
+    Returns {'status': OK | UNCHANGED | CONFLICT | NOT_FOUND | INVALID, 'table': row or None}.
+    The caller owns the transaction (commit/rollback).
+    """
+    target, allowed_from, assignments = TRANSITIONS[action]
+    cursor = conn.cursor()
+
+    if expected_version is None:
+        current = _fetch(cursor, db_type, table_id)
+        if current is None:
+            return {'status': NOT_FOUND, 'table': None}
+        if current['status'] == target:
+            return {'status': UNCHANGED, 'table': current}
+        expected_version = current['version']
+
+    placeholders = ', '.join('?' for _ in allowed_from)
+    cursor.execute(adapt_query(
+        f"UPDATE tables SET {assignments}, version = version + 1, updated_at = ? "
+        f"WHERE id = ? AND version = ? AND status IN ({placeholders}) RETURNING {TABLE_FIELDS}", db_type),
+        (datetime.datetime.now(), table_id, expected_version, *allowed_from))
+    updated = cursor.fetchall()
+    if updated:
+        return {'status': OK, 'table': dict(updated[0])}
+
+    # Work out why nothing matched so the client gets a useful answer
+    current = _fetch(cursor, db_type, table_id)
+    if current is None:
+        return {'status': NOT_FOUND, 'table': None}
+    if current['version'] != expected_version:
+        return {'status': CONFLICT, 'table': current}
+    if current['status'] == target:
+        return {'status': UNCHANGED, 'table': current}
+    return {'status': INVALID, 'table': current}
+
+def parse_version(value):
+    """Version sent by a client form/JSON body, or None if it did not send one"""
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DEFAULT_FLOOR, connect_sqlite
+from migrations import migrate, seed_tables
+
+@pytest.fixture
+def connect(tmp_path, monkeypatch):
+    """A fresh, migrated SQLite users.db with the default floor; returns a get_db_connection stand-in"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATABASE_URL', '')
+
+    def connect():
+        return connect_sqlite(), 'sqlite'
+
+    conn, db_type = connect()
+    migrate(conn, db_type, verbose=False)
+    seed_tables(conn, db_type, DEFAULT_FLOOR)
+    conn.close()
+    return connect
+
+@pytest.fixture
+def admin(connect):
+    """Flask test client for app.py, logged in as admin, on the fixture database"""
+    import app as app_module
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    return client
@@ -0,0 +1,62 @@
+import datetime
+import time
+
+from action_log import ActionLogWriter
+from database import connect_sqlite
+
+def traced(statements):
+    """Connection factory that records every statement it runs"""
+    def connect():
+        conn = connect_sqlite(check_same_thread=False)
+        conn.set_trace_callback(statements.append)
+        return conn, 'sqlite'
+    return connect
+
+def logged(connect):
+    conn, _ = connect()
+    try:
+        return [row['action'] for row in conn.execute("SELECT action FROM action_log ORDER BY id")]
+    finally:
+        conn.close()
+
+def now():
+    return datetime.datetime.now()
+
+def test_a_burst_is_one_multi_row_insert(connect):
+    statements = []
+    writer = ActionLogWriter(traced(statements), flush_interval=60)
+    for i in range(10):
+        writer.log(None, 1, f"action {i}", None, now())
+    assert writer.flush(timeout=5)
+    writer.close()
+    inserts = [sql for sql in statements if sql.startswith("INSERT INTO action_log")]
+    assert len(inserts) == 1 and inserts[0].count("), (") == 9
+    assert logged(connect) == [f"action {i}" for i in range(10)]
+
+def test_a_failing_row_is_retried_alone(connect):
+    writer = ActionLogWriter(traced([]), flush_interval=60)
+    for action in ("seat", None, "free"):  # action is NOT NULL
+        writer.log(None, 1, action, None, now())
+    writer.close()
+    assert logged(connect) == ["seat", "free"]
+    assert writer.stats() == {'pending': 0, 'written': 2, 'dropped': 0, 'failed': 1}
+
+def test_a_full_buffer_drops_the_oldest_events(connect):
+    writer = ActionLogWriter(traced([]), flush_interval=60, max_pending=3, enqueue_timeout=0)
+    for i in range(5):
+        assert writer.log(None, 1, f"action {i}", None, now())
+    assert writer.stats()['dropped'] == 2
+    writer.close()
+    assert logged(connect) == ["action 2", "action 3", "action 4"]
+
+def test_close_writes_what_is_still_buffered(connect):
+    writer = ActionLogWriter(traced([]), flush_interval=60)
+    writer.log(None, 1, "seat", None, now())
+    writer.log(None, 2, "free", None, now())
+    started = time.monotonic()
+    writer.close()
+    assert time.monotonic() - started < 5  # did not sit out the flush interval
+    assert logged(connect) == ["seat", "free"]
+    # Events after close are written inline
+    assert writer.log(None, 3, "block", None, now())
+    assert logged(connect) == ["seat", "free", "block"]
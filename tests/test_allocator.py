@@ -0,0 +1,71 @@
+import pytest
+
+from allocator import AutoAllocator, plan_allocations
+from settings_store import SettingsStore
+
+def table(table_id, capacity):
+    return {'id': table_id, 'table_number': f"T{table_id}", 'capacity': capacity, 'status': 'free', 'display_order': table_id}
+
+def party(party_id, people_count):
+    return {'id': party_id, 'people_count': people_count}
+
+def seated(plan):
+    return [(p['id'], [t['id'] for t in tables]) for p, tables in plan]
+
+def test_smallest_fitting_table_oldest_party_first():
+    tables = [table(1, 2), table(2, 4), table(3, 6)]
+    assert seated(plan_allocations([party(1, 3), party(2, 2), party(3, 5)], tables)) == [(1, [2]), (2, [1]), (3, [3])]
+
+@pytest.mark.parametrize('policy, expected', [
+    ('fifo', []),                 # the party at the head waits, so does everyone behind it
+    ('best_fit', [(2, [1])]),     # later parties that fit are seated around it
+    ('backfill', [(2, [1])]),
+])
+def test_policies_when_the_head_of_the_queue_does_not_fit(policy, expected):
+    plan = plan_allocations([party(1, 4), party(2, 2)], [table(1, 2)], policy=policy, max_combined_tables=1)
+    assert seated(plan) == expected
+
+def test_best_fit_skips_at_most_skip_ahead_parties():
+    queue = [party(1, 4), party(2, 4), party(3, 2)]
+    assert seated(plan_allocations(queue, [table(1, 2)], skip_ahead=1, max_combined_tables=1)) == []
+    assert seated(plan_allocations(queue, [table(1, 2)], skip_ahead=2, max_combined_tables=1)) == [(3, [1])]
+
+def test_backfill_only_seats_small_parties_once_someone_waits():
+    queue = [party(1, 6), party(2, 4), party(3, 2)]
+    tables = [table(1, 4), table(2, 2)]
+    assert seated(plan_allocations(queue, tables, policy='backfill', backfill_max=2, max_combined_tables=1)) == [(3, [2])]
+    assert seated(plan_allocations(queue, tables, policy='best_fit', max_combined_tables=1)) == [(2, [1]), (3, [2])]
+
+def test_large_party_gets_neighbouring_tables():
+    tables = [table(1, 4), table(2, 2), table(3, 4), table(4, 4)]
+    plan = plan_allocations([party(1, 8)], tables)
+    assert seated(plan) == [(1, [3, 4])]
+
+def test_no_table_is_handed_out_twice():
+    tables = [table(1, 4), table(2, 4)]
+    plan = plan_allocations([party(i, 2) for i in range(1, 5)], tables)
+    assert seated(plan) == [(1, [1]), (2, [2])]
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        plan_allocations([], [], policy='random')
+
+def test_a_round_commits_once_and_reports_its_seatings(connect):
+    conn, _ = connect()
+    with conn:
+        conn.executemany("INSERT INTO users (name, people_count, timestamp) VALUES (?, ?, datetime('now'))",
+                         [(f"Party {i}", 2) for i in range(5)])
+    conn.close()
+    statements = []
+
+    def traced():
+        conn, db_type = connect()
+        conn.set_trace_callback(statements.append)
+        return conn, db_type
+
+    changes = []
+    allocator = AutoAllocator(traced, SettingsStore(connect), on_change=changes.append)
+    seated = allocator.run_once()
+    assert len(seated) == 5
+    assert changes == [seated]
+    assert sum(sql == "COMMIT" for sql in statements) == 1
@@ -0,0 +1,58 @@
+import datetime
+
+def add_party(connect, name, people_count=2):
+    conn, _ = connect()
+    with conn:
+        customer_id = conn.execute("INSERT INTO users (name, people_count, timestamp) VALUES (?, ?, ?) RETURNING id",
+                                   (name, people_count, datetime.datetime.now())).fetchone()['id']
+    conn.close()
+    return customer_id
+
+def test_seat_manually_rejects_bad_table_ids(admin, connect):
+    customer_id = add_party(connect, "Ann")
+    for table_ids in (["x"], "10", [None]):
+        response = admin.post('/seat_manually', json={'customer_id': customer_id, 'table_ids': table_ids})
+        assert response.status_code == 400
+        assert response.get_json()['status'] == 'error'
+    response = admin.post('/seat_manually', json={'customer_id': customer_id, 'table_ids': ["10"]})
+    assert response.get_json()['status'] == 'success'
+
+def test_free_table_keeps_the_table_if_the_departure_fails(connect, monkeypatch):
+    import app_complete
+    from seating import seat_party
+    conn, db_type = connect()
+    history_id = seat_party(conn, db_type, add_party(connect, "Ann"), [10])['history_id']
+    conn.close()
+
+    def fail(*args):
+        raise RuntimeError("lost the connection")
+
+    monkeypatch.setattr(app_complete, 'record_departure', fail)
+    client = app_complete.app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    assert client.post('/free_table', data={'table_id': 10}).status_code == 500
+    conn, _ = connect()
+    row = conn.execute("SELECT status, history_id FROM tables WHERE id = 10").fetchone()
+    conn.close()
+    assert tuple(row) == ('occupied', history_id)
+
+def test_update_table_order_rejects_malformed_moves(admin):
+    for data in ({'moves': [{'table_id': 'abc'}]}, {'order': [1, 'x']}):
+        response = admin.post('/update_table_order', json=data)
+        assert response.status_code == 400
+        assert response.get_json()['status'] == 'error'
+    response = admin.post('/update_table_order', json={'moves': [{'table_id': 5, 'after_id': 1}]})
+    assert response.get_json()['display_orders'] == {'5': 512}
+
+def test_auto_seating_notifies_dashboard_streams(admin, connect):
+    import queue
+    import app as app_module
+    add_party(connect, "Ann")
+    updates = queue.Queue()
+    app_module.subscribers.append(updates)
+    try:
+        assert len(admin.post('/run_auto_seat').get_json()['seated']) == 1
+        assert updates.get_nowait() == "update"
+    finally:
+        app_module.subscribers.remove(updates)
@@ -0,0 +1,107 @@
+import pytest
+
+from batch_operations import BatchRolledBack, apply_operations
+from database import transaction
+from sqlite_writer import SQLiteWriter
+
+def run(connect, operations, is_admin=True, atomic=False):
+    conn, db_type = connect()
+    try:
+        with transaction(conn, db_type):
+            return apply_operations(conn, db_type, operations, is_admin, atomic)
+    finally:
+        conn.close()
+
+def query(connect, sql):
+    conn, _ = connect()
+    try:
+        return [tuple(row) for row in conn.execute(sql)]
+    finally:
+        conn.close()
+
+def test_one_result_per_item(connect):
+    results = run(connect, [
+        {'op': 'add_customer', 'name': 'ann', 'people_count': 2},
+        {'op': 'block_table', 'table_id': 1},
+        {'op': 'free_table', 'table_id': 1},
+        {'op': 'free_table', 'table_id': 9999},
+        {'op': 'nope'},
+        {'op': 'remove_customer', 'customer_id': 9999},
+    ])
+    assert [(r['index'], r['op'], r['status']) for r in results] == [
+        (0, 'add_customer', 'ok'),
+        (1, 'block_table', 'ok'),
+        (2, 'free_table', 'ok'),
+        (3, 'free_table', 'not_found'),
+        (4, 'nope', 'invalid'),
+        (5, 'remove_customer', 'not_found'),
+    ]
+    assert query(connect, "SELECT name FROM users") == [('Ann',)]
+    assert query(connect, "SELECT status, version FROM tables WHERE id = 1") == [('free', 2)]
+
+def test_waiters_cannot_change_the_queue(connect):
+    results = run(connect, [{'op': 'add_customer', 'name': 'ann', 'people_count': 2}, {'op': 'block_table', 'table_id': 1}],
+                  is_admin=False)
+    assert [r['status'] for r in results] == ['forbidden', 'ok']
+    assert query(connect, "SELECT COUNT(*) FROM users") == [(0,)]
+
+def test_database_error_fails_only_its_item(connect):
+    results = run(connect, [
+        {'op': 'add_customer', 'name': 'ann', 'people_count': 2, 'phone_number': '9999999999'},
+        {'op': 'add_customer', 'name': 'bob', 'people_count': 2, 'phone_number': '9999999999'},
+        {'op': 'block_table', 'table_id': 2},
+    ])
+    assert [r['status'] for r in results] == ['ok', 'invalid', 'ok']
+    assert 'UNIQUE' in results[1]['message']
+    assert query(connect, "SELECT name FROM users") == [('Ann',)]
+    assert query(connect, "SELECT status FROM tables WHERE id = 2") == [('blocked',)]
+
+def test_atomic_batch_rolls_back_on_first_failure(connect):
+    with pytest.raises(BatchRolledBack) as rolled_back:
+        run(connect, [
+            {'op': 'block_table', 'table_id': 1},
+            {'op': 'add_customer', 'name': 'ann', 'people_count': 2, 'phone_number': '9999999999'},
+            {'op': 'add_customer', 'name': 'bob', 'people_count': 2, 'phone_number': '9999999999'},
+            {'op': 'block_table', 'table_id': 2},
+        ], atomic=True)
+    assert [r['status'] for r in rolled_back.value.results] == ['ok', 'ok', 'invalid']
+    assert query(connect, "SELECT COUNT(*) FROM users") == [(0,)]
+    assert query(connect, "SELECT COUNT(*) FROM tables WHERE status = 'blocked'") == [(0,)]
+
+def test_batch_through_the_single_writer(connect):
+    writer = SQLiteWriter()
+    try:
+        results = writer.submit(lambda conn: apply_operations(conn, 'sqlite', [
+            {'op': 'add_customer', 'name': 'ann', 'people_count': 2, 'phone_number': '9999999999'},
+            {'op': 'add_customer', 'name': 'bob', 'people_count': 2, 'phone_number': '9999999999'},
+        ], True))
+        assert [r['status'] for r in results] == ['ok', 'invalid']
+        with pytest.raises(BatchRolledBack):
+            writer.submit(lambda conn: apply_operations(conn, 'sqlite', [
+                {'op': 'block_table', 'table_id': 1}, {'op': 'free_table', 'table_id': 9999}], True, atomic=True))
+    finally:
+        writer.stop()
+    assert query(connect, "SELECT name FROM users") == [('Ann',)]
+    assert query(connect, "SELECT COUNT(*) FROM tables WHERE status = 'blocked'") == [(0,)]
+
+def test_malformed_fields_fail_only_their_item(connect):
+    results = run(connect, [
+        {'op': 'add_customer', 'name': 5, 'people_count': 2},
+        {'op': 'add_customer', 'name': 'ann', 'people_count': float('inf')},
+        {'op': 'block_table', 'table_id': 3},
+    ])
+    assert [r['status'] for r in results] == ['invalid', 'invalid', 'ok']
+    assert query(connect, "SELECT COUNT(*) FROM users") == [(0,)]
+
+def test_conversion_error_rolls_back_its_item(connect, monkeypatch):
+    import batch_operations
+
+    def half_done(conn, cursor, db_type, item, now):
+        cursor.execute("UPDATE tables SET status = 'blocked' WHERE id = 4")
+        return {'status': 'ok', 'people_count': int(item['people_count'])}
+
+    monkeypatch.setitem(batch_operations.OPERATION_HANDLERS, 'add_customer', half_done)
+    results = run(connect, [{'op': 'add_customer', 'people_count': 'two'}, {'op': 'block_table', 'table_id': 5}])
+    assert [r['status'] for r in results] == ['invalid', 'ok']
+    assert "invalid literal for int()" in results[0]['message']
+    assert query(connect, "SELECT id FROM tables WHERE status = 'blocked'") == [(5,)]
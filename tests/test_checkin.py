@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from checkin import CheckInWriter
+
+def queued(connect):
+    conn, _ = connect()
+    try:
+        return [tuple(row) for row in conn.execute("SELECT id, name, phone_number FROM users ORDER BY timestamp, id")]
+    finally:
+        conn.close()
+
+def add_concurrently(writer, parties):
+    results = [None] * len(parties)
+    barrier = threading.Barrier(len(parties))
+
+    def add(index, party):
+        barrier.wait()
+        try:
+            results[index] = writer.add(*party)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=add, args=(index, party)) for index, party in enumerate(parties)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_ids_follow_arrival_order(connect):
+    writer = CheckInWriter(connect, window_ms=0)
+    ids = [writer.add(f"Guest {i}", 2) for i in range(3)]
+    assert ids == sorted(ids)
+    assert [row[0] for row in queued(connect)] == ids
+
+def test_concurrent_check_ins_share_commits(connect):
+    writer = CheckInWriter(connect, window_ms=20)
+    results = add_concurrently(writer, [(f"Guest {i}", 2) for i in range(8)])
+    assert all(isinstance(result, int) for result in results)
+    assert len(set(results)) == 8
+    assert writer.check_ins == 8
+    assert writer.groups < 8
+
+def test_bad_row_fails_only_its_caller(connect):
+    writer = CheckInWriter(connect, window_ms=0)
+    writer.add("First", 2, "+919999999999")
+
+    writer = CheckInWriter(connect, window_ms=50)
+    parties = [(f"Guest {i}", 2, f"+91000000000{i}") for i in range(7)] + [("Repeat", 2, "+919999999999")]
+    results = add_concurrently(writer, parties)
+
+    assert writer.groups < len(parties)
+    assert all(isinstance(result, int) for result in results[:7])
+    assert isinstance(results[7], Exception)
+    assert sorted(row[1] for row in queued(connect)) == sorted(["First"] + [f"Guest {i}" for i in range(7)])
+
+def test_single_failure_is_raised(connect):
+    writer = CheckInWriter(connect, window_ms=0)
+    writer.add("First", 2, "+919999999999")
+    with pytest.raises(Exception, match="UNIQUE"):
+        writer.add("Repeat", 2, "+919999999999")
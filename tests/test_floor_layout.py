@@ -0,0 +1,97 @@
+import pytest
+
+import floor_layout
+from floor_layout import RANK_GAP, floor_version, move_tables, parse_moves, rebalance_order, reorder_tables
+
+def traced(connect, statements):
+    conn, db_type = connect()
+    conn.set_trace_callback(statements.append)
+    return conn, db_type
+
+def order(connect):
+    conn, _ = connect()
+    try:
+        return [(row['id'], row['display_order']) for row in conn.execute("SELECT id, display_order FROM tables ORDER BY display_order, id")]
+    finally:
+        conn.close()
+
+def ids(connect):
+    return [table_id for table_id, _ in order(connect)]
+
+def move(connect, table_id, after_id=None, before_id=None):
+    conn, db_type = connect()
+    try:
+        return move_tables(conn, db_type, [{'table_id': table_id, 'after_id': after_id, 'before_id': before_id}])
+    finally:
+        conn.close()
+
+def test_move_takes_the_midpoint_of_its_new_neighbours(connect):
+    statements = []
+    conn, db_type = traced(connect, statements)
+    keys, _ = move_tables(conn, db_type, [{'table_id': 5, 'after_id': 1, 'before_id': 2}])
+    conn.close()
+    assert keys == {5: RANK_GAP // 2}
+    assert ids(connect)[:4] == [1, 5, 2, 3]
+    # Only the moved row is rewritten
+    assert sum(sql.startswith("UPDATE tables") for sql in statements) == 1
+
+def test_the_far_neighbour_comes_from_the_database(connect):
+    # Dropped "before T2" with no after_id: the table in front of T2 is looked up
+    assert move(connect, 5, before_id=2)[0] == {5: RANK_GAP // 2}
+
+def test_move_to_the_head_and_the_tail(connect):
+    assert move(connect, 5, before_id=1)[0] == {5: -RANK_GAP}
+    last_id, last_key = order(connect)[-1]
+    assert move(connect, 6, after_id=last_id)[0] == {6: last_key + RANK_GAP}
+    assert ids(connect)[0] == 5 and ids(connect)[-1] == 6
+
+def test_a_gap_that_runs_out_respreads_the_floor(connect):
+    statements = []
+    conn, db_type = traced(connect, statements)
+    # Each move halves the gap behind T1; 1024 runs out after ten of them
+    moved = list(range(20, 32))
+    for table_id in moved:
+        move_tables(conn, db_type, [{'table_id': table_id, 'after_id': 1}])
+    conn.close()
+    assert sum("ROW_NUMBER()" in sql for sql in statements) == 1
+    assert ids(connect)[:len(moved) + 2] == [1] + moved[::-1] + [2]
+    keys = [key for _, key in order(connect)]
+    assert keys == sorted(set(keys))
+
+def test_rebalance_keeps_the_order(connect):
+    conn, db_type = connect()
+    with conn:
+        conn.execute("UPDATE tables SET display_order = 46 - id")
+        rebalance_order(conn.cursor())
+    conn.close()
+    assert order(connect)[:3] == [(46, 0), (45, RANK_GAP), (44, 2 * RANK_GAP)]
+
+def test_reorder_is_one_bulk_update(connect):
+    statements = []
+    conn, db_type = traced(connect, statements)
+    new_order = list(range(46, 0, -1))
+    reorder_tables(conn, db_type, new_order)
+    conn.close()
+    assert sum(sql.startswith("WITH ordered") for sql in statements) == 1
+    assert order(connect) == [(table_id, index * RANK_GAP) for index, table_id in enumerate(new_order)]
+
+def test_layout_changes_bump_the_floor_version(connect):
+    conn, db_type = connect()
+    start = floor_version(conn.cursor())
+    _, version = move_tables(conn, db_type, [{'table_id': 5, 'after_id': 1}])
+    assert version == start + 1
+    assert reorder_tables(conn, db_type, [2, 1]) == start + 2
+    table, version = floor_layout.add_table(conn, db_type, 4)
+    assert version == start + 3
+    assert floor_layout.delete_table(conn, db_type, table['id'])[1] == start + 4
+    # Nothing moved: no bump
+    assert move_tables(conn, db_type, [{'table_id': 999, 'after_id': 1}]) == ({}, start + 4)
+    conn.close()
+
+def test_parse_moves():
+    assert parse_moves([{'table_id': '5', 'after_id': '', 'before_id': 2}]) == [{'table_id': 5, 'after_id': None, 'before_id': 2}]
+
+@pytest.mark.parametrize('moves', [[{'table_id': 'abc'}], [{'after_id': 1}], ['5'], {'table_id': 5}])
+def test_parse_moves_rejects_malformed_moves(moves):
+    with pytest.raises(ValueError):
+        parse_moves(moves)
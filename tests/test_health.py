@@ -0,0 +1,52 @@
+import pytest
+
+from database import PoolTimeout
+from health import CircuitBreaker, HealthMonitor, http_status
+
+def test_require_database_waits_for_a_probe_result(connect):
+    health = HealthMonitor(lambda wait: connect())
+    health._probing = True  # another probe is still running
+    with pytest.raises(RuntimeError):
+        health.require_database()
+    health._probing = False
+    assert health.require_database() is not None
+
+def test_require_database_is_not_ready_while_every_connection_is_busy():
+    def busy(wait):
+        raise PoolTimeout("pool exhausted")
+    with pytest.raises(RuntimeError):
+        HealthMonitor(busy).require_database()
+
+def test_health_status_code_follows_the_circuit(connect):
+    broken = True
+
+    def flaky(wait):
+        if broken:
+            raise RuntimeError("connection refused")
+        return connect()
+
+    health = HealthMonitor(flaky, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=0))
+    assert http_status(health.snapshot()) == 200  # nothing probed yet
+    health.probe()
+    health.probe()
+    assert health.snapshot()['status'] == 'unhealthy'
+    assert http_status(health.snapshot()) == 503
+    broken = False
+    health.probe()
+    assert health.snapshot()['status'] == 'healthy'
+    assert http_status(health.snapshot()) == 200
+
+def test_deep_probe_only_reports_probes_that_ran(connect):
+    health = HealthMonitor(lambda wait: connect(), deep_min_interval=0)
+    assert health.deep_probe() == (True, True)
+    health._probing = True
+    assert health.deep_probe() == (False, None)
+    health._probing = False
+    health.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    health.breaker.record_failure()
+    assert health.deep_probe() == (False, None)
+
+def test_deep_probe_with_every_connection_busy():
+    def busy(wait):
+        raise PoolTimeout("pool exhausted")
+    assert HealthMonitor(busy, deep_min_interval=0).deep_probe() == (False, None)
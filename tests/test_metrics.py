@@ -0,0 +1,85 @@
+import threading
+
+from flask import Flask
+
+import metrics as metrics_module
+from metrics import Metrics
+
+def lines(m, prefix):
+    return [line for line in m.render().splitlines() if line.startswith(prefix)]
+
+def request_in_thread(m, endpoint, status=200):
+    def run():
+        m.begin_request(endpoint)
+        m.end_request('GET', status)
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+def test_requests_from_many_threads_are_merged():
+    m = Metrics()
+    for _ in range(5):
+        request_in_thread(m, 'dashboard')
+    request_in_thread(m, 'dashboard', 500)
+    assert lines(m, 'restroflow_http_requests_total{') == [
+        'restroflow_http_requests_total{endpoint="dashboard",method="GET",status="200"} 5',
+        'restroflow_http_requests_total{endpoint="dashboard",method="GET",status="500"} 1',
+    ]
+
+def test_exited_threads_are_folded_into_the_retired_stats(monkeypatch):
+    monkeypatch.setattr(metrics_module, 'MAX_LIVE_THREADS', 2)
+    m = Metrics()
+    for _ in range(10):
+        request_in_thread(m, 'seat')
+    assert len(m._threads) <= 2
+    assert sum(m._retired.requests.values()) >= 8
+    assert lines(m, 'restroflow_http_requests_total{') == ['restroflow_http_requests_total{endpoint="seat",method="GET",status="200"} 10']
+
+def test_histogram_buckets_are_cumulative():
+    m = Metrics()
+    m.begin_request('batch')
+    for _ in range(3):
+        m._observe_query("SELECT 1", 0.002)
+    assert m.request_db_usage() == (3, 0.006)
+    m.end_request('POST', 200)
+    assert lines(m, 'restroflow_http_request_db_queries') == [
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="0"} 0',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="1"} 0',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="2"} 0',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="5"} 1',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="10"} 1',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="20"} 1',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="50"} 1',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="100"} 1',
+        'restroflow_http_request_db_queries_bucket{endpoint="batch",le="+Inf"} 1',
+        'restroflow_http_request_db_queries_sum{endpoint="batch"} 3.000000',
+        'restroflow_http_request_db_queries_count{endpoint="batch"} 1',
+    ]
+
+def test_statements_outside_a_request_count_as_background():
+    m = Metrics()
+    m._observe_query("SELECT 1", 0.5)
+    assert lines(m, 'restroflow_db_background_queries_total ') == ['restroflow_db_background_queries_total 1']
+
+def test_label_values_are_escaped():
+    m = Metrics()
+    m.gauge('restroflow_test', 'Test gauge.', lambda: {(('name', 'a"b\\c\nd'),): 1})
+    m.gauge('restroflow_skipped', 'Not reported.', lambda: None)
+    assert lines(m, 'restroflow_test{') == ['restroflow_test{name="a\\"b\\\\c\\nd"} 1']
+    assert not lines(m, 'restroflow_skipped')
+
+def test_metrics_route_and_token(monkeypatch):
+    app = Flask(__name__)
+    m = Metrics()
+    m.instrument(app)
+    app.add_url_rule('/ping', 'ping', lambda: 'pong')
+    client = app.test_client()
+    client.get('/ping')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert 'restroflow_http_requests_total{endpoint="ping",method="GET",status="200"} 1' in response.get_data(as_text=True)
+
+    monkeypatch.setenv('METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
@@ -0,0 +1,52 @@
+import threading
+
+from database import DEFAULT_FLOOR, connect_sqlite
+from migrations import LATEST_VERSION, MIGRATIONS, migrate, seed_tables
+
+def schema(conn):
+    return sorted(tuple(row) for row in conn.execute("SELECT type, name, sql FROM sqlite_master"))
+
+def test_migrate_applies_every_migration_once(tmp_path):
+    conn = connect_sqlite(str(tmp_path / "users.db"))
+    assert migrate(conn, 'sqlite', verbose=False) == [version for version, *_ in MIGRATIONS]
+    before = schema(conn)
+    assert migrate(conn, 'sqlite', verbose=False) == []
+    assert schema(conn) == before
+    assert [row['version'] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")] == list(range(1, LATEST_VERSION + 1))
+    conn.close()
+
+def test_migrations_can_be_rerun_on_a_migrated_schema(tmp_path):
+    # A crash after a migration's DDL but before it was recorded must not wedge the next boot
+    conn = connect_sqlite(str(tmp_path / "users.db"))
+    migrate(conn, 'sqlite', verbose=False)
+    seed_tables(conn, 'sqlite', DEFAULT_FLOOR)
+    before = schema(conn)
+    with conn:
+        conn.execute("DELETE FROM schema_version")
+    assert migrate(conn, 'sqlite', verbose=False) == [version for version, *_ in MIGRATIONS]
+    assert schema(conn) == before
+    conn.close()
+
+def test_concurrent_workers_apply_each_migration_once(tmp_path):
+    path = str(tmp_path / "users.db")
+    applied = []
+
+    def boot():
+        conn = connect_sqlite(path, timeout=10, check_same_thread=False)
+        applied.extend(migrate(conn, 'sqlite', verbose=False))
+        conn.close()
+
+    workers = [threading.Thread(target=boot) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(applied) == [version for version, *_ in MIGRATIONS]
+
+def test_seed_tables_only_seeds_an_empty_floor(tmp_path):
+    conn = connect_sqlite(str(tmp_path / "users.db"))
+    migrate(conn, 'sqlite', verbose=False)
+    assert seed_tables(conn, 'sqlite', DEFAULT_FLOOR)
+    assert not seed_tables(conn, 'sqlite', DEFAULT_FLOOR)
+    assert conn.execute("SELECT COUNT(*) FROM tables").fetchone()[0] == len(DEFAULT_FLOOR)
+    conn.close()
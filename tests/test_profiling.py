@@ -0,0 +1,84 @@
+import os
+import time
+
+import pytest
+from flask import Flask
+
+import profiling
+from profiling import ProfilerMiddleware, StackSampler
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app, directory=str(tmp_path), keep=2)
+
+    @app.route('/work')
+    def work():
+        time.sleep(0.05)
+        return 'done'
+
+    return app
+
+def client(app, admin):
+    client = app.test_client()
+    if admin:
+        with client.session_transaction() as s:
+            s['is_admin'] = True
+    return client
+
+def test_requests_without_the_trigger_or_from_non_admins_are_not_profiled(app, tmp_path):
+    for c, headers in ((client(app, True), {}), (client(app, False), {'X-Profile': 'cprofile'}),
+                       (client(app, True), {'X-Profile': 'bogus'})):
+        response = c.get('/work', headers=headers)
+        assert response.get_data(as_text=True) == 'done'
+        assert 'X-Profile-File' not in response.headers
+    assert os.listdir(tmp_path) == []
+
+def test_cprofile_writes_a_pstats_file(app, tmp_path):
+    response = client(app, True).get('/work', headers={'X-Profile': 'cprofile'})
+    assert response.get_data(as_text=True) == 'done'
+    name = response.headers['X-Profile-File']
+    assert name.endswith('-work.pstats') and os.path.exists(tmp_path / name)
+    assert response.headers['Content-Length'] == '4'
+
+def test_text_output_replaces_the_body(app):
+    response = client(app, True).get('/work?_profile=cprofile&_profile_output=text')
+    assert response.mimetype == 'text/plain'
+    assert 'function calls' in response.get_data(as_text=True)
+
+def test_sampling_writes_folded_stacks(app, tmp_path):
+    response = client(app, True).get('/work', headers={'X-Profile': 'sample', 'X-Profile-Output': 'text'})
+    stacks = response.get_data(as_text=True)
+    assert 'test_profiling.py:work' in stacks
+    assert response.headers['X-Profile-File'].endswith('.collapsed')
+
+def test_only_the_newest_profiles_are_kept(app, tmp_path):
+    c = client(app, True)
+    for _ in range(4):
+        c.get('/work', headers={'X-Profile': 'cprofile'})
+        time.sleep(0.002)
+    assert len(os.listdir(tmp_path)) == 2
+
+def test_counts_can_be_read_while_sampling():
+    sampler = StackSampler(1000).start()
+    try:
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            sampler.snapshot()
+        assert sampler.snapshot()
+        assert sampler.reset() and sampler.samples < 50
+    finally:
+        sampler.stop()
+
+def test_continuous_profile_route():
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    sampler = profiling.install(app, sample_hz=500)
+    try:
+        time.sleep(0.05)
+        assert app.test_client().get('/api/profile/continuous').status_code == 401
+        response = client(app, True).get('/api/profile/continuous?reset=1')
+        assert response.status_code == 200 and response.get_data(as_text=True)
+    finally:
+        sampler.stop()
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.mark.parametrize('app, single_writer', [('app', False), ('app', True), ('app_complete', False)])
+def test_routes_stay_within_budget(app, single_writer, tmp_path):
+    # Each app in its own interpreter, as in production: both install process-wide hooks and threads
+    env = dict(os.environ, DATABASE_URL='', SQLITE_SINGLE_WRITER='1' if single_writer else '0')
+    completed = subprocess.run([sys.executable, os.path.join(REPO, 'benchmarks', 'query_budget.py'), '--app', app],
+                               cwd=tmp_path, env=env, capture_output=True, text=True, timeout=300)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
@@ -0,0 +1,81 @@
+import pytest
+from flask import Flask
+
+import database
+import metrics as metrics_module
+from database import QueryStats, connect_sqlite, normalize_sql, redact
+
+@pytest.fixture
+def stats(monkeypatch, tmp_path):
+    """A fresh QueryStats in place of the process-wide one"""
+    monkeypatch.chdir(tmp_path)
+    stats = QueryStats(slow_ms=float('inf'))
+    monkeypatch.setattr(database, 'query_stats', stats)
+    monkeypatch.setattr(metrics_module, 'query_stats', stats)
+    return stats
+
+@pytest.mark.parametrize('sql, shape', [
+    ("SELECT * FROM users WHERE name = 'O''Brien' AND id = 42", "SELECT * FROM users WHERE name = ? AND id = ?"),
+    ("SELECT  *\n  FROM tables WHERE capacity >= 4.5", "SELECT * FROM tables WHERE capacity >= ?"),
+    ("SELECT * FROM tables WHERE id = %s OR id = %(other)s", "SELECT * FROM tables WHERE id = ? OR id = ?"),
+    ("SELECT * FROM tables WHERE id IN (?, ?, ?)", "SELECT * FROM tables WHERE id IN (?, ...)"),
+    ("INSERT INTO action_log (a, b) VALUES (?, ?), (?, ?), (?, ?)", "INSERT INTO action_log (a, b) VALUES (?, ...), ..."),
+    ("SELECT value FROM counters WHERE name = 'table2'", "SELECT value FROM counters WHERE name = ?"),
+])
+def test_normalize_sql(sql, shape):
+    assert normalize_sql(sql) == shape
+
+def test_redact_keeps_only_types():
+    assert redact(("Ann", 4, None)) == "(str, int, NoneType)"
+    assert redact({'name': "Ann", 'phone': "555"}) == "{name: str, phone: str}"
+    assert redact([("Ann", 4), ("Bob", 2)]) == "<2 rows>"
+    assert redact(None) == "()"
+
+def test_slow_queries_are_logged_without_values(capsys):
+    stats = QueryStats(slow_ms=100)
+    stats.record("SELECT * FROM users WHERE phone_number = '555-0100'", ("555-0100",), 0.05, 1)
+    assert capsys.readouterr().out == ""
+    stats.record("SELECT * FROM users WHERE phone_number = ?", ("555-0100",), 0.2, 1)
+    logged = capsys.readouterr().out
+    assert "Slow query (200.0ms): SELECT * FROM users WHERE phone_number = ? params=(str)" in logged
+    assert "555" not in logged
+
+def test_statements_are_counted_by_shape(stats):
+    conn = connect_sqlite()
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO t (name) VALUES (?)", [("a",), ("b",), ("c",)])
+    for table_id in (1, 2, 3):
+        conn.execute(f"SELECT name FROM t WHERE id = {table_id}").fetchall()
+    conn.close()
+    top = {row['statement']: row for row in stats.top()}
+    assert top["SELECT name FROM t WHERE id = ?"]['calls'] == 3
+    assert top["SELECT name FROM t WHERE id = ?"]['rows'] == 3
+    assert top["INSERT INTO t (name) VALUES (?)"]['rows'] == 3
+
+def test_request_summary(stats):
+    conn = connect_sqlite()
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    stats.begin_request()
+    for _ in range(3):
+        conn.execute("SELECT id FROM t").fetchall()
+    conn.execute("INSERT INTO t DEFAULT VALUES")
+    summary = stats.end_request()
+    conn.close()
+    assert summary['queries'] == 4 and summary['rows'] == 1
+    assert summary['repeated'] == {"SELECT id FROM t": 3}
+    assert stats.end_request() is None
+
+def test_server_timing_header(stats):
+    app = Flask(__name__)
+    metrics_module.Metrics().instrument(app)
+
+    @app.route('/count')
+    def count():
+        conn = connect_sqlite()
+        conn.execute("SELECT 1").fetchall()
+        conn.execute("SELECT 2").fetchall()
+        conn.close()
+        return 'ok'
+
+    header = app.test_client().get('/count').headers['Server-Timing']
+    assert header.startswith('db;dur=') and header.endswith('desc="2 queries, 2 rows"')
@@ -0,0 +1,120 @@
+import datetime
+
+from database import transaction
+from seating import record_departure, seat_parties, seat_party
+from table_state import CONFLICT, NOT_FOUND, OK, transition_table
+
+def add_party(connect, name, people_count=2):
+    conn, _ = connect()
+    with conn:
+        customer_id = conn.execute("INSERT INTO users (name, people_count, timestamp) VALUES (?, ?, ?) RETURNING id",
+                                   (name, people_count, datetime.datetime.now())).fetchone()['id']
+    conn.close()
+    return customer_id
+
+def free(connect, table_id):
+    conn, db_type = connect()
+    try:
+        with transaction(conn, db_type):
+            result = transition_table(conn, db_type, table_id, 'free')
+            if result['status'] == OK:
+                record_departure(conn.cursor(), db_type, table_id, datetime.datetime.now())
+        return result['status']
+    finally:
+        conn.close()
+
+def departed(connect, history_id):
+    conn, _ = connect()
+    try:
+        return conn.execute("SELECT departed_timestamp FROM customer_history WHERE id = ?", (history_id,)).fetchone()[0] is not None
+    finally:
+        conn.close()
+
+def seat(connect, customer_id, table_ids, **versions):
+    conn, db_type = connect()
+    try:
+        return seat_party(conn, db_type, customer_id, table_ids, **versions)
+    finally:
+        conn.close()
+
+def test_seating_links_the_tables_to_the_history_row(connect):
+    result = seat(connect, add_party(connect, "Ann", 6), [10, 11])
+    assert result['status'] == OK
+    assert [t['id'] for t in result['tables']] == [10, 11]
+    conn, _ = connect()
+    rows = conn.execute("SELECT status, history_id FROM tables WHERE id IN (10, 11)").fetchall()
+    conn.close()
+    assert [tuple(row) for row in rows] == [('occupied', result['history_id'])] * 2
+
+def floor_state(connect):
+    conn, _ = connect()
+    try:
+        tables = [tuple(row) for row in conn.execute("SELECT id, status, version, history_id FROM tables ORDER BY id")]
+        queue = [row['id'] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+        history = conn.execute("SELECT COUNT(*) FROM customer_history").fetchone()[0]
+        return tables, queue, history
+    finally:
+        conn.close()
+
+def test_party_that_is_gone_is_not_found(connect):
+    customer_id = add_party(connect, "Ann")
+    assert seat(connect, customer_id, [1])['status'] == OK
+    before = floor_state(connect)
+    assert seat(connect, customer_id, [2]) == {'status': NOT_FOUND, 'tables': [], 'history_id': None}
+    assert floor_state(connect) == before
+
+def test_taken_table_is_a_conflict_and_changes_nothing(connect):
+    seat(connect, add_party(connect, "Ann"), [11])
+    customer_id = add_party(connect, "Bob", 6)
+    before = floor_state(connect)
+    # T10 is free but T11 is not: neither table is claimed and Bob stays queued
+    assert seat(connect, customer_id, [10, 11])['status'] == CONFLICT
+    assert floor_state(connect) == before
+
+def test_stale_versions_are_conflicts(connect):
+    customer_id = add_party(connect, "Ann")
+    assert seat(connect, customer_id, [1], table_versions={1: 5})['status'] == CONFLICT
+    assert seat(connect, customer_id, [1], customer_version=5)['status'] == CONFLICT
+    assert seat(connect, customer_id, [1], customer_version=0, table_versions={1: 0})['status'] == OK
+
+def test_combined_seating_departs_when_its_last_table_is_freed(connect):
+    history_id = seat(connect, add_party(connect, "Ann", 6), [10, 11])['history_id']
+    assert free(connect, 10) == OK
+    assert not departed(connect, history_id)
+    assert free(connect, 11) == OK
+    assert departed(connect, history_id)
+
+def test_departure_only_closes_its_own_party(connect):
+    # 'T1' is a prefix of 'T10'; the link is by id, not by name
+    first = seat(connect, add_party(connect, "Ann"), [1])['history_id']
+    second = seat(connect, add_party(connect, "Bob"), [10])['history_id']
+    free(connect, 1)
+    assert departed(connect, first)
+    assert not departed(connect, second)
+
+def test_migration_links_tables_seated_before_the_link(connect):
+    from migrations import link_open_history
+    conn, db_type = connect()
+    with conn:
+        old = conn.execute("INSERT INTO customer_history (name, arrival_timestamp, table_number) VALUES ('Old', ?, 'T1, T2')",
+                           (datetime.datetime.now(),)).lastrowid
+        newer = conn.execute("INSERT INTO customer_history (name, arrival_timestamp, table_number) VALUES ('New', ?, 'T1')",
+                             (datetime.datetime.now(),)).lastrowid
+        conn.execute("UPDATE tables SET status = 'occupied' WHERE table_number IN ('T1', 'T2', 'T10')")
+        link_open_history(conn.cursor(), db_type)
+    links = dict(tuple(row) for row in conn.execute("SELECT table_number, history_id FROM tables WHERE status = 'occupied'"))
+    conn.close()
+    assert links == {'T1': newer, 'T2': old, 'T10': None}
+
+def test_seat_parties_commits_once_and_skips_only_the_failed_party(connect):
+    ann, bob, cy = (add_party(connect, name) for name in ("Ann", "Bob", "Cy"))
+    statements = []
+    conn, db_type = connect()
+    conn.set_trace_callback(statements.append)
+    # Bob's table is taken by Ann first
+    results = seat_parties(conn, db_type, [(ann, [1], None, None), (bob, [1], None, None), (cy, [2], None, None)])
+    conn.close()
+    assert [result['status'] for result in results] == [OK, CONFLICT, OK]
+    assert sum(sql == "COMMIT" for sql in statements) == 1
+    tables, queue, history = floor_state(connect)
+    assert queue == [bob] and history == 2
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from database import connect_sqlite
+from settings_store import SETTINGS, SettingsStore, parse_value
+
+def connect_any_thread():
+    return connect_sqlite(timeout=10, check_same_thread=False), 'sqlite'
+
+def test_values_are_typed():
+    assert parse_value('auto_allocator_enabled', 'False') is False
+    assert parse_value('allocator_skip_ahead', '5') == 5
+    assert parse_value('allocator_skip_ahead', 'five') == SETTINGS['allocator_skip_ahead'][1]
+    assert parse_value('allocator_policy', None) == 'best_fit'
+
+def test_update_stores_and_returns_typed_values(connect):
+    store = SettingsStore(connect)
+    values = store.update(allocator_skip_ahead='7', auto_allocator_enabled=0)
+    assert values['allocator_skip_ahead'] == 7
+    assert values['auto_allocator_enabled'] is False
+    with pytest.raises(KeyError):
+        store.update(no_such_setting=1)
+    with pytest.raises(TypeError):
+        store.toggle('allocator_policy')
+
+def test_toggle_is_one_update(connect):
+    statements = []
+
+    def traced():
+        conn, db_type = connect()
+        conn.set_trace_callback(statements.append)
+        return conn, db_type
+
+    store = SettingsStore(traced)
+    assert store.toggle('auto_allocator_enabled') is False  # no row yet: flips the default
+    statements.clear()
+    assert store.toggle('auto_allocator_enabled') is True
+    assert sum(sql.startswith("UPDATE settings SET value = CASE") for sql in statements) == 1
+
+def test_concurrent_toggles_do_not_lose_flips(connect):
+    SettingsStore(connect).update(auto_allocator_enabled=True)
+    stores = [SettingsStore(connect_any_thread) for _ in range(2)]
+
+    def flip(store):
+        for _ in range(5):
+            store.toggle('auto_allocator_enabled')
+
+    threads = [threading.Thread(target=flip, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Ten flips in all: a read-then-write race would lose some of them
+    assert SettingsStore(connect).get('auto_allocator_enabled') is True
+
+def test_other_workers_reload_after_the_version_bump(connect):
+    writer = SettingsStore(connect)
+    reader = SettingsStore(connect, check_interval=0)
+    stale = SettingsStore(connect, check_interval=3600)
+    assert reader.get('allocator_policy') == stale.get('allocator_policy') == 'best_fit'
+    changes = []
+    reader.subscribe(changes.append)
+    writer.update(allocator_policy='fifo')
+    assert reader.get('allocator_policy') == 'fifo'
+    assert changes == [{'allocator_policy': 'fifo'}]
+    # Not checked again until its interval is up
+    assert stale.get('allocator_policy') == 'best_fit'
+
+def test_subscribers_hear_about_local_writes(connect):
+    store = SettingsStore(connect)
+    store.all()
+    changes = []
+    store.subscribe(changes.append)
+    store.update(allocator_backfill_max=4)
+    store.update(allocator_backfill_max=4)  # nothing changed: no second call
+    assert changes == [{'allocator_backfill_max': 4}]
+
+def test_writes_go_through_the_write_hook(connect):
+    calls = []
+
+    def write(apply):
+        calls.append(apply)
+        conn, db_type = connect()
+        try:
+            return apply(conn, db_type)
+        finally:
+            conn.close()
+
+    store = SettingsStore(connect, write=write)
+    store.update(allocator_policy='backfill')
+    store.toggle('auto_allocator_enabled')
+    assert len(calls) == 2
+    assert SettingsStore(connect).get('allocator_policy') == 'backfill'
@@ -0,0 +1,50 @@
+import pytest
+
+from simulation import main, parse_layout, parse_policy, run_scenarios, simulate
+
+# Two tables, 2 and 4 seats. E can never be seated; D needs both tables together.
+DAY = {'day': '2025-10-03', 'arrivals': [
+    {'name': 'A', 'people_count': 2, 'arrival': 0, 'dwell': 30},
+    {'name': 'B', 'people_count': 4, 'arrival': 0, 'dwell': 60},
+    {'name': 'E', 'people_count': 10, 'arrival': 1, 'dwell': 30},
+    {'name': 'D', 'people_count': 6, 'arrival': 5, 'dwell': 20},
+    {'name': 'C', 'people_count': 2, 'arrival': 10, 'dwell': 10},
+]}
+LAYOUT = '2x1+4x1'
+
+@pytest.mark.parametrize('policy, seated, never_seated, max_wait', [
+    ('fifo', 2, 3, 0.0),                 # E blocks the head of the queue all day
+    ('best_fit:skip_ahead=3', 4, 1, 55.0),
+    ('backfill:backfill_max=2', 3, 2, 20.0),  # once E waits, only parties of two are seated
+])
+def test_simulated_day(policy, seated, never_seated, max_wait):
+    result = simulate(DAY, parse_policy(policy), parse_layout(LAYOUT))
+    assert (result['seated'], result['never_seated'], result['max_wait_minutes']) == (seated, never_seated, max_wait)
+    assert result['parties'] == 5 and result['tables'] == 2
+
+def test_scenarios_run_in_parallel_match_a_serial_run():
+    policies = [parse_policy('fifo'), parse_policy('best_fit')]
+    layouts = [parse_layout(LAYOUT), parse_layout('2x2+6x1')]
+    assert run_scenarios([DAY], policies, layouts, workers=2) == run_scenarios([DAY], policies, layouts, workers=1)
+
+def test_parse_policy():
+    assert parse_policy('best_fit:skip_ahead=5')['skip_ahead'] == 5
+    with pytest.raises(ValueError, match="Unknown policy 'random'"):
+        parse_policy('random')
+    with pytest.raises(ValueError, match="Unknown policy option 'speed'"):
+        parse_policy('fifo:speed=2')
+    with pytest.raises(ValueError, match="needs a whole number"):
+        parse_policy('best_fit:skip_ahead=many')
+
+def test_parse_layout():
+    assert [t['capacity'] for t in parse_layout('2x2+6')['tables']] == [2, 2, 6]
+    current = parse_layout('current', [{'table_number': 'Patio 1', 'capacity': 4}])
+    assert current['tables'] == [{'table_number': 'Patio 1', 'capacity': 4, 'id': 1, 'display_order': 0}]
+    for spec in ('4xten', 'x3', '4x0', ''):
+        with pytest.raises(ValueError, match="Invalid layout"):
+            parse_layout(spec)
+
+def test_bad_specs_are_rejected_before_connecting(capsys):
+    with pytest.raises(SystemExit):
+        main(['--layout', '4xten'])
+    assert "Invalid layout '4xten'" in capsys.readouterr().err
@@ -0,0 +1,88 @@
+import datetime
+import sqlite3
+import threading
+
+import pytest
+
+from allocator import AutoAllocator
+from seating import seat_party
+from settings_store import SettingsStore
+from sqlite_writer import SQLiteWriter
+from table_state import CONFLICT, OK
+
+@pytest.fixture
+def writer(connect):
+    writer = SQLiteWriter()
+    yield writer
+    writer.stop()
+
+def write_session(writer):
+    return lambda apply: writer.submit(lambda conn: apply(conn, 'sqlite'))
+
+def add_parties(connect, *people_counts):
+    conn, _ = connect()
+    with conn:
+        now = datetime.datetime.now()
+        for index, people_count in enumerate(people_counts):
+            conn.execute("INSERT INTO users (name, people_count, timestamp) VALUES (?, ?, ?)",
+                         (f"Guest {index}", people_count, now + datetime.timedelta(seconds=index)))
+    ids = [row['id'] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+    conn.close()
+    return ids
+
+def test_failed_mutation_leaves_the_rest_of_the_batch(connect, writer):
+    def fail(conn):
+        conn.execute("INSERT INTO waiters (username, password_hash) VALUES ('b', 'x')")
+        raise RuntimeError("boom")
+
+    writer.submit(lambda conn: conn.execute("INSERT INTO waiters (username, password_hash) VALUES ('a', 'x')"))
+    with pytest.raises(RuntimeError):
+        writer.submit(fail)
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.submit(lambda conn: conn.execute("INSERT INTO waiters (username, password_hash) VALUES ('a', 'y')"))
+    with writer.reader() as conn:
+        assert [row['username'] for row in conn.execute("SELECT username FROM waiters")] == ['a']
+
+def test_transaction_blocks_inside_one_mutation_roll_back_alone(connect, writer):
+    first, second = add_parties(connect, 2, 2)
+
+    def seat_both(conn):
+        # The second party asks for the table the first one just took
+        return [seat_party(conn, 'sqlite', first, [1]), seat_party(conn, 'sqlite', second, [1, 2])]
+
+    results = writer.submit(seat_both)
+    assert [r['status'] for r in results] == [OK, CONFLICT]
+    with writer.reader() as conn:
+        assert [tuple(row) for row in conn.execute("SELECT id, status FROM tables WHERE id IN (1, 2)")] == [(1, 'occupied'), (2, 'free')]
+        assert [row['id'] for row in conn.execute("SELECT id FROM users")] == [second]
+
+def test_allocator_and_settings_write_through_the_writer(connect, writer):
+    add_parties(connect, *([2] * 12))
+    settings = SettingsStore(connect, write=write_session(writer))
+    allocator = AutoAllocator(connect, settings, write=write_session(writer))
+    settings.update(allocator_policy='fifo')
+    mutations = writer.mutations
+
+    errors = []
+
+    def add_waiters():
+        for index in range(9):
+            try:
+                writer.submit(lambda conn: conn.execute("INSERT INTO waiters (username, password_hash) VALUES (?, 'x')", (f"w{index}",)))
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=add_waiters)
+    thread.start()
+    seated = allocator.run_once(force=True)
+    thread.join()
+
+    assert not errors
+    assert settings.get('allocator_policy') == 'fifo'
+    assert writer.mutations == mutations + 1 + 9
+    with writer.reader() as conn:
+        occupied = conn.execute("SELECT COUNT(*) FROM tables WHERE status = 'occupied'").fetchone()[0]
+        waiting = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        waiters = conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+    assert len(seated) == occupied == 12 - waiting == 12
+    assert waiters == 9
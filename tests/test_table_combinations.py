@@ -0,0 +1,44 @@
+import json
+
+from table_combinations import best_combination, parse_adjacency, suggest_combinations
+
+def table(table_id, capacity, status='free'):
+    return {'id': table_id, 'table_number': f"T{table_id}", 'capacity': capacity, 'status': status, 'display_order': table_id}
+
+def ids(tables):
+    return [t['id'] for t in tables]
+
+def test_neighbouring_tables_that_fit_exactly():
+    floor = [table(1, 2), table(2, 4), table(3, 4), table(4, 6)]
+    best = suggest_combinations(floor, 8)[0]
+    assert ids(best['tables']) == [2, 3]
+    assert best['adjacent'] and best['wasted_seats'] == 0
+
+def test_an_occupied_table_breaks_a_run():
+    floor = [table(1, 4), table(2, 4, 'occupied'), table(3, 4)]
+    best = suggest_combinations(floor, 8)[0]
+    assert ids(best['tables']) == [1, 3]
+    assert not best['adjacent']
+
+def test_adjacency_graph_replaces_floor_order():
+    floor = [table(1, 4), table(2, 2), table(3, 4)]
+    adjacency = parse_adjacency(json.dumps({'T1': ['T3']}), floor)
+    best = suggest_combinations(floor, 8, adjacency=adjacency)[0]
+    assert ids(best['tables']) == [1, 3] and best['adjacent']
+
+def test_parse_adjacency_is_symmetric_and_ignores_unknown_tables():
+    floor = [table(1, 4), table(2, 4)]
+    assert parse_adjacency(json.dumps({'T1': ['T2', 'T99'], 'T99': ['T1']}), floor) == {1: {2}, 2: {1}}
+    assert parse_adjacency('', floor) is None
+
+def test_candidates_are_unique_and_limited():
+    floor = [table(i, 4) for i in range(1, 7)]
+    ranked = suggest_combinations(floor, 8, limit=3)
+    assert len(ranked) == 3
+    assert len({frozenset(ids(c['tables'])) for c in ranked}) == 3
+
+def test_party_that_cannot_be_seated():
+    floor = [table(1, 4), table(2, 4)]
+    assert best_combination(floor, 9) is None
+    assert best_combination(floor, 12, max_tables=2) is None
+    assert suggest_combinations(floor, 0) == []
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from database import connect_sqlite, table_sort_key
+from floor_layout import add_table, delete_table, rename_table
+from migrations import migrate, seed_tables
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect_sqlite(str(tmp_path / "users.db"))
+    migrate(conn, 'sqlite', verbose=False)
+    seed_tables(conn, 'sqlite', [(f"T{i}", 4) for i in range(1, 22)])
+    yield conn
+    conn.close()
+
+def table_id(conn, table_number):
+    return conn.execute("SELECT id FROM tables WHERE table_number = ?", (table_number,)).fetchone()['id']
+
+def test_numbers_are_not_reused_after_a_delete(conn):
+    delete_table(conn, 'sqlite', table_id(conn, 'T21'))
+    # Counting tables would hand out T21 again
+    assert add_table(conn, 'sqlite', 4)[0]['table_number'] == 'T22'
+    delete_table(conn, 'sqlite', table_id(conn, 'T22'))
+    assert add_table(conn, 'sqlite', 4)[0]['table_number'] == 'T23'
+
+def test_a_name_taken_by_hand_is_skipped(conn):
+    rename_table(conn, 'sqlite', table_id(conn, 'T5'), 'T22')
+    table, _ = add_table(conn, 'sqlite', 6)
+    assert (table['table_number'], table['capacity']) == ('T23', 6)
+    assert conn.execute("SELECT COUNT(*) FROM tables WHERE table_number = 'T22'").fetchone()[0] == 1
+
+def test_new_tables_go_to_the_end_of_the_floor(conn):
+    table, _ = add_table(conn, 'sqlite', 2)
+    last = conn.execute("SELECT id FROM tables ORDER BY display_order DESC LIMIT 1").fetchone()['id']
+    assert last == table['id']
+
+def test_sort_key_orders_numbers_naturally():
+    names = ['T10', 'Patio 10', 'T2', 'bar 1', 'Patio 2', 'T1', 'Patio 1A']
+    assert sorted(names, key=table_sort_key) == ['bar 1', 'Patio 1A', 'Patio 2', 'Patio 10', 'T1', 'T2', 'T10']
+    assert table_sort_key(' T2 ') == table_sort_key('t2')
+
+def test_rename_keeps_the_sort_key_in_step(conn):
+    table, version = rename_table(conn, 'sqlite', table_id(conn, 'T3'), 'Patio 1')
+    assert (table['table_number'], table['sort_key']) == ('Patio 1', table_sort_key('Patio 1'))
+    assert version == 1  # seeding starts the floor at 0
+
+def test_rename_to_a_taken_name_raises(conn):
+    with pytest.raises(sqlite3.IntegrityError):
+        rename_table(conn, 'sqlite', table_id(conn, 'T3'), 'T4')
+    assert conn.execute("SELECT table_number FROM tables WHERE id = ?", (table_id(conn, 'T3'),)).fetchone()[0] == 'T3'
+
+def test_occupied_tables_are_not_renamed(conn):
+    with conn:
+        conn.execute("UPDATE tables SET status = 'occupied' WHERE table_number = 'T3'")
+    assert rename_table(conn, 'sqlite', table_id(conn, 'T3'), 'Patio 1')[0] is None
+    assert rename_table(conn, 'sqlite', 999, 'Patio 1')[0] is None
@@ -0,0 +1,50 @@
+from database import transaction
+from table_state import CONFLICT, INVALID, NOT_FOUND, OK, UNCHANGED, parse_version, transition_table
+
+def apply(connect, table_id, action, expected_version=None):
+    conn, db_type = connect()
+    try:
+        with transaction(conn, db_type):
+            return transition_table(conn, db_type, table_id, action, expected_version)
+    finally:
+        conn.close()
+
+def test_transition_bumps_the_version(connect):
+    result = apply(connect, 1, 'block')
+    assert result['status'] == OK
+    assert (result['table']['status'], result['table']['version']) == ('blocked', 1)
+    assert apply(connect, 1, 'free', expected_version=1)['table']['version'] == 2
+
+def test_stale_version_is_a_conflict(connect):
+    apply(connect, 1, 'block', expected_version=0)
+    result = apply(connect, 1, 'free', expected_version=0)
+    assert result['status'] == CONFLICT
+    assert result['table']['status'] == 'blocked'
+
+def test_only_one_of_two_writers_with_the_same_version_wins(connect):
+    first = apply(connect, 1, 'block', expected_version=0)
+    second = apply(connect, 1, 'block', expected_version=0)
+    assert (first['status'], second['status']) == (OK, CONFLICT)
+
+def test_already_in_target_status(connect):
+    assert apply(connect, 1, 'free')['status'] == UNCHANGED
+    assert apply(connect, 1, 'free', expected_version=0)['status'] == UNCHANGED
+    apply(connect, 1, 'block')
+    assert apply(connect, 1, 'block', expected_version=1)['status'] == UNCHANGED
+
+def test_transition_not_allowed_from_current_status(connect):
+    conn, _ = connect()
+    with conn:
+        conn.execute("UPDATE tables SET status = 'occupied' WHERE id = 2")
+    conn.close()
+    assert apply(connect, 2, 'block', expected_version=0)['status'] == INVALID
+
+def test_missing_table(connect):
+    assert apply(connect, 999, 'free') == {'status': NOT_FOUND, 'table': None}
+    assert apply(connect, 999, 'free', expected_version=0)['status'] == NOT_FOUND
+
+def test_parse_version():
+    assert parse_version('3') == 3
+    assert parse_version(None) is None
+    assert parse_version('') is None
+    assert parse_version('abc') is None
@@ -0,0 +1,35 @@
+import datetime
+
+from wait_estimator import WaitTimeEstimator
+
+def record_visit(conn, table_number, seated, minutes):
+    conn.execute("INSERT INTO customer_history (name, people_count, arrival_timestamp, seated_timestamp, departed_timestamp, table_number) "
+                 "VALUES ('Guest', 2, ?, ?, ?, ?)", (seated, seated, seated + datetime.timedelta(minutes=minutes), table_number))
+
+def test_combined_seatings_count_for_each_table_capacity(connect):
+    # T1 seats 2, T10 seats 4: a combined visit is no sample for a 6-top that does not exist
+    conn, db_type = connect()
+    with conn:
+        record_visit(conn, 'T1, T10', datetime.datetime(2025, 1, 1, 12), 90)
+    estimator = WaitTimeEstimator()
+    estimator.refresh(conn, db_type)
+    conn.close()
+    assert len(estimator.distribution(2)) == 1
+    assert len(estimator.distribution(4)) == 1
+    assert len(estimator.distribution(6)) == 0
+    assert estimator.distribution(4).median() == 90
+
+def test_refresh_only_reads_new_departures(connect):
+    conn, db_type = connect()
+    seated = datetime.datetime(2025, 1, 1, 12)
+    with conn:
+        record_visit(conn, 'T10', seated, 30)
+    estimator = WaitTimeEstimator()
+    estimator.refresh(conn, db_type)
+    with conn:
+        # Departed at the same minute but later in it: must still count once
+        record_visit(conn, 'T10', seated + datetime.timedelta(seconds=5), 30)
+    estimator.refresh(conn, db_type)
+    estimator.refresh(conn, db_type)
+    conn.close()
+    assert len(estimator.distribution(4)) == 2
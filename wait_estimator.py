@@ -0,0 +1,166 @@
+import datetime
+import heapq
+import threading
+from bisect import bisect_right, insort
+from collections import deque
+from database import adapt_query
+
+DEFAULT_DWELL_MINUTES = 45
+# Tables that have overrun every recorded dwell are assumed to free up this soon
+OVERRUN_MINUTES = 5
+SAMPLES_PER_CAPACITY = 500
+REFRESH_INTERVAL_SECONDS = 60
+
+def to_datetime(value):
+    """Timestamps come back as strings from SQLite DATETIME columns"""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return None
+
+class DwellDistribution:
+    """Most recent dwell times (minutes) for one table capacity, kept sorted for quantile lookups"""
+
+    def __init__(self, max_samples=SAMPLES_PER_CAPACITY):
+        self._recent = deque()
+        self._sorted = []
+        self._max_samples = max_samples
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def add(self, minutes):
+        if len(self._recent) == self._max_samples:
+            oldest = self._recent.popleft()
+            del self._sorted[bisect_right(self._sorted, oldest) - 1]
+        self._recent.append(minutes)
+        insort(self._sorted, minutes)
+
+    def median(self):
+        if not self._sorted:
+            return DEFAULT_DWELL_MINUTES
+        return self._sorted[len(self._sorted) // 2]
+
+    def remaining(self, age_minutes):
+        """Expected minutes left for a table occupied age_minutes ago (median residual dwell)"""
+        if not self._sorted:
+            return max(DEFAULT_DWELL_MINUTES - age_minutes, OVERRUN_MINUTES)
+        index = bisect_right(self._sorted, age_minutes)
+        longer = len(self._sorted) - index
+        if not longer:
+            return OVERRUN_MINUTES
+        return max(self._sorted[index + longer // 2] - age_minutes, 1)
+
+class WaitTimeEstimator:
+    """Per-capacity dwell statistics, refreshed incrementally from departures in customer_history.
+
+    refresh() only reads rows that departed since the previous refresh (an
+    index range on departed_timestamp), so estimating the whole queue never
+    rescans history. A combined seating is one dwell sample for each table it
+    used, filed under that table's own capacity.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL_SECONDS):
+        self._distributions = {}
+        self._watermark = None
+        self._last_refresh = None
+        self._refresh_interval = datetime.timedelta(seconds=refresh_interval)
+        self._lock = threading.Lock()
+
+    def distribution(self, capacity):
+        if capacity not in self._distributions:
+            self._distributions[capacity] = DwellDistribution()
+        return self._distributions[capacity]
+
+    def mark_stale(self):
+        """Force the next refresh_if_stale() to pick up new departures (e.g. after free_table)"""
+        self._last_refresh = None
+
+    def refresh_if_stale(self, conn, db_type, now=None):
+        now = now or datetime.datetime.now()
+        if self._last_refresh is not None and now - self._last_refresh < self._refresh_interval:
+            return
+        with self._lock:
+            if self._last_refresh is not None and now - self._last_refresh < self._refresh_interval:
+                return
+            self.refresh(conn, db_type)
+            self._last_refresh = now
+
+    def refresh(self, conn, db_type):
+        cursor = conn.cursor()
+        cursor.execute("SELECT table_number, capacity FROM tables")
+        capacities = {row['table_number']: row['capacity'] for row in cursor.fetchall()}
+
+        query = ("SELECT table_number, seated_timestamp, departed_timestamp FROM customer_history "
+                 "WHERE departed_timestamp IS NOT NULL AND seated_timestamp IS NOT NULL")
+        params = ()
+        if self._watermark is not None:
+            # A datetime, stored and bound the same way by every writer, so it orders by time on both backends
+            query += " AND departed_timestamp > ?"
+            params = (self._watermark,)
+        cursor.execute(adapt_query(query + " ORDER BY departed_timestamp ASC", db_type), params)
+
+        for row in cursor.fetchall():
+            seated, departed = to_datetime(row['seated_timestamp']), to_datetime(row['departed_timestamp'])
+            if seated is None or departed is None:
+                continue
+            # Combined seatings are recorded as "T1, T2": each table was held for the whole visit
+            minutes = (departed - seated).total_seconds() / 60
+            for number in (row['table_number'] or '').split(','):
+                capacity = capacities.get(number.strip())
+                if capacity:
+                    self.distribution(capacity).add(minutes)
+            self._watermark = departed
+
+    def estimate(self, queue, tables, now=None):
+        """Minutes until a suitable table is expected for each waiting party, in queue order.
+
+        Every non-blocked table gets an expected free-at time (now if free, otherwise
+        now + median residual dwell for its age). Parties then claim, oldest first,
+        the earliest table that fits; a claimed table becomes free again one median
+        dwell later. Parties larger than any table claim the earliest tables until
+        their seats add up.
+        """
+        now = now or datetime.datetime.now()
+        free_at = {}
+        for table in tables:
+            if table['status'] == 'blocked':
+                continue
+            distribution = self.distribution(table['capacity'])
+            occupied_since = to_datetime(table.get('occupied_timestamp'))
+            if table['status'] == 'free' or occupied_since is None:
+                minutes = 0
+            else:
+                minutes = distribution.remaining((now - occupied_since).total_seconds() / 60)
+            free_at.setdefault(table['capacity'], []).append(minutes)
+        for heap in free_at.values():
+            heapq.heapify(heap)
+        capacities = sorted(free_at)
+
+        estimates = []
+        for party in queue:
+            fitting = [c for c in capacities if c >= party['people_count']]
+            if fitting:
+                capacity = min(fitting, key=lambda c: (free_at[c][0], c))
+                minutes = heapq.heappop(free_at[capacity])
+                heapq.heappush(free_at[capacity], minutes + self.distribution(capacity).median())
+            elif capacities:
+                claimed = []
+                seats = 0
+                available = sum(len(heap) for heap in free_at.values())
+                while seats < party['people_count'] and len(claimed) < available:
+                    capacity = min(capacities, key=lambda c: free_at[c][0] if free_at[c] else float('inf'))
+                    claimed.append((capacity, heapq.heappop(free_at[capacity])))
+                    seats += capacity
+                minutes = max(m for _, m in claimed) if seats >= party['people_count'] else None
+                for capacity, claimed_at in claimed:
+                    heapq.heappush(free_at[capacity], (minutes or claimed_at) + self.distribution(capacity).median())
+            else:
+                minutes = None
+            estimates.append({
+                'customer_id': party['id'],
+                'eta_minutes': None if minutes is None else round(minutes),
+            })
+        return estimates
@@ -0,0 +1,81 @@
+import threading
+import time
+
+# How long to wait before retrying a step that failed (e.g. the database is still waking up)
+RETRY_SECONDS = 2.0
+
+class Warmup:
+    """Runs the start-up steps once, in a background thread, and tracks readiness.
+
+    The process answers liveness checks as soon as it is serving; readiness turns
+    green only after every step has succeeded, so a load balancer keeps traffic
+    away until connections, caches and templates are hot. A failing step is
+    retried until it succeeds.
+    """
+
+    def __init__(self, retry_seconds=RETRY_SECONDS):
+        self._steps = []
+        self._retry_seconds = retry_seconds
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started_at = None
+        self._finished_at = None
+        self.results = {}
+
+    def step(self, name, func):
+        """Add a step; steps run in the order they were added"""
+        self._steps.append((name, func))
+
+    def start(self):
+        """Start the steps in the background; safe to call more than once"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        for name, func in self._steps:
+            attempts = 0
+            while True:
+                attempts += 1
+                started = time.perf_counter()
+                try:
+                    detail = func()
+                except Exception as e:
+                    self.results[name] = {'ok': False, 'attempts': attempts, 'error': str(e)}
+                    print(f"Warm-up step '{name}' failed (attempt {attempts}): {e}")
+                    time.sleep(self._retry_seconds)
+                    continue
+                self.results[name] = {'ok': True, 'attempts': attempts, 'ms': round((time.perf_counter() - started) * 1000, 1)}
+                if detail is not None:
+                    self.results[name]['detail'] = detail
+                break
+        self._finished_at = time.monotonic()
+        self._ready.set()
+        print(f"Warm-up complete in {(self._finished_at - self._started_at) * 1000:.0f}ms")
+
+    def status(self):
+        finished = self._finished_at is not None
+        return {
+            'ready': self.ready,
+            'started': self._started_at is not None,
+            'duration_ms': round((self._finished_at - self._started_at) * 1000, 1) if finished else None,
+            'steps': dict(self.results),
+        }
+
+def compile_templates(app):
+    """Load every template into the Jinja cache so the first page view does not pay for parsing"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)